@@ -0,0 +1,232 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+from django.utils import timezone
+
+from .models import PurchaseHistory, User
+from .opening_hours import DAYS_OF_WEEK
+from .rollups import day_bounds
+from .versions import PURCHASE_DELETIONS, TRANSACTIONS, VersionedSnapshot, get_version
+
+try:
+    import numpy as np
+except ImportError:  # 選用套件，未安裝時一律以資料庫彙總回答
+    np = None
+
+GROUP_BY_FIELDS = {
+    'pharmacy': ('pharmacy_name',),
+    'mask': ('mask_name',),
+    'user': ('user_id', 'user_name'),
+    'hour_of_week': ('weekday', 'hour'),
+}
+SORT_FIELDS = ('total_amount', 'mask_count', 'transaction_count')
+HOURS_PER_WEEK = 7 * 24
+CENT = Decimal('0.01')
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_microseconds(value):
+    # 以整數微秒保存時間，比較日期邊界時不會有浮點誤差
+    return (value - EPOCH) // MICROSECOND
+
+
+def result_row(key, transaction_count, mask_count, total_amount):
+    return {**key, 'transaction_count': transaction_count, 'mask_count': mask_count, 'total_amount': total_amount}
+
+
+def database_breakdown(start_date, end_date, group_by, sort_by='total_amount', top_x=None):
+    """以 GROUP BY 查詢彙總日期範圍內的購買紀錄，依 sort_by 由大到小排序，同值時依分組鍵排序。"""
+    start, end = day_bounds(start_date, end_date)
+    histories = PurchaseHistory.objects.filter(transacted_at__gte=start, transacted_at__lt=end)
+    if group_by == 'user':
+        histories = histories.annotate(user_name=F('user__name'))
+    elif group_by == 'hour_of_week':
+        histories = histories.annotate(weekday=ExtractIsoWeekDay('transacted_at'), hour=ExtractHour('transacted_at'))
+
+    fields = GROUP_BY_FIELDS[group_by]
+    rows = histories.values(*fields).annotate(
+        transaction_count=Count('id'), mask_count=Sum('quantity'), total_amount=Sum('transaction_amount'),
+    ).order_by(f'-{sort_by}', *fields)
+    if top_x:
+        rows = rows[:top_x]
+
+    results = []
+    for row in rows:
+        key = {field: row[field] for field in fields}
+        if group_by == 'hour_of_week':
+            key['weekday'] = DAYS_OF_WEEK[row['weekday'] - 1]
+        # SQLite 以浮點數計算 SUM，四捨五入到分
+        results.append(result_row(key, row['transaction_count'], row['mask_count'], row['total_amount'].quantize(CENT)))
+    return results
+
+
+class Labels:
+    """欄位的字典編碼：每個不同的值對應一個由 0 起算的整數代碼，只會新增不會改變。"""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class TransactionColumns:
+    """
+    PurchaseHistory 的欄式快照，所有欄位依交易時間排序：
+    日期範圍以 searchsorted 找到連續的區段，分組加總以 bincount 計算，不需逐筆迴圈。
+    金額以分為單位的整數保存，加總不會有浮點誤差。
+    """
+
+    def __init__(self, last_id, timestamps, columns, quantity, cents, labels, ranks):
+        self.last_id = last_id
+        self.timestamps = timestamps
+        self.columns = columns
+        self.quantity = quantity
+        self.cents = cents
+        self.labels = labels
+        # 分組鍵的排序名次，排序同值的結果時使用
+        self.ranks = ranks
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def breakdown(self, start, end, group_by, sort_by='total_amount', top_x=None):
+        low, high = np.searchsorted(self.timestamps, [to_microseconds(start), to_microseconds(end)], side='left')
+        codes = self.columns[group_by][low:high]
+        size = HOURS_PER_WEEK if group_by == 'hour_of_week' else len(self.labels[group_by])
+        counts = np.bincount(codes, minlength=size)
+        quantity = np.bincount(codes, weights=self.quantity[low:high], minlength=size)
+        cents = np.bincount(codes, weights=self.cents[low:high], minlength=size)
+
+        present = np.flatnonzero(counts)
+        metric = {'total_amount': cents, 'mask_count': quantity, 'transaction_count': counts}[sort_by]
+        order = present[np.lexsort((self.ranks[group_by][present], -metric[present]))]
+        if top_x:
+            order = order[:top_x]
+        return [
+            (int(code), int(counts[code]), int(quantity[code]), Decimal(int(cents[code])).scaleb(-2))
+            for code in order
+        ]
+
+
+def rank(values):
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[sorted(range(len(values)), key=values.__getitem__)] = np.arange(len(values))
+    return ranks
+
+
+def history_rows(after_id=0):
+    return PurchaseHistory.objects.filter(id__gt=after_id).order_by('id').values_list(
+        'id', 'transacted_at', 'user_id', 'pharmacy_name', 'mask_name', 'quantity', 'transaction_amount',
+    ).iterator(chunk_size=10000)
+
+
+class ColumnarSnapshot(VersionedSnapshot):
+    """
+    交易分析用的欄式快照。購買只會新增紀錄，版本號改變時只讀取 id 大於上次的紀錄並合併；
+    PURCHASE_DELETIONS 的版本號改變（刪除用戶時串聯刪除購買紀錄）時才完整重建，更新時不需查詢總筆數。
+    """
+    domains = (TRANSACTIONS, PURCHASE_DELETIONS)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'ANALYTICS_SNAPSHOT_TTL', None)
+
+    def build(self):
+        # 先記錄刪除的版本號再讀取紀錄，讀取期間發生的刪除會在下一次更新時重建
+        self.deletions = get_version(PURCHASE_DELETIONS)
+        self.labels = {'pharmacy': Labels(), 'mask': Labels(), 'user': Labels()}
+        return self.append(None, history_rows())
+
+    def refresh(self, snapshot):
+        if get_version(PURCHASE_DELETIONS) != self.deletions:
+            return self.build()
+        return self.append(snapshot, history_rows(snapshot.last_id))
+
+    def append(self, snapshot, rows):
+        last_id = snapshot.last_id if snapshot else 0
+        timestamps, users, pharmacies, masks, hours, quantity, cents = [], [], [], [], [], [], []
+        for pk, transacted_at, user_id, pharmacy_name, mask_name, count, amount in rows:
+            last_id = pk
+            local = timezone.localtime(transacted_at)
+            timestamps.append(to_microseconds(transacted_at))
+            users.append(self.labels['user'].encode(user_id))
+            pharmacies.append(self.labels['pharmacy'].encode(pharmacy_name))
+            masks.append(self.labels['mask'].encode(mask_name))
+            hours.append(local.weekday() * 24 + local.hour)
+            quantity.append(count)
+            cents.append(int(amount * 100))
+
+        new = {
+            'timestamps': np.array(timestamps, dtype=np.int64),
+            'user': np.array(users, dtype=np.int64),
+            'pharmacy': np.array(pharmacies, dtype=np.int64),
+            'mask': np.array(masks, dtype=np.int64),
+            'hour_of_week': np.array(hours, dtype=np.int64),
+            'quantity': np.array(quantity, dtype=np.int64),
+            'cents': np.array(cents, dtype=np.int64),
+        }
+        if snapshot is not None:
+            # 產生新的陣列，讀取中的舊快照維持不變
+            old = {'timestamps': snapshot.timestamps, 'quantity': snapshot.quantity, 'cents': snapshot.cents, **snapshot.columns}
+            new = {name: np.concatenate([old[name], values]) for name, values in new.items()}
+        # 紀錄依 id 讀取，匯入的歷史資料時間可能早於現有紀錄，此時重新排序
+        if len(new['timestamps']) > 1 and np.any(np.diff(new['timestamps']) < 0):
+            order = np.argsort(new['timestamps'], kind='stable')
+            new = {name: values[order] for name, values in new.items()}
+
+        # 星期與小時的代碼本身即為順序；其他分組沒有新增的值時沿用上一份快照的名次
+        labels, ranks = {}, {'hour_of_week': np.arange(HOURS_PER_WEEK)}
+        for group, encoder in self.labels.items():
+            if snapshot is not None and len(snapshot.labels[group]) == len(encoder.values):
+                labels[group], ranks[group] = snapshot.labels[group], snapshot.ranks[group]
+            else:
+                labels[group] = list(encoder.values)
+                ranks[group] = rank(labels[group])
+
+        return TransactionColumns(
+            last_id,
+            new.pop('timestamps'),
+            {group: new.pop(group) for group in GROUP_BY_FIELDS},
+            new['quantity'],
+            new['cents'],
+            labels,
+            ranks,
+        )
+
+    def breakdown(self, start_date, end_date, group_by, sort_by='total_amount', top_x=None):
+        snapshot = self.get()
+        start, end = day_bounds(start_date, end_date)
+        groups = snapshot.breakdown(start, end, group_by, sort_by, top_x)
+        values = snapshot.labels.get(group_by)
+        if group_by == 'user':
+            names = dict(User.objects.filter(id__in=[values[code] for code, *_ in groups]).values_list('id', 'name'))
+
+        results = []
+        for code, transaction_count, mask_count, total_amount in groups:
+            if group_by == 'hour_of_week':
+                key = {'weekday': DAYS_OF_WEEK[code // 24], 'hour': code % 24}
+            elif group_by == 'user':
+                key = {'user_id': values[code], 'user_name': names.get(values[code])}
+            else:
+                key = {GROUP_BY_FIELDS[group_by][0]: values[code]}
+            results.append(result_row(key, transaction_count, mask_count, total_amount))
+        return results
+
+
+columnar_snapshot = ColumnarSnapshot()
+
+
+def transaction_breakdown(start_date, end_date, group_by, sort_by='total_amount', top_x=None):
+    if settings.ANALYTICS_BACKEND == 'columnar' and np is not None:
+        return columnar_snapshot.breakdown(start_date, end_date, group_by, sort_by, top_x)
+    return database_breakdown(start_date, end_date, group_by, sort_by, top_x)
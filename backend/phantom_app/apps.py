@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PhantomAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'phantom_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,214 @@
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import views
+from .analytics import transaction_breakdown
+from .autocomplete import suggestion_index
+from .exports import aexport_lines, export_queryset
+from .models import Pharmacy
+from .opening_hours_index import open_pharmacies, opening_hours_index
+from .pagination import KeysetPagination
+from .pharmacy_stats import with_stats
+from .purchases import purchase_mask, purchase_masks
+from .response_cache import cached_response
+from .search_index import search_database
+from .versions import CATALOGUE, OPENING_HOURS, TRANSACTIONS
+from .views import include_stats
+
+# 與 views 中同名的非同步版本，ASYNC_VIEWS=True 時由 urls 使用。
+# 參數驗證、查詢的組成與回應格式都繼承自同步版本，類別名稱相同因此也共用回應快取。
+
+
+async def alist(rows):
+    # QuerySet 以 async ORM 讀取，記憶體內索引回傳的 list 直接使用
+    if isinstance(rows, list):
+        return rows
+    return [row async for row in rows]
+
+
+class AsyncAPIView(views.PhantomAPIView):
+    """
+    DRF 的 APIView 只能呼叫同步的 handler，這裡以 async 改寫 dispatch：
+    認證、權限與節流可能查詢資料庫（session），以 sync_to_async 執行；
+    錯誤處理與 content negotiation 沿用 APIView，ParameterError 同樣轉為 {"error": ...} 回應。
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def options(self, request, *args, **kwargs):
+        # Django 要求同一個 view 的 handler 全為同步或全為非同步
+        return super().options(request, *args, **kwargs)
+
+
+class PharmacyByOpeningHoursAPIView(AsyncAPIView, views.PharmacyByOpeningHoursAPIView):
+    @cached_response(CATALOGUE, OPENING_HOURS, param_domains={'include_stats': (TRANSACTIONS,)})
+    async def get(self, request):
+        weekday, query_time = self.parse(request)
+        paginator = KeysetPagination(ordering=('name',))
+        if settings.OPENING_HOURS_INDEX:
+            # 索引過期時會查詢資料庫重建
+            pharmacies = await sync_to_async(opening_hours_index.open_at)(weekday, query_time)
+            page = paginator.paginate_list(pharmacies, request)
+        else:
+            pharmacies = open_pharmacies(weekday, query_time)
+            page = await paginator.apaginate_queryset(pharmacies, request)
+
+        rows = await alist(pharmacies) if page is None else page
+        if include_stats(request):
+            rows = await sync_to_async(with_stats)(rows)
+        if page is not None:
+            return paginator.get_paginated_response(rows)
+        return Response(rows, status=status.HTTP_200_OK)
+
+
+class MasksByPharmacyAPIView(AsyncAPIView, views.MasksByPharmacyAPIView):
+    @cached_response(CATALOGUE)
+    async def get(self, request, *args, **kwargs):
+        pharmacy_name, sort_by = self.parse(request)
+
+        pharmacy = await Pharmacy.objects.filter(name=pharmacy_name).afirst()
+        if not pharmacy:
+            return Response({'error': 'Pharmacy not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        masks = self.masks(pharmacy, sort_by)
+        paginator = self.paginator(sort_by)
+        page = await paginator.apaginate_queryset(masks, request)
+
+        mask_list = self.mask_list(await alist(masks) if page is None else page)
+        if page is not None:
+            return paginator.get_paginated_response(mask_list)
+        return Response(mask_list, status=status.HTTP_200_OK)
+
+
+class PharmaciesByMaskCountAPIView(AsyncAPIView, views.PharmaciesByMaskCountAPIView):
+    @cached_response(CATALOGUE, param_domains={'include_stats': (TRANSACTIONS,)})
+    async def get(self, request):
+        matching_pharmacies = self.pharmacies(*self.parse(request))
+
+        paginator = self.paginator()
+        page = await paginator.apaginate_queryset(matching_pharmacies, request)
+
+        rows = await alist(matching_pharmacies) if page is None else page
+        if include_stats(request):
+            rows = await sync_to_async(with_stats)(rows)
+        if page is not None:
+            return paginator.get_paginated_response(rows)
+        return Response(rows, status=status.HTTP_200_OK)
+
+
+class TopUsersByTransactionAPIView(AsyncAPIView, views.TopUsersByTransactionAPIView):
+    @cached_response(TRANSACTIONS)
+    async def get(self, request):
+        top_x, start_date, end_date = self.parse(request)
+        top_users = self.top_users(start_date, end_date)
+
+        paginator = KeysetPagination(ordering=('-total_amount', 'user_id'))
+        page = await paginator.apaginate_queryset(top_users, request, total=top_x)
+
+        user_data = self.user_data(await alist(top_users[:top_x]) if page is None else page)
+        if page is not None:
+            return paginator.get_paginated_response(user_data)
+        return Response(user_data, status=status.HTTP_200_OK)
+
+
+class TotalMasksAndTransactionValueAPIView(AsyncAPIView, views.TotalMasksAndTransactionValueAPIView):
+    @cached_response(TRANSACTIONS)
+    async def get(self, request):
+        queryset, aggregates = self.totals(*self.parse(request))
+        return self.totals_response(await queryset.aaggregate(**aggregates))
+
+
+class TransactionAnalyticsAPIView(AsyncAPIView, views.TransactionAnalyticsAPIView):
+    @cached_response(TRANSACTIONS)
+    async def get(self, request):
+        start_date, end_date, group_by, sort_by, top_x = self.parse(request)
+        # 欄式快照的計算與重建都是同步的 CPU 工作，交由執行緒處理
+        results = await sync_to_async(transaction_breakdown)(start_date, end_date, group_by, sort_by, top_x)
+        return self.analytics_response(group_by, sort_by, results)
+
+
+class TransactionExportAPIView(AsyncAPIView, views.TransactionExportAPIView):
+    async def get(self, request):
+        start_date, end_date, file_format, user_name, pharmacy_name = self.parse(request)
+
+        pharmacy_id = None
+        if pharmacy_name:
+            pharmacy_id = await self.pharmacy_id(pharmacy_name).afirst()
+            if pharmacy_id is None:
+                return Response({'error': 'Pharmacy not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        # 串流回應由非同步產生器逐批查詢，ASGI 伺服器在等待資料庫時可處理其他連線
+        histories = export_queryset(start_date, end_date, user_name=user_name, pharmacy_id=pharmacy_id)
+        return self.export_response(aexport_lines(histories, file_format), start_date, end_date, file_format)
+
+
+class SearchAPIView(AsyncAPIView, views.SearchAPIView):
+    @cached_response(CATALOGUE, param_domains={'include_stats': (TRANSACTIONS,)})
+    async def get(self, request):
+        search_term, limit = self.parse(request)
+
+        pharmacy_pages, mask_pages = self.search_pages(limit)
+        if settings.SEARCH_BACKEND == 'index':
+            pharmacies, masks = await sync_to_async(self.search_index)(request, search_term, pharmacy_pages, mask_pages)
+        else:
+            pharmacy_rows, mask_rows = search_database(search_term)
+            pharmacies, masks = self.search_results(
+                await pharmacy_pages.apaginate_queryset(pharmacy_rows, request),
+                await mask_pages.apaginate_queryset(mask_rows, request),
+            )
+
+        if include_stats(request):
+            pharmacies = await sync_to_async(with_stats)(pharmacies)
+        return self.search_response(pharmacies, masks, pharmacy_pages, mask_pages)
+
+
+class SearchSuggestionAPIView(AsyncAPIView, views.SearchSuggestionAPIView):
+    async def get(self, request):
+        # 前綴索引過期時會查詢資料庫重建
+        suggestions = await sync_to_async(suggestion_index.suggest)(*self.parse(request))
+        return Response({'suggestions': suggestions}, status=status.HTTP_200_OK)
+
+
+class PurchaseMaskAPIView(AsyncAPIView, views.PurchaseMaskAPIView):
+    async def post(self, request, *args, **kwargs):
+        arguments = self.parse(request)
+        try:
+            # 交易與列鎖定需在同一條連線上完成，整個購買流程交由 thread-sensitive 執行緒執行
+            user, line = await sync_to_async(purchase_mask)(*arguments)
+        except Exception as e:
+            return self.error_response(e)
+        return self.purchase_response(user, line)
+
+
+class BatchPurchaseMaskAPIView(AsyncAPIView, views.BatchPurchaseMaskAPIView):
+    async def post(self, request, *args, **kwargs):
+        arguments = self.parse(request)
+        try:
+            user, lines, total_price = await sync_to_async(purchase_masks)(*arguments)
+        except Exception as e:
+            return self.error_response(e)
+        return self.purchase_response(user, lines, total_price)
@@ -0,0 +1,211 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from django.db.models import Count
+
+from .models import Mask, Pharmacy
+from .search_index import tokenize
+from .versions import CATALOGUE, VersionedSnapshot
+
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+
+PHARMACY = 'pharmacy'
+MASK = 'mask'
+
+# 前綴陣列每段的目標長度；各段另外依排名排序，短前綴符合大範圍時只需合併各段開頭的幾筆，
+# 增量更新時也只需重新排序有異動的段
+BLOCK_SIZE = 256
+
+
+def normalize(text):
+    return ' '.join(tokenize(text))
+
+
+def word_suffixes(key):
+    tokens = key.split(' ')
+    for position in range(1, len(tokens)):
+        yield ' '.join(tokens[position:])
+
+
+def ranker(suggestions):
+    # 熱門程度高者優先，同分時較短（較接近輸入內容）的名稱優先
+    def rank(key):
+        return -suggestions[key][2], len(key), key
+    return rank
+
+
+class Block:
+    def __init__(self, entries, rank):
+        self.entries = entries
+        self.ranked = sorted(rank(key) for _, key in entries)
+
+
+class PrefixArray:
+    """
+    以排序後的 (前綴鍵, 建議鍵) 陣列配合二分搜尋找出以指定前綴開頭的建議。
+    陣列分為多段，各段依 rank(建議鍵) 排序，依排名取出前幾筆時不必排序整個符合的範圍。
+    """
+
+    def __init__(self, blocks, rank):
+        self.blocks = blocks
+        self.rank = rank
+        self.firsts = [block.entries[0] for block in blocks]
+
+    @classmethod
+    def from_entries(cls, entries, rank):
+        entries = sorted(entries)
+        return cls([Block(entries[start:start + BLOCK_SIZE], rank) for start in range(0, len(entries), BLOCK_SIZE)],
+                   rank)
+
+    @property
+    def entries(self):
+        return [entry for block in self.blocks for entry in block.entries]
+
+    def block_index(self, entry):
+        return max(bisect_right(self.firsts, entry) - 1, 0)
+
+    def locate(self, entry):
+        # 回傳第一個不小於 entry 的項目所在的 (段, 位置)
+        index = self.block_index(entry)
+        position = bisect_left(self.blocks[index].entries, entry)
+        if position == len(self.blocks[index].entries):
+            return index + 1, 0
+        return index, position
+
+    def ranked(self, prefix):
+        """依排名由高到低逐一產生符合前綴的建議鍵；同一建議有多個單字符合時會重複出現。"""
+        if not self.blocks:
+            return
+        start_block, start = self.locate((prefix,))
+        end_block, end = self.locate((prefix + '\U0010ffff',))
+        if start_block == end_block:
+            if start_block == len(self.blocks):
+                return
+            runs = [sorted(self.rank(key) for _, key in self.blocks[start_block].entries[start:end])]
+        else:
+            # 頭尾不完整的段直接排序，中間完整的段使用預先排序的結果
+            head = self.blocks[start_block]
+            runs = [head.ranked if start == 0 else sorted(self.rank(key) for _, key in head.entries[start:])]
+            runs.extend(block.ranked for block in self.blocks[start_block + 1:end_block])
+            if end:
+                runs.append(sorted(self.rank(key) for _, key in self.blocks[end_block].entries[:end]))
+        for rank in heapq.merge(*runs):
+            yield rank[-1]
+
+    def changed(self, removed, added, rank):
+        """回傳套用異動後的新陣列；未異動的段直接沿用，原陣列不變，讀取端可能仍在使用。"""
+        if not self.blocks:
+            return PrefixArray.from_entries(added, rank)
+        removed_by_block = defaultdict(set)
+        for entry in removed:
+            removed_by_block[self.block_index(entry)].add(entry)
+        added_by_block = defaultdict(list)
+        for entry in added:
+            added_by_block[self.block_index(entry)].append(entry)
+
+        blocks = []
+        for index, block in enumerate(self.blocks):
+            if index not in removed_by_block and index not in added_by_block:
+                blocks.append(block)
+                continue
+            entries = [entry for entry in block.entries if entry not in removed_by_block[index]]
+            entries.extend(added_by_block[index])
+            entries.sort()
+            # 段長超過兩倍時拆開，清空的段直接移除
+            size = BLOCK_SIZE if len(entries) > 2 * BLOCK_SIZE else len(entries)
+            blocks.extend(Block(entries[start:start + size], rank) for start in range(0, len(entries), size or 1))
+        return PrefixArray(blocks, rank)
+
+
+def name_entries(keys):
+    return [(key, key) for key in keys]
+
+
+def word_entries(keys):
+    return [(suffix, key) for key in keys for suffix in word_suffixes(key)]
+
+
+class Suggestions:
+    def __init__(self, suggestions, normalized, names, words):
+        # 正規化名稱 -> (名稱, 類型, 熱門程度)
+        self.suggestions = suggestions
+        # 原始名稱 -> 正規化名稱，增量更新時未變動的名稱不必重新正規化
+        self.normalized = normalized
+        self.names = names
+        self.words = words
+
+    def top(self, prefix, limit):
+        # 比對品質：整個名稱完全相同 > 名稱開頭符合 > 名稱中其他單字開頭符合，同一級內依排名
+        results = [prefix] if prefix in self.suggestions else []
+        seen = set(results)
+        for array in (self.names, self.words):
+            for key in array.ranked(prefix):
+                if len(results) >= limit:
+                    return results
+                if key not in seen:
+                    seen.add(key)
+                    results.append(key)
+        return results[:limit]
+
+
+class SuggestionIndex(VersionedSnapshot):
+    """
+    搜尋框自動完成用的前綴索引，目錄（藥局與口罩名稱）版本改變時只套用有異動的名稱。
+    購買只更動餘額，不會使索引失效。
+    """
+    domains = (CATALOGUE,)
+
+    def load(self, normalized):
+        # 熱門程度以目錄中的上架數計算：口罩為販售的藥局數，藥局為販售的口罩數（取自預先計算的統計）
+        listings = [
+            (PHARMACY, Pharmacy.objects.values_list('name', 'stats__mask_count')),
+            (MASK, Mask.objects.values('name').annotate(popularity=Count('id')).values_list('name', 'popularity')
+             .order_by()),
+        ]
+        # 同名口罩在多間藥局販售時只保留一筆建議；藥局與口罩正規化後同名時保留藥局
+        suggestions = {}
+        current = {}
+        for kind, rows in listings:
+            for name, popularity in rows.iterator(chunk_size=5000):
+                key = normalized.get(name)
+                if key is None:
+                    key = normalize(name)
+                current[name] = key
+                suggestions.setdefault(key, (name, kind, popularity or 0))
+        suggestions.pop('', None)
+        return suggestions, current
+
+    def build(self):
+        suggestions, normalized = self.load({})
+        rank = ranker(suggestions)
+        return Suggestions(suggestions, normalized, PrefixArray.from_entries(name_entries(suggestions), rank),
+                           PrefixArray.from_entries(word_entries(suggestions), rank))
+
+    def refresh(self, snapshot):
+        suggestions, normalized = self.load(snapshot.normalized)
+        if suggestions == snapshot.suggestions:
+            return Suggestions(suggestions, normalized, snapshot.names, snapshot.words)
+        # 只有新增、刪除、改名或熱門程度改變的建議需要移除後重新加入前綴陣列
+        removed = [key for key, value in snapshot.suggestions.items() if suggestions.get(key) != value]
+        added = [key for key, value in suggestions.items() if snapshot.suggestions.get(key) != value]
+        rank = ranker(suggestions)
+        return Suggestions(
+            suggestions, normalized,
+            snapshot.names.changed(name_entries(removed), name_entries(added), rank),
+            snapshot.words.changed(word_entries(removed), word_entries(added), rank),
+        )
+
+    def suggest(self, text, limit=DEFAULT_SUGGESTIONS):
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        snapshot = self.get()
+        return [
+            {'name': snapshot.suggestions[key][0], 'type': snapshot.suggestions[key][1]}
+            for key in snapshot.top(prefix, limit)
+        ]
+
+
+suggestion_index = SuggestionIndex()
@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+
+# 目前的請求可讀取的資料庫；預設為主資料庫，只有 ReplicaRoutingMiddleware 標記的唯讀請求改讀副本
+_read_database = ContextVar('phantom_read_database', default=DEFAULT_DB_ALIAS)
+
+
+def set_read_database(alias):
+    """設定目前 context 讀取的資料庫，回傳供 reset_read_database 還原的 token。"""
+    return _read_database.set(alias)
+
+
+def reset_read_database(token):
+    _read_database.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """區塊內的讀取一律使用主資料庫，例如依版本號建立的行程內快照不能讀到落後的副本。"""
+    token = set_read_database(DEFAULT_DB_ALIAS)
+    try:
+        yield
+    finally:
+        reset_read_database(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    寫入一律使用主資料庫；讀取依目前 context 決定，管理指令與寫入的請求沒有標記，讀取主資料庫。
+    副本由資料庫複寫產生，不執行 migrate。
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 主資料庫與副本內容相同，跨兩者的關聯視為同一份資料
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DB_ALIAS
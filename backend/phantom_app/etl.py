@@ -0,0 +1,263 @@
+import json
+import os
+import re
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from functools import partial
+from itertools import islice
+
+from .opening_hours import parse_opening_hours
+
+
+READ_SIZE = 1 << 16
+SEPARATORS = re.compile(r'[\s,]*')
+
+PHARMACY_FIELDS = ('name', 'cashBalance', 'openingHours')
+USER_FIELDS = ('name', 'cashBalance')
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def iter_json_records(path, format='auto', raw_lines=False):
+    """
+    逐筆讀取 JSON 陣列或 JSON Lines 檔案中的紀錄，記憶體用量與檔案大小無關。
+    format 為 'json'、'jsonl' 或 'auto'（依第一個非空白字元判斷）。
+    raw_lines 為 True 時 JSON Lines 直接回傳未解析的字串，交由下游（例如子行程）解析。
+    """
+    with open(path, 'r') as file:
+        if format == 'auto':
+            format = 'json' if _peek(file) == '[' else 'jsonl'
+
+        if format == 'jsonl':
+            for line in file:
+                line = line.strip()
+                if line:
+                    yield line if raw_lines else json.loads(line)
+        else:
+            yield from _iter_json_array(file)
+
+
+def _peek(file):
+    position = file.tell()
+    while True:
+        char = file.read(1)
+        if not char or not char.isspace():
+            file.seek(position)
+            return char
+
+
+def _iter_json_array(file):
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise InvalidRecord('Expected a JSON array')
+    position = 1
+    eof = False
+
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # 紀錄尚未完整讀入緩衝區，捨棄已解析的部分後繼續讀取
+            if eof:
+                raise
+            data = file.read(READ_SIZE)
+            eof = not data
+            buffer = buffer[position:] + data
+            position = 0
+            continue
+
+        if not isinstance(record, dict):
+            raise InvalidRecord(f'Expected a JSON object, got {type(record).__name__}')
+        yield record
+
+
+def process_batch(fields, transform, records):
+    """
+    對一批 (offset, record) 依序執行 parse -> validate -> transform，回傳 [(offset, result, error), ...]。
+    模組層級函式，可被 pickle 後交給子行程執行。
+    """
+    results = []
+    for offset, record in records:
+        try:
+            if isinstance(record, str):
+                record = json.loads(record)
+            missing = [field for field in fields if field not in record]
+            if missing:
+                results.append((offset, None, f"Record {offset} is missing {', '.join(missing)}. Skipping."))
+                continue
+            results.append((offset, transform(record), None))
+        except (KeyError, TypeError, ValueError) as e:
+            results.append((offset, None, f"Record {offset} could not be transformed: {e!r}. Skipping."))
+    return results
+
+
+def ordered_map(executor, fn, iterable, window):
+    """
+    與 executor.map 相同依輸入順序回傳結果，但最多只有 window 個工作在排隊，
+    避免一次把整個輸入讀進記憶體。
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def run_pipeline(path, fields, transform, load, report, batch_size=1000, format='auto',
+                 checkpoint=None, start=0, workers=1, on_error=None):
+    """
+    parse -> validate -> transform -> 分批寫入。
+    workers > 1 時解析與轉換交由多個行程平行處理，但仍由目前的行程依原始順序逐批寫入，
+    結果與單一行程相同。load(records) 負責在交易內寫入一批資料；每批完成後把下一筆的位置寫入 checkpoint。
+    """
+    # JSON Lines 一律以原始字串交給 process_batch 解析，格式錯誤的行在單一與多個行程下都只會被略過
+    records = islice(enumerate(iter_json_records(path, format, raw_lines=True)), start, None)
+    batches = chunked(records, batch_size)
+    process = partial(process_batch, fields, transform)
+
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+        if executor:
+            results = ordered_map(executor, process, batches, window=workers * 2)
+        else:
+            results = map(process, batches)
+
+        for batch in results:
+            transformed = []
+            for offset, record, error in batch:
+                if error:
+                    report.skipped += 1
+                    if on_error:
+                        on_error(error)
+                else:
+                    transformed.append(record)
+
+            if transformed:
+                load(transformed)
+            if checkpoint:
+                checkpoint.save(batch[-1][0] + 1)
+
+
+class Checkpoint:
+    """
+    記錄已寫入的紀錄數量，中斷後可從該位置繼續匯入。
+    state 為呼叫端需要跨次執行保留的資料（例如已提交批次影響的日期），與位置一起寫入。
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.state = {}
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'r') as file:
+            state = json.load(file)
+        if state.get('source') != self.source:
+            raise InvalidRecord(f"Checkpoint {self.path} belongs to {state.get('source')}")
+        self.state = state.get('state', {})
+        return state['offset']
+
+    def save(self, offset):
+        if not self.path:
+            return
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({'source': self.source, 'offset': offset, 'state': self.state}, file)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def ids_by_name(queryset, names, batch_size=1000):
+    # MySQL 的 bulk_create 不會回填主鍵，寫入後依名稱重新取得
+    names = list(names)
+    ids = {}
+    for offset in range(0, len(names), batch_size):
+        for name, pk in queryset.filter(name__in=names[offset:offset + batch_size]).values_list('name', 'id'):
+            ids.setdefault(name, pk)
+    return ids
+
+
+def transform_pharmacy(entry):
+    errors = []
+    time_slots = parse_opening_hours(entry['openingHours'], on_error=errors.append)
+    return {
+        'name': entry['name'],
+        'cash_balance': entry['cashBalance'],
+        'opening_hours': entry['openingHours'],
+        'time_slots': time_slots,
+        'masks': [(mask['name'], mask['price']) for mask in entry.get('masks', [])],
+        'errors': errors,
+    }
+
+
+def transform_user(entry):
+    purchases = []
+    for purchase in entry.get('purchaseHistories', []):
+        # 原始資料沒有時區資訊，與設定的 TIME_ZONE 相同視為 UTC
+        transacted_at = datetime.strptime(purchase['transactionDate'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+        purchases.append({
+            'pharmacy_name': purchase['pharmacyName'],
+            'mask_name': purchase['maskName'],
+            'transaction_amount': purchase['transactionAmount'],
+            'transacted_at': transacted_at,
+        })
+    return {
+        'name': entry['name'],
+        'cash_balance': entry['cashBalance'],
+        'purchases': purchases,
+    }
+
+
+class LoadReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = defaultdict(int)
+        self.changes = defaultdict(lambda: {'inserted': 0, 'updated': 0, 'deleted': 0})
+        self.skipped = 0
+
+    def add(self, table, count):
+        self.rows[table] += count
+
+    def change(self, table, inserted=0, updated=0, deleted=0):
+        changes = self.changes[table]
+        changes['inserted'] += inserted
+        changes['updated'] += updated
+        changes['deleted'] += deleted
+        self.add(table, inserted + updated + deleted)
+
+    @property
+    def changed(self):
+        return any(any(changes.values()) for changes in self.changes.values())
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        total = sum(self.rows.values())
+        tables = ', '.join(f'{table}: {count}' for table, count in self.rows.items())
+        message = f'{total} rows in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} rows/s) [{tables}]'
+        if self.skipped:
+            message += f', {self.skipped} skipped'
+        for table, changes in self.changes.items():
+            message += f"\n  {table}: {changes['inserted']} inserted, {changes['updated']} updated, {changes['deleted']} deleted"
+        return message
@@ -0,0 +1,107 @@
+import csv
+import json
+
+from django.db import router
+from django.db.models import F, Q
+
+from .models import PurchaseHistory
+from .rollups import day_bounds
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_FIELDS = (
+    'id', 'transacted_at', 'user_id', 'user_name', 'pharmacy_id', 'pharmacy_name',
+    'mask_id', 'mask_name', 'quantity', 'transaction_amount',
+)
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_queryset(start_date, end_date, user_name=None, pharmacy_id=None):
+    start, end = day_bounds(start_date, end_date)
+    # 串流回應在 view 回傳、請求的資料庫路由已還原後才讀取，於此先決定讀取的資料庫
+    histories = PurchaseHistory.objects.using(router.db_for_read(PurchaseHistory)).filter(transacted_at__gte=start, transacted_at__lt=end)
+    if user_name:
+        histories = histories.filter(user__name=user_name)
+    if pharmacy_id is not None:
+        histories = histories.filter(pharmacy_id=pharmacy_id)
+    return histories.annotate(user_name=F('user__name')).values(*EXPORT_FIELDS)
+
+
+def iter_rows(histories, chunk_size=2000):
+    """
+    依 (transacted_at, id) 分批讀取，每批只查詢 chunk_size 筆。
+    MySQL 的驅動程式會把整個結果集載入記憶體，分批 seek 讓任何資料庫都維持固定的記憶體用量。
+    """
+    position = None
+    while True:
+        rows = list(next_chunk(histories, position, chunk_size))
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        position = (rows[-1]['transacted_at'], rows[-1]['id'])
+
+
+async def aiter_rows(histories, chunk_size=2000):
+    # iter_rows 的非同步版本，等待資料庫時不佔用 ASGI 的事件迴圈
+    position = None
+    while True:
+        rows = [row async for row in next_chunk(histories, position, chunk_size)]
+        for row in rows:
+            yield row
+        if len(rows) < chunk_size:
+            return
+        position = (rows[-1]['transacted_at'], rows[-1]['id'])
+
+
+def next_chunk(histories, position, chunk_size):
+    if position is not None:
+        transacted_at, pk = position
+        histories = histories.filter(Q(transacted_at__gt=transacted_at) | Q(transacted_at=transacted_at, id__gt=pk))
+    return histories.order_by('transacted_at', 'id')[:chunk_size]
+
+
+def serialize_row(row):
+    return {
+        **row,
+        'transacted_at': row['transacted_at'].isoformat(),
+        'transaction_amount': str(row['transaction_amount']),
+    }
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(serialize_row(row)) + '\n'
+
+
+class _LineBuffer:
+    # csv.writer 需要具有 write() 的物件，這裡直接回傳寫入的內容以便逐行輸出
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        row = serialize_row(row)
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+def export_lines(histories, file_format, chunk_size=2000):
+    rows = iter_rows(histories, chunk_size)
+    return csv_lines(rows) if file_format == 'csv' else ndjson_lines(rows)
+
+
+async def aexport_lines(histories, file_format, chunk_size=2000):
+    """export_lines 的非同步版本，供 ASGI 下的 StreamingHttpResponse 使用。"""
+    if file_format == 'csv':
+        writer = csv.writer(_LineBuffer())
+        yield writer.writerow(EXPORT_FIELDS)
+    async for row in aiter_rows(histories, chunk_size):
+        row = serialize_row(row)
+        if file_format == 'csv':
+            yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+        else:
+            yield json.dumps(row) + '\n'
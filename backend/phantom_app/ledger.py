@@ -0,0 +1,119 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, DecimalField, F, Min, Value, When
+from django.utils import timezone
+
+from .metrics import Gauge
+from .models import Pharmacy, PurchaseHistory, PurchaseLedgerEntry
+from .pharmacy_stats import record_pharmacy_sales
+from .rollups import record_transactions
+from .versions import TRANSACTIONS, bump_version
+
+LEDGER_FIELDS = (
+    'user_id', 'pharmacy_id', 'mask_id', 'pharmacy_name', 'mask_name', 'quantity', 'transaction_amount', 'transacted_at',
+)
+
+
+def ledger_entries(histories):
+    # 帳本紀錄與購買紀錄的欄位相同，套用時原樣轉為 PurchaseHistory
+    return [PurchaseLedgerEntry(**{field: getattr(history, field) for field in LEDGER_FIELDS}) for history in histories]
+
+
+def pending_entries():
+    # 藥局在套用前被刪除（pharmacy 為 SET_NULL）的紀錄無法入帳，不套用也不刪除，留在帳本中等待人工處理
+    return PurchaseLedgerEntry.objects.filter(applied_at=None, pharmacy__isnull=False)
+
+
+def orphaned_entries():
+    """藥局已被刪除而無法套用的帳本紀錄；用戶已扣款，需改為其他藥局（下一批即會套用）或退款後刪除。"""
+    return PurchaseLedgerEntry.objects.filter(applied_at=None, pharmacy=None)
+
+
+def apply_ledger(batch_size=500):
+    """
+    依寫入順序取出最多 batch_size 筆未套用的帳本紀錄，在同一個交易內寫入購買紀錄、藥局餘額、藥局統計與每日彙總，
+    並標記為已套用，回傳套用的紀錄。套用與標記一起提交，中途中斷時整批維持未套用，重新執行即可補上。
+    """
+    with transaction.atomic():
+        pending = pending_entries().order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            # 多個 flusher 同時執行時各自取得不同的紀錄
+            pending = pending.select_for_update(skip_locked=True)
+        entries = list(pending[:batch_size])
+        if not entries:
+            return []
+
+        # 條件式 UPDATE 標記為已套用：不支援 SKIP LOCKED 的資料庫上，其他 flusher 已套用的紀錄不會再套用一次
+        applied_at = timezone.now()
+        marked = PurchaseLedgerEntry.objects.filter(pk__in=[entry.pk for entry in entries], applied_at=None).update(
+            applied_at=applied_at
+        )
+        if marked != len(entries):
+            transaction.set_rollback(True)
+            return []
+
+        credits = defaultdict(int)
+        sales_counts = defaultdict(int)
+        rollups = defaultdict(lambda: [0, 0, 0])
+        for entry in entries:
+            credits[entry.pharmacy_id] += entry.transaction_amount
+            sales_counts[entry.pharmacy_id] += 1
+            totals = rollups[(entry.user_id, timezone.localdate(entry.transacted_at))]
+            totals[0] += 1
+            totals[1] += entry.quantity
+            totals[2] += entry.transaction_amount
+
+        # 鎖定順序與即時購買相同：藥局 -> 藥局統計 -> 每日彙總；用戶已在購買時扣款，這裡不再鎖定
+        Pharmacy.objects.filter(pk__in=credits).update(
+            cash_balance=F('cash_balance') + Case(
+                *[When(pk=pharmacy_id, then=Value(amount)) for pharmacy_id, amount in credits.items()],
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
+        PurchaseHistory.objects.bulk_create([
+            PurchaseHistory(**{field: getattr(entry, field) for field in LEDGER_FIELDS}) for entry in entries
+        ])
+        record_pharmacy_sales({pharmacy_id: (sales_counts[pharmacy_id], amount) for pharmacy_id, amount in credits.items()})
+        for (user_id, date), (transaction_count, mask_count, total_amount) in sorted(rollups.items()):
+            record_transactions(user_id, date, transaction_count, mask_count, total_amount)
+
+        for entry in entries:
+            entry.applied_at = applied_at
+
+    bump_version(TRANSACTIONS)
+    return entries
+
+
+def ledger_backlog():
+    """回傳等待套用的帳本紀錄筆數與最舊一筆的購買時間，不含無法套用的 orphaned_entries。"""
+    backlog = pending_entries().aggregate(
+        depth=Count('id'), oldest=Min('transacted_at'),
+    )
+    return backlog['depth'], backlog['oldest']
+
+
+def purge_ledger(retention):
+    """刪除套用超過 retention（timedelta）的帳本紀錄，回傳刪除的筆數；購買紀錄已保存同樣的資料。"""
+    deleted, _ = PurchaseLedgerEntry.objects.filter(applied_at__lt=timezone.now() - retention).delete()
+    return deleted
+
+
+def flush_lag(entries):
+    # 購買到寫入購買紀錄之間的最長延遲
+    return max((entry.applied_at - entry.transacted_at for entry in entries), default=timedelta(0))
+
+
+def backlog_age():
+    _, oldest = ledger_backlog()
+    return (timezone.now() - oldest).total_seconds() if oldest else 0.0
+
+
+# PURCHASE_LEDGER=True 時加入 /metrics，數值於每次抓取時查詢資料庫，各行程回報相同的值
+LEDGER_METRICS = [
+    Gauge('phantom_ledger_queue_depth', 'Purchase ledger entries not yet applied.', lambda: ledger_backlog()[0]),
+    Gauge('phantom_ledger_flush_lag_seconds', 'Age of the oldest unapplied purchase ledger entry.', backlog_age),
+    Gauge('phantom_ledger_orphaned_entries', 'Unapplied purchase ledger entries whose pharmacy was deleted.',
+          lambda: orphaned_entries().count()),
+]
@@ -0,0 +1,304 @@
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from phantom_app.models import Mask, Pharmacy, PurchaseHistory, User
+from phantom_app.synthetic import MASK_BRANDS, generate_pharmacies, generate_users, write_json
+
+# 1x 與 data/ 中的範例資料大小相同
+BASE_PHARMACIES = 20
+BASE_USERS = 20
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thur', 'Fri', 'Sat', 'Sun']
+REPORTED_SETTINGS = [
+    'DEBUG', 'OPENING_HOURS_INDEX', 'TRANSACTION_ROLLUPS', 'SEARCH_BACKEND',
+    'RESPONSE_CACHE', 'ORJSON_RENDERER', 'REQUEST_METRICS',
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _, _ in samples)
+    queries = [count for _, count, _ in samples]
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+        'status': {str(code): count for code, count in sorted(Counter(code for _, _, code in samples).items())},
+    }
+
+
+def write_dataset(scale, seed, dataset_dir):
+    """產生 scale 倍於 data/ 的藥局與使用者資料並寫成 JSON，回傳兩個檔案的路徑。"""
+    pharmacies_path = os.path.join(dataset_dir, f'pharmacies_{scale}x.json')
+    users_path = os.path.join(dataset_dir, f'users_{scale}x.json')
+    pharmacies = list(generate_pharmacies(BASE_PHARMACIES * scale, seed=seed))
+    write_json(pharmacies_path, pharmacies)
+    write_json(users_path, generate_users(BASE_USERS * scale, pharmacies, seed=seed))
+    return pharmacies_path, users_path
+
+
+def create_test_database(directory, label):
+    """
+    建立並切換到測試資料庫，回傳原本的資料庫名稱供 destroy_test_db 使用，不影響設定中的資料庫。
+    SQLite 改用檔案，讓多個執行緒與伺服器行程共用同一份資料。
+    """
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+        test_settings['NAME'] = os.path.join(directory, f'benchmark_{label}.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    # 副本在測試時以主資料庫為鏡像，導向副本的讀取同樣讀到測試資料庫
+    for alias in connections:
+        if connections[alias].settings_dict.get('TEST', {}).get('MIRROR') == connection.alias:
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    return old_name
+
+
+def import_dataset(pharmacies_path, users_path):
+    with open(os.devnull, 'w') as devnull:
+        call_command('import_json', pharmacies_path, stdout=devnull)
+        call_command('import_users', users_path, stdout=devnull)
+
+
+def git_revision():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+class Workload:
+    """以固定的亂數種子產生各 API 的請求參數，同一個資料集與種子每次產生相同的請求序列。"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.pharmacy_names = list(Pharmacy.objects.order_by('id').values_list('name', flat=True))
+        self.user_names = list(User.objects.order_by('id').values_list('name', flat=True))
+        self.catalogue = list(Mask.objects.order_by('id').values_list('pharmacy__name', 'name'))
+
+    def date_range(self, max_days):
+        start = date(2021, 1, 1) + timedelta(days=self.rng.randrange(365))
+        return {'start_date': start.isoformat(), 'end_date': (start + timedelta(days=self.rng.randrange(max_days))).isoformat()}
+
+    def opening_hours(self):
+        return {'weekday': self.rng.choice(WEEKDAYS), 'time': f'{self.rng.randrange(24):02d}:{self.rng.choice([0, 30]):02d}'}
+
+    def masks(self):
+        return {'pharmacy_name': self.rng.choice(self.pharmacy_names), 'sort_by': self.rng.choice(['name', 'price'])}
+
+    def mask_count(self):
+        low = self.rng.randrange(0, 20)
+        return {
+            'comparison': self.rng.choice(['more', 'less']),
+            'count': self.rng.randint(1, 10),
+            'min_price': low,
+            'max_price': low + self.rng.randrange(5, 40),
+        }
+
+    def top_transactions(self):
+        return {'top_x': self.rng.choice([5, 10, 50]), **self.date_range(90)}
+
+    def total(self):
+        return self.date_range(90)
+
+    def export(self):
+        return {'file_format': self.rng.choice(['ndjson', 'csv']), **self.date_range(2)}
+
+    def search_term(self):
+        # 完整名稱、名稱中的單字、品牌與拼錯的字各佔一部分
+        if self.rng.random() < 0.5:
+            name = self.rng.choice(self.pharmacy_names)
+        else:
+            name = self.rng.choice(self.catalogue)[1]
+        choice = self.rng.random()
+        if choice < 0.25:
+            return name
+        if choice < 0.5:
+            return self.rng.choice(name.split())
+        if choice < 0.75:
+            return self.rng.choice(MASK_BRANDS)
+        word = self.rng.choice(name.split())
+        position = self.rng.randrange(len(word))
+        return word[:position] + word[position + 1:] or word
+
+    def search(self):
+        return {'search_term': self.search_term()}
+
+    def suggest(self):
+        term = self.search_term()
+        return {'search_term': term[:self.rng.randint(1, min(len(term), 8))]}
+
+    def purchase(self):
+        pharmacy_name, mask_name = self.rng.choice(self.catalogue)
+        return {
+            'user_name': self.rng.choice(self.user_names),
+            'pharmacy_name': pharmacy_name,
+            'mask_name': mask_name,
+            'quantity': self.rng.randint(1, 3),
+        }
+
+    def batch_purchase(self):
+        items = []
+        for _ in range(self.rng.randint(2, 4)):
+            pharmacy_name, mask_name = self.rng.choice(self.catalogue)
+            items.append({'pharmacy_name': pharmacy_name, 'mask_name': mask_name, 'quantity': self.rng.randint(1, 3)})
+        return {'user_name': self.rng.choice(self.user_names), 'items': items}
+
+
+READ_ENDPOINTS = [
+    ('opening-hours', '/pharmacies/opening-hours/', Workload.opening_hours),
+    ('masks', '/pharmacies/masks/', Workload.masks),
+    ('mask-count', '/pharmacies/mask-count/', Workload.mask_count),
+    ('top-transactions', '/users/top-transactions/', Workload.top_transactions),
+    ('total', '/transactions/total/', Workload.total),
+    ('export', '/transactions/export/', Workload.export),
+    ('search', '/search/', Workload.search),
+    ('suggest', '/search/suggest/', Workload.suggest),
+]
+WRITE_ENDPOINTS = [
+    ('purchase-mask', '/purchase-mask/', Workload.purchase),
+    ('purchase-masks', '/purchase-masks/', Workload.batch_purchase),
+]
+
+
+def send(client, method, path, data):
+    # 讀取副本（DB_REPLICA_*）的請求查詢的是另一個連線，每個資料庫別名各自記錄查詢後加總
+    with ExitStack() as stack:
+        queries = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+        started = time.perf_counter()
+        if method == 'post':
+            response = client.post(path, data, content_type='application/json')
+        else:
+            response = client.get(path, data)
+        # 串流回應在讀取內容時才查詢資料庫；ASYNC_VIEWS 的非同步串流由 HttpResponse.__iter__ 轉為同步讀取
+        if response.streaming:
+            b''.join(response)
+        latency = (time.perf_counter() - started) * 1000
+    return latency, sum(len(captured) for captured in queries), response.status_code
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate seeded synthetic datasets at several scales, import them into a throwaway test database '
+        'and report per-endpoint latency, throughput and query counts as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', default=[1, 100],
+                            help='Dataset sizes as multiples of data/ (20 pharmacies, 20 users), e.g. 1 100 10000')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per read endpoint')
+        parser.add_argument('--purchases', type=int, default=500, help='Purchase requests per write endpoint')
+        parser.add_argument('--workers', type=int, default=8, help='Threads sending purchases concurrently')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--dataset-dir', type=str,
+                            help='Keep the generated pharmacies/users JSON files here instead of a temporary directory')
+        parser.add_argument('--output', type=str, help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        report = {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'settings': {name: getattr(settings, name, None) for name in REPORTED_SETTINGS},
+            'seed': options['seed'],
+            'runs': [],
+        }
+        # 餘額不足等預期中的 4xx 不逐筆輸出警告
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                dataset_dir = options['dataset_dir'] or directory
+                os.makedirs(dataset_dir, exist_ok=True)
+                for scale in options['scales']:
+                    report['runs'].append(self.run_scale(scale, dataset_dir, directory, options))
+        finally:
+            request_logger.setLevel(level)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def log(self, message):
+        # 進度輸出到 stderr，stdout 只有 JSON 報告
+        self.stderr.write(message)
+
+    def run_scale(self, scale, dataset_dir, directory, options):
+        self.log(f'{scale}x: generating {BASE_PHARMACIES * scale} pharmacies and {BASE_USERS * scale} users')
+        pharmacies_path, users_path = write_dataset(scale, options['seed'], dataset_dir)
+
+        old_name = create_test_database(directory, f'{scale}x')
+        try:
+            started = time.perf_counter()
+            import_dataset(pharmacies_path, users_path)
+            run = {
+                'scale': scale,
+                'pharmacies': Pharmacy.objects.count(),
+                'masks': Mask.objects.count(),
+                'users': User.objects.count(),
+                'purchase_histories': PurchaseHistory.objects.count(),
+                'import_seconds': round(time.perf_counter() - started, 2),
+                'endpoints': {},
+            }
+
+            workload = Workload(options['seed'])
+            client = Client(HTTP_HOST='localhost')
+            for name, path, params in READ_ENDPOINTS:
+                self.log(f'{scale}x: {name}')
+                # 第一個請求建立行程內索引，不列入統計
+                send(client, 'get', path, params(workload))
+                requests = [params(workload) for _ in range(options['requests'])]
+                started = time.perf_counter()
+                samples = [send(client, 'get', path, data) for data in requests]
+                run['endpoints'][name] = summarize(samples, time.perf_counter() - started)
+
+            for name, path, params in WRITE_ENDPOINTS:
+                self.log(f"{scale}x: {name} with {options['workers']} workers")
+                run['endpoints'][name] = self.concurrent(path, [params(workload) for _ in range(options['purchases'])], options['workers'])
+            return run
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def concurrent(self, path, requests, workers):
+        def purchase(data):
+            try:
+                return send(Client(HTTP_HOST='localhost'), 'post', path, data)
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            samples = list(executor.map(purchase, requests))
+        return {'workers': workers, **summarize(samples, time.perf_counter() - started)}
@@ -0,0 +1,82 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from phantom_app.analytics import GROUP_BY_FIELDS, ColumnarSnapshot, database_breakdown, np
+from phantom_app.synthetic import generate_pharmacies, generate_users, load_pharmacies, load_users
+from phantom_app.versions import TRANSACTIONS, bump_version
+
+RANGES = [
+    ('year', date(2021, 1, 1), date(2021, 12, 31)),
+    ('month', date(2021, 6, 1), date(2021, 6, 30)),
+    ('day', date(2021, 6, 15), date(2021, 6, 15)),
+]
+APPENDED_USERS = 200
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the columnar analytics snapshot against the equivalent ORM aggregates (data is rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000],
+                            help='Numbers of synthetic users to measure (about 5 purchases each)')
+        parser.add_argument('--pharmacies', type=int, default=1000)
+        parser.add_argument('--top-x', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=3, help='Times each query is run per size')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('numpy is not installed; the columnar snapshot is unavailable.')
+
+        self.stdout.write(f"{'histories':>10} {'group_by':<13} {'range':<6} {'orm ms':>9} {'columnar ms':>12} {'speedup':>8}")
+        with transaction.atomic():
+            pharmacies = list(generate_pharmacies(options['pharmacies'], seed=options['seed']))
+            load_pharmacies(pharmacies)
+            created = 0
+            for size in sorted(options['users']):
+                load_users(generate_users(size - created, pharmacies, seed=options['seed'], start=created))
+                created = size
+                self.measure_size(options)
+
+                # 新增一批購買紀錄，比較增量更新與完整重建快照的時間
+                snapshot = ColumnarSnapshot()
+                snapshot.get()
+                load_users(generate_users(APPENDED_USERS, pharmacies, seed=options['seed'] + 1, start=created))
+                created += APPENDED_USERS
+                bump_version(TRANSACTIONS)
+                refresh_ms = self.timed(snapshot.get)
+                build_ms = self.timed(ColumnarSnapshot().get)
+                self.stdout.write(
+                    f'{len(snapshot.get()):>10} snapshot: full build {build_ms:.1f} ms, '
+                    f'incremental refresh after {APPENDED_USERS} users {refresh_ms:.1f} ms'
+                )
+
+            transaction.set_rollback(True)
+
+    def measure_size(self, options):
+        snapshot = ColumnarSnapshot()
+        snapshot.get()
+        for group_by in GROUP_BY_FIELDS:
+            for name, start_date, end_date in RANGES:
+                arguments = (start_date, end_date, group_by, 'total_amount', options['top_x'])
+                orm_ms, expected = self.measure(database_breakdown, arguments, options['repeat'])
+                columnar_ms, results = self.measure(snapshot.breakdown, arguments, options['repeat'])
+                if results != expected:
+                    raise CommandError(f'Columnar results differ from the ORM for {group_by} over {name}')
+                self.stdout.write(
+                    f'{len(snapshot.get()):>10} {group_by:<13} {name:<6} {orm_ms:>9.2f} {columnar_ms:>12.2f} '
+                    f'{orm_ms / columnar_ms:>8.1f}'
+                )
+
+    def measure(self, breakdown, arguments, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            results = breakdown(*arguments)
+        return (time.perf_counter() - started) / repeat * 1000, results
+
+    def timed(self, function):
+        started = time.perf_counter()
+        function()
+        return (time.perf_counter() - started) * 1000
@@ -0,0 +1,276 @@
+import asyncio
+import itertools
+import json
+import os
+import platform
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from phantom_app.management.commands.benchmark import (
+    READ_ENDPOINTS, WRITE_ENDPOINTS, Workload, create_test_database, git_revision, import_dataset, percentile,
+    write_dataset,
+)
+from phantom_app.models import Mask, Pharmacy, PurchaseHistory, User
+
+# 每種部署方式的伺服器指令與 ASYNC_VIEWS 設定；asgi-sync 以 ASGI 伺服器執行同步 view，用來區分伺服器與 view 的影響
+SERVERS = {
+    'wsgi': (
+        '{python} -m gunicorn server.wsgi:application --bind 127.0.0.1:{port} '
+        '--workers {workers} --threads {threads} --worker-class gthread --log-level warning',
+        False,
+    ),
+    'asgi': (
+        '{python} -m uvicorn server.asgi:application --host 127.0.0.1 --port {port} '
+        '--workers {workers} --no-access-log --log-level warning',
+        True,
+    ),
+    'asgi-sync': (
+        '{python} -m uvicorn server.asgi:application --host 127.0.0.1 --port {port} '
+        '--workers {workers} --no-access-log --log-level warning',
+        False,
+    ),
+}
+READY_PATH = '/search/suggest/?search_term=a'
+READY_TIMEOUT = 30
+
+
+class HTTPConnection:
+    """最小的 HTTP/1.1 keep-alive 客戶端，每個模擬的連線各持有一條 TCP 連線，只讀取狀態碼並丟棄內容。"""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, target, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+        lines = [f'{method} {target} HTTP/1.1', f'Host: 127.0.0.1:{self.port}']
+        if body is not None:
+            lines += ['Content-Type: application/json', f'Content-Length: {len(body)}']
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + (body or b''))
+        await self.writer.drain()
+
+        status_code = int((await self.reader.readline()).split()[1])
+        length, chunked, close = None, False, False
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'transfer-encoding':
+                chunked = 'chunked' in value
+            elif name == 'connection':
+                close = value == 'close'
+
+        # 串流回應（匯出）以 chunked 傳送
+        if chunked:
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif length is not None:
+            await self.reader.readexactly(length)
+        else:
+            await self.reader.read()
+            close = True
+        if close:
+            self.close()
+        return status_code
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _ in samples)
+    statuses = Counter(status_code for _, status_code in samples)
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None,
+        # 0 表示連線錯誤或逾時
+        'status': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent-connection throughput of the WSGI deployment (gunicorn, sync views) with the ASGI '
+        'deployment (uvicorn, async views) on a seeded synthetic dataset in a throwaway test database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10,
+                            help='Dataset size as a multiple of data/ (20 pharmacies, 20 users)')
+        parser.add_argument('--modes', nargs='+', choices=list(SERVERS), default=['wsgi', 'asgi'])
+        parser.add_argument('--connections', type=int, nargs='+', default=[1, 16, 64],
+                            help='Numbers of concurrent keep-alive connections to measure')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds each concurrency level runs')
+        parser.add_argument('--workers', type=int, default=1, help='Server worker processes')
+        parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker')
+        parser.add_argument('--purchase-ratio', type=float, default=0.1,
+                            help='Fraction of requests that are purchases; the rest cycle through the read endpoints')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as failed')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', type=str, help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        for mode in options['modes']:
+            module = 'gunicorn' if mode == 'wsgi' else 'uvicorn'
+            if subprocess.run([sys.executable, '-c', f'import {module}'], capture_output=True).returncode:
+                raise CommandError(f'{module} is not installed; run `pip install {module}` to benchmark {mode}.')
+
+        report = {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'cpus': os.cpu_count(),
+            'scale': options['scale'],
+            'seed': options['seed'],
+            'duration_seconds': options['duration'],
+            'purchase_ratio': options['purchase_ratio'],
+            'runs': {},
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            self.log(f"{options['scale']}x: generating the dataset")
+            paths = write_dataset(options['scale'], options['seed'], directory)
+            requests = None
+            for mode in options['modes']:
+                # 每種部署方式各自從剛匯入的資料開始，購買造成的餘額變化不會影響下一種
+                old_name = create_test_database(directory, f"asgi_{options['scale']}x")
+                try:
+                    import_dataset(*paths)
+                    if requests is None:
+                        report['dataset'] = {
+                            'pharmacies': Pharmacy.objects.count(),
+                            'masks': Mask.objects.count(),
+                            'users': User.objects.count(),
+                            'purchase_histories': PurchaseHistory.objects.count(),
+                        }
+                        requests = self.requests(options)
+                    # 伺服器行程連到同一個測試資料庫
+                    database_name = connection.settings_dict['NAME']
+                    connections.close_all()
+                    report['runs'][mode] = self.run_mode(mode, database_name, requests, directory, options)
+                finally:
+                    connections.close_all()
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def log(self, message):
+        # 進度輸出到 stderr，stdout 只有 JSON 報告
+        self.stderr.write(message)
+
+    def requests(self, options, count=5000):
+        """以固定種子產生 (method, target, body) 的請求序列，各部署方式送出相同的請求。"""
+        workload = Workload(options['seed'])
+        endpoints = [(path, params) for _, path, params in READ_ENDPOINTS]
+        requests = []
+        for index in range(count):
+            if workload.rng.random() < options['purchase_ratio']:
+                _, path, params = WRITE_ENDPOINTS[0]
+                requests.append(('POST', path, json.dumps(params(workload)).encode()))
+            else:
+                path, params = endpoints[index % len(endpoints)]
+                requests.append(('GET', f'{path}?{urlencode(params(workload))}', None))
+        return requests
+
+    def run_mode(self, mode, database_name, requests, directory, options):
+        command, async_views = SERVERS[mode]
+        port = free_port()
+        command = command.format(
+            python=sys.executable, port=port, workers=options['workers'], threads=options['threads'],
+        )
+        env = {**os.environ, 'DB_NAME': database_name, 'ASYNC_VIEWS': str(async_views)}
+        if 'replica' in settings.DATABASES:
+            # 與 create_test_database 相同，副本以測試資料庫為鏡像
+            env.update({f'DB_REPLICA_{key}': str(connection.settings_dict[key] or '') for key in ('USER', 'PASSWORD', 'HOST', 'PORT')})
+            env['DB_REPLICA_NAME'] = database_name
+        log_path = os.path.join(directory, f'{mode}.log')
+        self.log(f'{mode}: {command}')
+        with open(log_path, 'w') as log:
+            process = subprocess.Popen(
+                shlex.split(command), cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+            )
+        try:
+            self.wait_until_ready(process, port, log_path)
+            results = {}
+            for concurrency in options['connections']:
+                self.log(f'{mode}: {concurrency} connections for {options["duration"]}s')
+                results[str(concurrency)] = asyncio.run(self.load(port, requests, concurrency, options))
+            return {'command': command, 'async_views': async_views, 'connections': results}
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def wait_until_ready(self, process, port, log_path):
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                break
+            try:
+                # 第一個請求同時建立行程內的索引
+                if asyncio.run(HTTPConnection(port).request('GET', READY_PATH)) == 200:
+                    return
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                pass
+            time.sleep(0.2)
+        with open(log_path) as log:
+            output = log.read()[-2000:]
+        raise CommandError(f'The server did not start on port {port}:\n{output}')
+
+    async def load(self, port, requests, concurrency, options):
+        samples = []
+        started = time.perf_counter()
+        deadline = started + options['duration']
+
+        async def client(offset):
+            # 每條連線從不同位置開始循環請求序列
+            http = HTTPConnection(port)
+            for method, target, body in itertools.islice(itertools.cycle(requests), offset, None):
+                if time.perf_counter() >= deadline:
+                    break
+                sent = time.perf_counter()
+                try:
+                    status_code = await asyncio.wait_for(http.request(method, target, body), options['timeout'])
+                except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    status_code = 0
+                    http.close()
+                samples.append(((time.perf_counter() - sent) * 1000, status_code))
+            http.close()
+
+        step = max(len(requests) // concurrency, 1)
+        await asyncio.gather(*(client(index * step) for index in range(concurrency)))
+        return summarize(samples, time.perf_counter() - started)
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from phantom_app.etl import PHARMACY_FIELDS, USER_FIELDS, LoadReport, run_pipeline, transform_pharmacy, transform_user
+from phantom_app.synthetic import generate_pharmacies, generate_users
+
+PIPELINES = {
+    'pharmacies': (PHARMACY_FIELDS, transform_pharmacy),
+    'users': (USER_FIELDS, transform_user),
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure how the parse/transform stage of the import pipeline scales with --workers on synthetic JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(PIPELINES), default='pharmacies')
+        parser.add_argument('--records', type=int, default=1000000)
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        fields, transform = PIPELINES[options['kind']]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f"{options['kind']}.jsonl")
+            self.write_records(path, options)
+
+            self.stdout.write(f"{'workers':>8} {'seconds':>10} {'records/s':>12} {'speedup':>8}")
+            baseline = None
+            for workers in options['workers']:
+                digest = hashlib.sha256()
+                report = LoadReport()
+
+                started = time.perf_counter()
+                # 以雜湊取代寫入資料庫，只量測解析與轉換，同時確認輸出與單一行程相同
+                run_pipeline(
+                    path, fields, transform,
+                    load=lambda records: digest.update(repr(records).encode()),
+                    report=report,
+                    batch_size=options['batch_size'],
+                    format='jsonl',
+                    workers=workers,
+                )
+                elapsed = time.perf_counter() - started
+
+                if baseline is None:
+                    baseline = (elapsed, digest.hexdigest())
+                elif digest.hexdigest() != baseline[1]:
+                    raise CommandError(f'Output with {workers} workers differs from the first run')
+
+                self.stdout.write(
+                    f"{workers:>8} {elapsed:>10.2f} {options['records'] / elapsed:>12.0f} {baseline[0] / elapsed:>8.2f}"
+                )
+
+    def write_records(self, path, options):
+        pharmacies = generate_pharmacies(
+            options['records'] if options['kind'] == 'pharmacies' else 1000, seed=options['seed']
+        )
+        if options['kind'] == 'users':
+            pharmacies = generate_users(options['records'], list(pharmacies), seed=options['seed'])
+
+        with open(path, 'w') as file:
+            for record in pharmacies:
+                file.write(json.dumps(record))
+                file.write('\n')
@@ -0,0 +1,51 @@
+import random
+import time
+from datetime import time as dt_time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from phantom_app.opening_hours import DAYS_OF_WEEK
+from phantom_app.opening_hours_index import OpeningHoursIndex, query_open_pharmacies
+from phantom_app.synthetic import generate_pharmacies, load_pharmacies
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the in-memory opening hours index against the ORM query (data is rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000],
+                            help='Numbers of synthetic pharmacies to measure')
+        parser.add_argument('--queries', type=int, default=50, help='Random (weekday, time) queries per size')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        queries = [
+            (rng.choice(DAYS_OF_WEEK), dt_time(rng.randrange(24), rng.randrange(60)))
+            for _ in range(options['queries'])
+        ]
+
+        self.stdout.write(f"{'pharmacies':>10} {'orm ms':>10} {'build ms':>10} {'index us':>10} {'repeat us':>10}")
+        with transaction.atomic():
+            created = 0
+            for size in sorted(options['sizes']):
+                load_pharmacies(generate_pharmacies(size - created, seed=options['seed'], start=created))
+                created = size
+
+                orm_ms = self.measure(query_open_pharmacies, queries) * 1000
+
+                started = time.perf_counter()
+                index = OpeningHoursIndex().build()
+                build_ms = (time.perf_counter() - started) * 1000
+                index_us = self.measure(index.open_at, queries) * 1000000
+                repeat_us = self.measure(index.open_at, queries) * 1000000
+
+                self.stdout.write(f'{size:>10} {orm_ms:>10.2f} {build_ms:>10.1f} {index_us:>10.1f} {repeat_us:>10.1f}')
+
+            transaction.set_rollback(True)
+
+    def measure(self, lookup, queries):
+        started = time.perf_counter()
+        for weekday, query_time in queries:
+            lookup(weekday, query_time)
+        return (time.perf_counter() - started) / len(queries)
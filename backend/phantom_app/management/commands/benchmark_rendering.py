@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from phantom_app.renderers import ORJSONRenderer, orjson
+from phantom_app.synthetic import generate_pharmacies, load_pharmacies
+from phantom_app.views import PharmaciesByMaskCountAPIView, PharmacyByOpeningHoursAPIView, SearchAPIView
+
+ENDPOINTS = [
+    ('opening-hours', PharmacyByOpeningHoursAPIView, '/pharmacies/opening-hours/', {'weekday': 'Mon', 'time': '10:00'}),
+    ('mask-count', PharmaciesByMaskCountAPIView, '/pharmacies/mask-count/', {'comparison': 'more', 'count': '1', 'max_price': '100'}),
+    ('search', SearchAPIView, '/search/', {'search_term': 'pharmacy', 'limit': '100'}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark list endpoint throughput with the default and the orjson renderer (data is rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pharmacies', type=int, default=5000, help='Number of synthetic pharmacies')
+        parser.add_argument('--requests', type=int, default=20, help='Requests per endpoint and renderer')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write('orjson is not installed; ORJSONRenderer falls back to the default renderer.')
+
+        # 搜尋的分頁連結需要合法的 host
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+        self.stdout.write(f"{'endpoint':<14} {'bytes':>10} {'default req/s':>14} {'orjson req/s':>13} {'render x':>9} {'total x':>8}")
+        # 關閉回應快取，每個請求都實際查詢與編碼
+        with override_settings(RESPONSE_CACHE=False), transaction.atomic():
+            load_pharmacies(generate_pharmacies(options['pharmacies'], seed=options['seed']))
+            for name, view_class, path, params in ENDPOINTS:
+                default = self.measure(factory, view_class, path, params, JSONRenderer, options['requests'])
+                fast = self.measure(factory, view_class, path, params, ORJSONRenderer, options['requests'])
+                if default['content'] != fast['content']:
+                    self.stderr.write(f'{name}: rendered output differs between renderers')
+                self.stdout.write(
+                    f"{name:<14} {len(fast['content']):>10} {default['rate']:>14.1f} {fast['rate']:>13.1f} "
+                    f"{default['render'] / fast['render']:>9.1f} {fast['rate'] / default['rate']:>8.2f}"
+                )
+            transaction.set_rollback(True)
+
+    def measure(self, factory, view_class, path, params, renderer_class, requests):
+        view = view_class.as_view(renderer_classes=[renderer_class])
+        view(factory.get(path, params)).render()  # 預熱記憶體內索引
+
+        render_seconds = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = view(factory.get(path, params))
+            render_started = time.perf_counter()
+            response.render()
+            render_seconds += time.perf_counter() - render_started
+        elapsed = time.perf_counter() - started
+        return {'rate': requests / elapsed, 'render': render_seconds, 'content': response.content}
@@ -0,0 +1,91 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from phantom_app.autocomplete import SuggestionIndex
+from phantom_app.models import Mask, Pharmacy
+from phantom_app.pagination import SearchPagination
+from phantom_app.search_index import SEARCH_ORDERING, SearchIndex, search_database
+from phantom_app.synthetic import generate_pharmacies, load_pharmacies
+
+QUERIES = [
+    'Synthetic Pharmacy 0000042',
+    'pharmacy 0000777',
+    'synthetc pharmcy 0000123',
+    'cotton kiss green 10',
+    'barier',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the inverted search index against the icontains queries (data is rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                            help='Numbers of synthetic pharmacies to measure')
+        parser.add_argument('--repeat', type=int, default=3, help='Times each query is run per size')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'pharmacies':>10} {'query':<28} {'icontains ms':>13} {'index ms':>10} {'hits':>8}")
+        with transaction.atomic():
+            created = 0
+            for size in sorted(options['sizes']):
+                load_pharmacies(generate_pharmacies(size - created, seed=options['seed'], start=created))
+                created = size
+
+                started = time.perf_counter()
+                index = SearchIndex()
+                index.get()
+                self.stdout.write(f'{size:>10} {"(index build)":<28} {"":>13} {(time.perf_counter() - started) * 1000:>10.1f}')
+
+                for query in QUERIES:
+                    database_ms, _ = self.measure(self.database_page, query, options['repeat'])
+                    index_ms, results = self.measure(
+                        lambda term: index.search(term, SearchPagination.default_page_size), query, options['repeat']
+                    )
+                    hits = sum(len(group) for group in results)
+                    self.stdout.write(f'{size:>10} {query:<28} {database_ms:>13.2f} {index_ms:>10.2f} {hits:>8}')
+
+                self.measure_suggestions(size, options['repeat'])
+
+            transaction.set_rollback(True)
+
+    def measure_suggestions(self, size, repeat):
+        # 模擬逐字輸入：每個查詢字串的所有前綴各查詢一次
+        suggestions = SuggestionIndex()
+        started = time.perf_counter()
+        suggestions.get()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        timings = []
+        for _ in range(repeat):
+            for query in QUERIES:
+                for end in range(1, len(query) + 1):
+                    started = time.perf_counter()
+                    suggestions.suggest(query[:end])
+                    timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+        # 逐筆新增一個口罩（signal 遞增目錄版本號），量測只套用異動的增量更新
+        Mask.objects.create(pharmacy=Pharmacy.objects.first(), name='Benchmark Mask (white)', price=1)
+        started = time.perf_counter()
+        suggestions.get()
+        refresh_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f'{size:>10} suggest: build {build_ms:.1f} ms, refresh {refresh_ms:.1f} ms, '
+                          f'p50 {p50:.3f} ms, p99 {p99:.3f} ms')
+
+    def database_page(self, query):
+        # 與 API 相同，每組結果只取第一頁
+        return [
+            list(rows.order_by(*SEARCH_ORDERING)[:SearchPagination.default_page_size])
+            for rows in search_database(query)
+        ]
+
+    def measure(self, search, query, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            results = search(query)
+        return (time.perf_counter() - started) / repeat * 1000, results
@@ -0,0 +1,48 @@
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from phantom_app.exports import EXPORT_FORMATS, export_lines, export_queryset
+from phantom_app.models import Pharmacy
+
+
+class Command(BaseCommand):
+    help = 'Stream purchase history in a date range as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', required=True, help='First date to export (YYYY-MM-DD)')
+        parser.add_argument('--end-date', required=True, help='Last date to export (YYYY-MM-DD)')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--user', help='Only export purchases made by this user name')
+        parser.add_argument('--pharmacy', help='Only export purchases from this pharmacy name')
+        parser.add_argument('--output', help='File to write; defaults to stdout')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per query')
+
+    def handle(self, *args, **options):
+        try:
+            start_date = datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(options['end_date'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('--start-date and --end-date must be in YYYY-MM-DD format')
+
+        pharmacy_id = None
+        if options['pharmacy']:
+            pharmacy_id = Pharmacy.objects.filter(name=options['pharmacy']).values_list('id', flat=True).first()
+            if pharmacy_id is None:
+                raise CommandError(f"Pharmacy '{options['pharmacy']}' does not exist")
+
+        histories = export_queryset(start_date, end_date, user_name=options['user'], pharmacy_id=pharmacy_id)
+        lines = export_lines(histories, options['format'], options['chunk_size'])
+
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            count = 0
+            for line in lines:
+                output.write(line)
+                count += 1
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            rows = count - 1 if options['format'] == 'csv' else count
+            self.stderr.write(f'Exported {rows} rows to {options["output"]}')
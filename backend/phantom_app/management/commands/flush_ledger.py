@@ -0,0 +1,88 @@
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from phantom_app.ledger import apply_ledger, flush_lag, ledger_backlog, orphaned_entries, purge_ledger
+
+logger = logging.getLogger('phantom_app.metrics')
+PURGE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply purchase ledger entries (PURCHASE_LEDGER=True) to PurchaseHistory, pharmacy balances, pharmacy stats '
+        'and the daily rollups in batches, one commit per batch. Entries left unapplied by a crash are replayed first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Ledger entries applied per transaction')
+        parser.add_argument('--interval', type=float, default=0.2,
+                            help='Seconds to wait before polling again when the ledger is drained')
+        parser.add_argument('--retention-hours', type=float, default=24,
+                            help='Delete applied ledger entries older than this; PurchaseHistory keeps the data')
+        parser.add_argument('--once', action='store_true', help='Apply every pending entry and exit instead of polling')
+
+    def handle(self, *args, **options):
+        if not settings.PURCHASE_LEDGER:
+            self.stderr.write('PURCHASE_LEDGER is disabled; only replaying entries already in the ledger')
+
+        # 帳本紀錄與套用結果在同一個交易內提交，重新啟動時未套用的紀錄仍在帳本中，依寫入順序重新套用
+        depth, oldest = ledger_backlog()
+        if depth:
+            self.stdout.write(f'Replaying {depth} unapplied ledger entries (oldest from {oldest.isoformat()})')
+        self.report_orphans()
+
+        retention = timedelta(hours=options['retention_hours'])
+        applied = 0
+        purged_at = float('-inf')
+        try:
+            while True:
+                try:
+                    entries = self.flush(options['batch_size'])
+                except DatabaseError as exc:
+                    # 鎖等待逾時或連線中斷時整批已回滾，稍後重試
+                    logger.warning(json.dumps({'event': 'ledger_flush_failed', 'error': str(exc)}))
+                    close_old_connections()
+                    time.sleep(options['interval'])
+                    continue
+                applied += len(entries)
+
+                if len(entries) < options['batch_size']:
+                    # 帳本清空時才刪除舊紀錄，每分鐘最多一次
+                    if time.monotonic() - purged_at >= PURGE_INTERVAL:
+                        purge_ledger(retention)
+                        self.report_orphans()
+                        purged_at = time.monotonic()
+                    if options['once']:
+                        break
+                    close_old_connections()
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Applied {applied} ledger entries'))
+
+    def flush(self, batch_size):
+        started = time.perf_counter()
+        entries = apply_ledger(batch_size)
+        if entries:
+            logger.info(json.dumps({
+                'event': 'ledger_flush',
+                'entries': len(entries),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                'lag_ms': round(flush_lag(entries).total_seconds() * 1000, 2),
+            }))
+        return entries
+
+    def report_orphans(self):
+        # 藥局已被刪除的紀錄不會套用也不會被刪除，持續警告直到人工處理
+        orphans = list(orphaned_entries().order_by('id').values_list('id', flat=True)[:100])
+        if orphans:
+            logger.warning(json.dumps({
+                'event': 'ledger_orphaned',
+                'entries': orphaned_entries().count(),
+                'entry_ids': orphans,
+            }))
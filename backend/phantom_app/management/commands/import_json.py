@@ -1,158 +1,230 @@
-import json
-import re
-from datetime import datetime, time
-from django.core.management.base import BaseCommand
-from phantom_app.models import Pharmacy, Mask, OpeningHour
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from phantom_app.etl import PHARMACY_FIELDS, Checkpoint, LoadReport, ids_by_name, run_pipeline, transform_pharmacy
+from phantom_app.models import Pharmacy, Mask, OpeningHour, PurchaseHistory
+from phantom_app.pharmacy_stats import rebuild_pharmacy_stats
+from phantom_app.versions import CATALOGUE, OPENING_HOURS, bump_version
 
 class Command(BaseCommand):
     help = 'Import data from JSON files'
 
     def add_arguments(self, parser):
-        parser.add_argument('data_file', type=str, help='Path to the JSON file to import')
+        parser.add_argument('data_file', type=str, help='Path to the JSON or JSON Lines file to import')
+        parser.add_argument('--format', choices=['auto', 'json', 'jsonl'], default='auto',
+                            help='Input format; auto detects a JSON array by its leading "["')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Pharmacies written per transaction')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes used to parse and transform records; loading stays in one process')
+        parser.add_argument('--checkpoint', type=str, help='File recording how many records have been committed')
+        parser.add_argument('--resume', action='store_true', help='Continue from the offset stored in --checkpoint')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Diff against the database and only write changed masks and opening hours')
+        parser.add_argument('--verbose', action='store_true', help='Print a line for every imported row')
 
     def handle(self, *args, **options):
         data_file = options['data_file']
-        with open(data_file, 'r') as file:
-            data = json.load(file)
-        self.import_pharmacies(data)
-
-    def import_pharmacies(self, data):
-        for entry in data:
-            pharmacy, created = Pharmacy.objects.get_or_create(
-                name=entry['name'],
-                defaults={
-                    'cash_balance': entry['cashBalance'],
-                    'opening_hours': entry['openingHours']
-                }
-            )
-            if created:
-                print(f"Created new pharmacy: {pharmacy.name}")
-            else:
-                print(f"Pharmacy already exists: {pharmacy.name}")
-
-            # 處理開放時間
-            self.import_opening_hours(pharmacy, entry['openingHours'])
+        self.verbose = options['verbose']
+        self.incremental = options['incremental']
+        if options['resume'] and not options['checkpoint']:
+            raise CommandError('--resume requires --checkpoint')
+
+        checkpoint = Checkpoint(options['checkpoint'], data_file)
+        start = checkpoint.load() if options['resume'] else 0
+        if start:
+            self.stdout.write(f'Resuming from record {start}')
+
+        report = LoadReport()
+        self.import_pharmacies(data_file, options, checkpoint, start, report)
+        # 增量匯入沒有任何異動時不遞增版本號，避免快取無故失效
+        if not self.incremental or report.changed:
+            bump_version(CATALOGUE, OPENING_HOURS)
+        checkpoint.clear()
+        self.stdout.write(self.style.SUCCESS(f'Successfully imported pharmacy data: {report.summary()}'))
+
+    def log(self, message):
+        if self.verbose:
+            self.stdout.write(message)
+
+    def import_pharmacies(self, data_file, options, checkpoint, start, report):
+        run_pipeline(
+            data_file, PHARMACY_FIELDS, transform_pharmacy,
+            load=lambda records: self.load_chunk(records, report),
+            report=report,
+            batch_size=options['batch_size'],
+            format=options['format'],
+            checkpoint=checkpoint,
+            start=start,
+            workers=options['workers'],
+            on_error=lambda message: self.log(self.style.ERROR(message)),
+        )
+
+    def load_chunk(self, records, report):
+        # 每一批在同一個交易內寫入，失敗時該批不會留下部分資料
+        with transaction.atomic():
+            self.import_chunk(records, report)
+
+    def import_chunk(self, records, report):
+        for record in records:
+            for error in record['errors']:
+                self.stdout.write(self.style.ERROR(error))
+
+        # 同一批內重複的藥局以最後一筆為準
+        records = list({record['name']: record for record in records}.values())
+        existing = {
+            pharmacy.name: pharmacy
+            for pharmacy in Pharmacy.objects.filter(name__in=[record['name'] for record in records])
+        }
+
+        new_pharmacies = [
+            Pharmacy(name=record['name'], cash_balance=record['cash_balance'], opening_hours=record['opening_hours'])
+            for record in records if record['name'] not in existing
+        ]
+        Pharmacy.objects.bulk_create(new_pharmacies)
+
+        # 既有藥局保留目前的現金餘額，只更新原始開放時間字串
+        updated_pharmacies = []
+        for record in records:
+            pharmacy = existing.get(record['name'])
+            if pharmacy is None:
+                self.log(f"Created new pharmacy: {record['name']}")
+                continue
+            self.log(f"Pharmacy already exists: {record['name']}")
+            if not self.incremental or pharmacy.opening_hours != record['opening_hours']:
+                pharmacy.opening_hours = record['opening_hours']
+                updated_pharmacies.append(pharmacy)
+        Pharmacy.objects.bulk_update(updated_pharmacies, ['opening_hours'])
+
+        pharmacy_ids = {name: pharmacy.id for name, pharmacy in existing.items()}
+        pharmacy_ids.update(ids_by_name(Pharmacy.objects, [pharmacy.name for pharmacy in new_pharmacies]))
+
+        if self.incremental:
+            report.change('pharmacies', inserted=len(new_pharmacies), updated=len(updated_pharmacies))
+            self.sync_opening_hours(records, pharmacy_ids, report)
+            # 只有新建立或口罩有異動的藥局需要重新連結購買紀錄與計算統計
+            changed = {pharmacy_ids[pharmacy.name] for pharmacy in new_pharmacies}
+            changed |= self.sync_masks(records, pharmacy_ids, report)
+        else:
+            report.add('pharmacies', len(new_pharmacies))
+            self.import_opening_hours(records, pharmacy_ids, report)
+            self.import_masks(records, pharmacy_ids, report)
+            changed = set(pharmacy_ids.values())
 
-            # 處理面罩
-            self.import_masks(pharmacy, entry.get('masks', []))
+        if changed:
+            self.link_purchase_histories({name: pk for name, pk in pharmacy_ids.items() if pk in changed})
+            # 口罩與購買紀錄的連結都已更新，重新計算這些藥局的統計
+            rebuild_pharmacy_stats(changed)
 
-    def import_opening_hours(self, pharmacy, opening_hours):
-        time_slots = self.parse_opening_hours(opening_hours)
-        
+    def import_opening_hours(self, records, pharmacy_ids, report):
         # 刪除舊的開放時間紀錄
-        OpeningHour.objects.filter(pharmacy=pharmacy).delete()
-
-        for day_of_week, (start_time, end_time) in time_slots.items():
-            OpeningHour.objects.create(
-                pharmacy=pharmacy,
-                day_of_week=day_of_week,
-                start_time=start_time,
-                end_time=end_time
-            )
-            print(f"Added opening hours for {pharmacy.name} on {day_of_week}")
-
-    def import_masks(self, pharmacy, masks):
+        OpeningHour.objects.filter(pharmacy_id__in=pharmacy_ids.values()).delete()
+
+        opening_hours = []
+        for record in records:
+            for day_of_week, start_time, end_time in record['time_slots']:
+                opening_hours.append(OpeningHour(
+                    pharmacy_id=pharmacy_ids[record['name']],
+                    day_of_week=day_of_week,
+                    start_time=start_time,
+                    end_time=end_time
+                ))
+                self.log(f"Added opening hours for {record['name']} on {day_of_week}")
+        OpeningHour.objects.bulk_create(opening_hours)
+        report.add('opening_hours', len(opening_hours))
+
+    def import_masks(self, records, pharmacy_ids, report):
         # 刪除舊的面罩紀錄
-        Mask.objects.filter(pharmacy=pharmacy).delete()
-
-        for mask_data in masks:
-            Mask.objects.create(
-                pharmacy=pharmacy,
-                name=mask_data['name'],
-                price=mask_data['price']
+        Mask.objects.filter(pharmacy_id__in=pharmacy_ids.values()).delete()
+
+        masks = []
+        for record in records:
+            for name, price in record['masks']:
+                masks.append(Mask(pharmacy_id=pharmacy_ids[record['name']], name=name, price=price))
+                self.log(f"Added mask '{name}' to pharmacy {record['name']}")
+        Mask.objects.bulk_create(masks)
+        report.add('masks', len(masks))
+
+    def link_purchase_histories(self, pharmacy_ids):
+        # 重新建立的藥局或口罩會有新的主鍵，依購買紀錄上的名稱重新連結
+        PurchaseHistory.objects.filter(pharmacy__isnull=True, pharmacy_name__in=pharmacy_ids).update(
+            pharmacy_id=Subquery(Pharmacy.objects.filter(name=OuterRef('pharmacy_name')).values('id')[:1])
+        )
+        PurchaseHistory.objects.filter(pharmacy_id__in=pharmacy_ids.values(), mask__isnull=True).update(
+            mask_id=Subquery(
+                Mask.objects.filter(pharmacy_id=OuterRef('pharmacy_id'), name=OuterRef('mask_name')).values('id')[:1]
             )
-            print(f"Added mask '{mask_data['name']}' to pharmacy {pharmacy.name}")
-
-    def parse_opening_hours(self, opening_hours):
-        time_slots = {}
-
-        segments = opening_hours.split('/')
-
-        for segment in segments:
-            segment = segment.strip()
-
-            # 確保 segment 包含空格，以分割天數和時間範圍
-            if ' ' not in segment:
-                continue
-
-            # 分割天數和時間範圍
-            parts = segment.split(' ', 1)
-            if len(parts) < 2:
-                continue
-
-            days, times = parts
-            days = days.strip()
-            times = times.strip()
-
-            # 匹配時間範圍
-            time_pattern = re.compile(
-                r'(?P<days>[A-Za-z, -]+) (?P<start_time>\d{2}:\d{2}) - (?P<end_time>\d{2}:\d{2})'
-            )
-            time_match = time_pattern.match(segment)
-            if not time_match:
-                self.stdout.write(self.style.ERROR(f"Invalid time format in opening hours: {opening_hours}"))
-                continue
-
-            days_str = time_match.group('days').strip()
-            start_time_str = time_match.group('start_time').strip()
-            end_time_str = time_match.group('end_time').strip()
-
-            try:
-                start_time = datetime.strptime(start_time_str, '%H:%M').time()
-                end_time = datetime.strptime(end_time_str, '%H:%M').time()
-
-                # 處理跨日情況
-                time_ranges = self.handle_time_over_midnight(start_time, end_time)
-
-            except ValueError as e:
-                self.stdout.write(self.style.ERROR(f"Invalid time format in opening hours: {opening_hours}. Error: {e}"))
-                continue
-
-            for day in self.expand_days(days_str):
-                if day:
-                    if day in time_slots:
-                        # 如果已有該天的時間範圍，取最早的開始時間和最晚的結束時間
-                        existing_start_str, existing_end_str = time_slots[day]
-                        existing_start = datetime.strptime(existing_start_str, '%H:%M').time()
-                        existing_end = datetime.strptime(existing_end_str, '%H:%M').time()
-                        new_start = min(time_ranges[0][0], existing_start)
-                        new_end = max(time_ranges[-1][1], existing_end)
-                        time_slots[day] = (new_start.strftime('%H:%M'), new_end.strftime('%H:%M'))
-                    else:
-                        time_slots[day] = (
-                            time_ranges[0][0].strftime('%H:%M'),
-                            time_ranges[-1][1].strftime('%H:%M')
-                        )
-
-        return time_slots
-
-    def expand_days(self, days):
-        days_of_week = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-        
-        expanded_days = set()
-        
-        if '-' in days:
-            start_day, end_day = [d.strip() for d in days.split('-')]
-            start_index = days_of_week.index(start_day)
-            end_index = days_of_week.index(end_day)
-            week_days = days_of_week[start_index:end_index + 1]
-            expanded_days.update(week_days)
-        else:
-            for d in days.split(','):
-                d = d.strip()
-                if d in days_of_week:
-                    expanded_days.add(d)
-                    
-        return expanded_days
-        
-    def handle_time_over_midnight(self, start_time, end_time):
-        # 這個方法應返回一個包含兩個元組的列表，分別為開始和結束時間
-        if start_time > end_time:
-            return [
-                (start_time, time(23, 59)), 
-                (time(0, 0), end_time)
-            ]
-        else:
-            return [
-                (start_time, end_time)
-            ]
+        )
+
+    def sync_opening_hours(self, records, pharmacy_ids, report):
+        # 以 (藥局, 星期, 開始時間) 為自然鍵比對，只寫入有差異的紀錄
+        current = {}
+        duplicates = []
+        for opening_hour in OpeningHour.objects.filter(pharmacy_id__in=pharmacy_ids.values()):
+            key = (opening_hour.pharmacy_id, opening_hour.day_of_week, opening_hour.start_time)
+            if key in current:
+                duplicates.append(opening_hour.id)
+            else:
+                current[key] = opening_hour
+
+        incoming = {
+            (pharmacy_ids[record['name']], day_of_week, start_time): end_time
+            for record in records
+            for day_of_week, start_time, end_time in record['time_slots']
+        }
+
+        inserts = []
+        updates = []
+        for key, end_time in incoming.items():
+            opening_hour = current.get(key)
+            if opening_hour is None:
+                pharmacy_id, day_of_week, start_time = key
+                inserts.append(OpeningHour(
+                    pharmacy_id=pharmacy_id, day_of_week=day_of_week, start_time=start_time, end_time=end_time
+                ))
+            elif opening_hour.end_time != end_time:
+                opening_hour.end_time = end_time
+                updates.append(opening_hour)
+        deletes = duplicates + [opening_hour.id for key, opening_hour in current.items() if key not in incoming]
+
+        OpeningHour.objects.filter(id__in=deletes).delete()
+        OpeningHour.objects.bulk_update(updates, ['end_time'])
+        OpeningHour.objects.bulk_create(inserts)
+        report.change('opening_hours', inserted=len(inserts), updated=len(updates), deleted=len(deletes))
+
+    def sync_masks(self, records, pharmacy_ids, report):
+        """以 (藥局, 口罩名稱) 為自然鍵比對，未變動的口罩保留原本的主鍵；回傳口罩有異動的藥局主鍵。"""
+        current = {}
+        duplicates = []
+        for mask in Mask.objects.filter(pharmacy_id__in=pharmacy_ids.values()):
+            key = (mask.pharmacy_id, mask.name)
+            if key in current:
+                duplicates.append(mask)
+            else:
+                current[key] = mask
+
+        incoming = {
+            (pharmacy_ids[record['name']], name): Decimal(str(price))
+            for record in records
+            for name, price in record['masks']
+        }
+
+        inserts = []
+        updates = []
+        for key, price in incoming.items():
+            mask = current.get(key)
+            if mask is None:
+                pharmacy_id, name = key
+                inserts.append(Mask(pharmacy_id=pharmacy_id, name=name, price=price))
+                self.log(f"Added mask '{name}'")
+            elif mask.price != price:
+                mask.price = price
+                updates.append(mask)
+                self.log(f"Updated price of mask '{mask.name}'")
+        deletes = duplicates + [mask for key, mask in current.items() if key not in incoming]
+
+        Mask.objects.filter(id__in=[mask.id for mask in deletes]).delete()
+        Mask.objects.bulk_update(updates, ['price'])
+        Mask.objects.bulk_create(inserts)
+        report.change('masks', inserted=len(inserts), updated=len(updates), deleted=len(deletes))
+        return {mask.pharmacy_id for mask in inserts + updates + deletes}
@@ -1,57 +1,133 @@
-import json
-from datetime import datetime
-from django.core.management.base import BaseCommand
+from datetime import date
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from phantom_app.etl import USER_FIELDS, Checkpoint, LoadReport, ids_by_name, run_pipeline, transform_user
 from phantom_app.models import User, PurchaseHistory, Pharmacy, Mask
+from phantom_app.pharmacy_stats import rebuild_pharmacy_stats
+from phantom_app.rollups import rebuild_rollups
+from phantom_app.versions import TRANSACTIONS, bump_version
 
 class Command(BaseCommand):
     help = 'Import user data from JSON file'
 
     def add_arguments(self, parser):
-        parser.add_argument('json_file', type=str, help='Path to the JSON file')
+        parser.add_argument('json_file', type=str, help='Path to the JSON or JSON Lines file')
+        parser.add_argument('--format', choices=['auto', 'json', 'jsonl'], default='auto',
+                            help='Input format; auto detects a JSON array by its leading "["')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users written per transaction')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes used to parse and transform records; loading stays in one process')
+        parser.add_argument('--checkpoint', type=str, help='File recording how many records have been committed')
+        parser.add_argument('--resume', action='store_true', help='Continue from the offset stored in --checkpoint')
+        parser.add_argument('--verbose', action='store_true', help='Print a line for every skipped record')
 
     def handle(self, *args, **kwargs):
         json_file = kwargs['json_file']
-        
-        with open(json_file, 'r') as f:
-            data = json.load(f)
-            self.import_users(data)
-
-    def import_users(self, data):
-        for entry in data:
-            # Create or update user
-            user, created = User.objects.get_or_create(
-                name=entry['name'],
-                defaults={'cash_balance': entry['cashBalance']}
-            )
-            if not created:
-                user.cash_balance = entry['cashBalance']
-                user.save()
-            
-            # Process purchase histories
-            for purchase in entry.get('purchaseHistories', []):
-                pharmacy = Pharmacy.objects.filter(name=purchase['pharmacyName']).first()
-                if not pharmacy:
-                    self.stdout.write(self.style.ERROR(f"Pharmacy '{purchase['pharmacyName']}' not found. Skipping purchase entry."))
-                    continue
+        self.verbose = kwargs['verbose']
+        if kwargs['resume'] and not kwargs['checkpoint']:
+            raise CommandError('--resume requires --checkpoint')
+
+        checkpoint = Checkpoint(kwargs['checkpoint'], json_file)
+        start = checkpoint.load() if kwargs['resume'] else 0
+        if start:
+            self.stdout.write(f'Resuming from record {start}')
+
+        report = LoadReport()
+        self.import_users(json_file, kwargs, checkpoint, start, report)
+        # Recompute the rollups and pharmacy stats only where new purchase histories were added
+        with transaction.atomic():
+            rebuild_rollups(self.affected_dates)
+            rebuild_pharmacy_stats(self.affected_pharmacies)
+        bump_version(TRANSACTIONS)
+        checkpoint.clear()
+        self.stdout.write(self.style.SUCCESS(f'Successfully imported user data: {report.summary()}'))
+
+    def import_users(self, json_file, options, checkpoint, start, report):
+        # Preload the catalogue once instead of querying it for every purchase entry
+        self.pharmacy_ids = dict(Pharmacy.objects.values_list('name', 'id'))
+        self.masks = {
+            (pharmacy_name, name): (mask_id, price)
+            for mask_id, pharmacy_name, name, price in Mask.objects.values_list('id', 'pharmacy__name', 'name', 'price')
+        }
+        # 續傳時合併中斷前已提交的批次所影響的日期與藥局，這些批次的購買紀錄同樣需要重新彙總
+        self.affected_dates = {date.fromisoformat(value) for value in checkpoint.state.get('dates', [])}
+        self.affected_pharmacies = set(checkpoint.state.get('pharmacies', []))
+
+        run_pipeline(
+            json_file, USER_FIELDS, transform_user,
+            load=lambda records: self.load_chunk(records, report, checkpoint),
+            report=report,
+            batch_size=options['batch_size'],
+            format=options['format'],
+            checkpoint=checkpoint,
+            start=start,
+            workers=options['workers'],
+            on_error=lambda message: self.log(self.style.ERROR(message)),
+        )
+
+    def load_chunk(self, records, report, checkpoint):
+        with transaction.atomic():
+            self.import_chunk(records, report)
+        # 批次提交後才記錄，run_pipeline 接著將位置與這些資料一起寫入 checkpoint
+        checkpoint.state = {
+            'dates': sorted(value.isoformat() for value in self.affected_dates),
+            'pharmacies': sorted(self.affected_pharmacies),
+        }
 
-                mask = Mask.objects.filter(name=purchase['maskName'], pharmacy=pharmacy).first()
-                if not mask:
-                    self.stdout.write(self.style.ERROR(f"Mask '{purchase['maskName']}' not found in pharmacy '{pharmacy.name}'. Skipping purchase entry."))
+    def import_chunk(self, records, report):
+        names = {record['name'] for record in records}
+        users = {}
+        for user in User.objects.filter(name__in=names).order_by('id'):
+            users.setdefault(user.name, user)
+
+        # Create or update users
+        new_users = {}
+        for record in records:
+            user = users.get(record['name']) or new_users.get(record['name'])
+            if user is None:
+                new_users[record['name']] = User(name=record['name'], cash_balance=record['cash_balance'])
+            else:
+                user.cash_balance = record['cash_balance']
+        User.objects.bulk_create(new_users.values())
+        User.objects.bulk_update(users.values(), ['cash_balance'])
+        report.add('users', len(new_users) + len(users))
+
+        user_ids = {name: user.id for name, user in users.items()}
+        user_ids.update(ids_by_name(User.objects.order_by('id'), new_users))
+
+        # Process purchase histories
+        histories = []
+        for record in records:
+            for purchase in record['purchases']:
+                if purchase['pharmacy_name'] not in self.pharmacy_ids:
+                    self.skip(report, f"Pharmacy '{purchase['pharmacy_name']}' not found. Skipping purchase entry.")
                     continue
+                mask = self.masks.get((purchase['pharmacy_name'], purchase['mask_name']))
+                if mask is None:
+                    self.skip(report, f"Mask '{purchase['mask_name']}' not found in pharmacy '{purchase['pharmacy_name']}'. Skipping purchase entry.")
+                    continue
+
+                # The source data has no quantity, so derive it from the amount and the current mask price
+                mask_id, price = mask
+                quantity = max(1, round(Decimal(str(purchase['transaction_amount'])) / price)) if price else 1
+                histories.append(PurchaseHistory(
+                    user_id=user_ids[record['name']],
+                    pharmacy_id=self.pharmacy_ids[purchase['pharmacy_name']],
+                    mask_id=mask_id,
+                    quantity=quantity,
+                    **purchase,
+                ))
+        PurchaseHistory.objects.bulk_create(histories)
+        self.affected_dates.update(timezone.localdate(history.transacted_at) for history in histories)
+        self.affected_pharmacies.update(history.pharmacy_id for history in histories)
+        report.add('purchase_histories', len(histories))
+
+    def skip(self, report, message):
+        report.skipped += 1
+        self.log(self.style.ERROR(message))
 
-                # Parse datetime
-                transaction_datetime = datetime.strptime(purchase['transactionDate'], '%Y-%m-%d %H:%M:%S')
-                transaction_date = transaction_datetime.date()
-                transaction_time = transaction_datetime.time()
-
-                # Create purchase history
-                PurchaseHistory.objects.create(
-                    user=user,
-                    pharmacy_name=purchase['pharmacyName'],
-                    mask_name=purchase['maskName'],
-                    transaction_amount=purchase['transactionAmount'],
-                    transaction_date=transaction_date,
-                    transaction_time=transaction_time
-                )
-
-        self.stdout.write(self.style.SUCCESS('Successfully imported user data'))
+    def log(self, message):
+        if self.verbose:
+            self.stdout.write(message)
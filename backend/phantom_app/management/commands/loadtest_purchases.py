@@ -0,0 +1,137 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from rest_framework.test import APIRequestFactory
+from phantom_app.ledger import apply_ledger
+from phantom_app.models import Pharmacy, Mask, User, PurchaseHistory
+from phantom_app.rollups import rebuild_rollups
+from phantom_app.versions import TRANSACTIONS, bump_version
+from phantom_app.views import PurchaseMaskAPIView
+
+USER_PREFIX = 'Load Test User'
+PHARMACY_PREFIX = 'Load Test Pharmacy'
+MASK_NAME = 'Load Test Mask (blue) (3 per pack)'
+CENT = Decimal('0.01')
+
+
+def total(queryset, field):
+    # SQLite 以浮點數計算 SUM，比較前先四捨五入到分
+    return (queryset.aggregate(total=Sum(field))['total'] or Decimal(0)).quantize(CENT)
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent purchases at the purchase endpoint and verify that balances are conserved'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purchases', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=32)
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--pharmacies', type=int, default=3)
+        parser.add_argument('--user-balance', type=Decimal, default=Decimal('100.00'),
+                            help='Starting balance per user; keep it low so some purchases are rejected')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Keep the load test rows after the run')
+
+    def handle(self, *args, **options):
+        self.cleanup()
+        users, pharmacies = self.setup(options)
+        rng = random.Random(options['seed'])
+        requests = [
+            {
+                'user_name': rng.choice(users).name,
+                'pharmacy_name': rng.choice(pharmacies).name,
+                'mask_name': MASK_NAME,
+                'quantity': rng.randint(1, 3),
+            }
+            for _ in range(options['purchases'])
+        ]
+        balance_before = self.total_balance()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            statuses = list(executor.map(self.purchase, requests))
+        elapsed = time.perf_counter() - started
+
+        flushed = ''
+        if settings.PURCHASE_LEDGER:
+            # 帳本模式下先套用全部帳本紀錄，再比對餘額與購買紀錄
+            flush_started = time.perf_counter()
+            while apply_ledger():
+                pass
+            flushed = f', ledger applied in {time.perf_counter() - flush_started:.2f}s'
+
+        try:
+            self.verify(options['user_balance'], balance_before, statuses)
+        finally:
+            if not options['keep']:
+                self.cleanup()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(requests)} purchases in {elapsed:.2f}s ({len(requests) / elapsed:.1f}/s): "
+            f"{statuses.count(201)} succeeded, {statuses.count(400)} rejected, "
+            f"{len(statuses) - statuses.count(201) - statuses.count(400)} failed{flushed}; balances conserved"
+        ))
+
+    def purchase(self, data):
+        factory = APIRequestFactory()
+        try:
+            response = PurchaseMaskAPIView.as_view()(factory.post('/purchase-mask/', data, format='json'))
+            return response.status_code
+        finally:
+            connections.close_all()
+
+    def setup(self, options):
+        users = User.objects.bulk_create([
+            User(name=f'{USER_PREFIX} {i}', cash_balance=options['user_balance'])
+            for i in range(options['users'])
+        ])
+        Pharmacy.objects.bulk_create([
+            Pharmacy(name=f'{PHARMACY_PREFIX} {i}', cash_balance=Decimal('0.00'), opening_hours='')
+            for i in range(options['pharmacies'])
+        ])
+        pharmacies = list(Pharmacy.objects.filter(name__startswith=PHARMACY_PREFIX))
+        Mask.objects.bulk_create([
+            Mask(pharmacy=pharmacy, name=MASK_NAME, price=Decimal('3.70')) for pharmacy in pharmacies
+        ])
+        return users, pharmacies
+
+    def total_balance(self):
+        users = total(User.objects.filter(name__startswith=USER_PREFIX), 'cash_balance')
+        pharmacies = total(Pharmacy.objects.filter(name__startswith=PHARMACY_PREFIX), 'cash_balance')
+        return users + pharmacies
+
+    def verify(self, user_balance, balance_before, statuses):
+        if self.total_balance() != balance_before:
+            raise CommandError('Total balance changed: money was created or lost')
+
+        histories = PurchaseHistory.objects.filter(user__name__startswith=USER_PREFIX)
+        if histories.count() != statuses.count(201):
+            raise CommandError('Purchase history rows do not match successful purchases')
+
+        for user in User.objects.filter(name__startswith=USER_PREFIX):
+            if user.cash_balance < 0:
+                raise CommandError(f'{user.name} was overdrawn: {user.cash_balance}')
+            spent = total(histories.filter(user=user), 'transaction_amount')
+            if user.cash_balance != user_balance - spent:
+                raise CommandError(f'{user.name} balance does not match purchase history (lost update)')
+
+        pharmacy_revenue = total(Pharmacy.objects.filter(name__startswith=PHARMACY_PREFIX), 'cash_balance')
+        if pharmacy_revenue != total(histories, 'transaction_amount'):
+            raise CommandError('Pharmacy balances do not match purchase history (lost update)')
+
+    def cleanup(self):
+        dates = set(PurchaseHistory.objects.filter(user__name__startswith=USER_PREFIX).annotate(
+            date=TruncDate('transacted_at')).values_list('date', flat=True))
+        with transaction.atomic():
+            User.objects.filter(name__startswith=USER_PREFIX).delete()
+            Pharmacy.objects.filter(name__startswith=PHARMACY_PREFIX).delete()
+            # 刪除測試紀錄後重新計算受影響日期的每日彙總
+            rebuild_rollups(dates)
+        bump_version(TRANSACTIONS)
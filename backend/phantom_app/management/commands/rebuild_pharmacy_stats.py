@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max, Min
+from phantom_app.models import Pharmacy, PharmacyStats
+from phantom_app.pharmacy_stats import STATS_FIELDS, compute_pharmacy_stats, rebuild_pharmacy_stats
+from phantom_app.versions import TRANSACTIONS, bump_version
+
+
+class Command(BaseCommand):
+    help = 'Recompute PharmacyStats from Mask and PurchaseHistory in parallel chunks, or only report rows that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Pharmacies per chunk (one transaction each)')
+        parser.add_argument('--workers', type=int, default=4, help='Chunks processed concurrently')
+        parser.add_argument('--check', action='store_true',
+                            help='Compare the stored stats with a fresh computation without writing; fails on mismatch')
+
+    def handle(self, *args, **options):
+        bounds = Pharmacy.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write('No pharmacies to process')
+            return
+
+        chunk_size = options['chunk_size']
+        ranges = [
+            (start, start + chunk_size) for start in range(bounds['first'], bounds['last'] + 1, chunk_size)
+        ]
+        process = self.check_chunk if options['check'] else self.rebuild_chunk
+        # SQLite 同時只允許一個寫入的交易，重建時逐一處理
+        workers = 1 if connection.vendor == 'sqlite' and not options['check'] else options['workers']
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(process, ranges))
+
+        if options['check']:
+            mismatches = [pharmacy_id for chunk in results for pharmacy_id in chunk]
+            if mismatches:
+                preview = ', '.join(str(pharmacy_id) for pharmacy_id in mismatches[:20])
+                raise CommandError(f'{len(mismatches)} pharmacies have stale stats (ids: {preview}); run without --check')
+            self.stdout.write(self.style.SUCCESS('Pharmacy stats are consistent'))
+        else:
+            bump_version(TRANSACTIONS)
+            self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt stats for {sum(results)} pharmacies'))
+
+    def rebuild_chunk(self, id_range):
+        try:
+            return len(rebuild_pharmacy_stats(id_range=id_range))
+        finally:
+            connections.close_all()
+
+    def check_chunk(self, id_range):
+        try:
+            expected = compute_pharmacy_stats(id_range=id_range)
+            stored = {
+                stats.pharmacy_id: stats
+                for stats in PharmacyStats.objects.filter(pharmacy_id__gte=id_range[0], pharmacy_id__lt=id_range[1])
+            }
+        finally:
+            connections.close_all()
+        # 缺少的統計列與多餘的統計列都視為不一致
+        return sorted(
+            pharmacy_id for pharmacy_id in expected.keys() | stored.keys()
+            if pharmacy_id not in expected or pharmacy_id not in stored
+            or any(getattr(expected[pharmacy_id], field) != getattr(stored[pharmacy_id], field) for field in STATS_FIELDS)
+        )
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from phantom_app.rollups import rebuild_rollups
+from phantom_app.versions import TRANSACTIONS, bump_version
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily transaction rollups from PurchaseHistory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=str, help='First date to rebuild (YYYY-MM-DD); rebuilds everything when omitted')
+        parser.add_argument('--end-date', type=str, help='Last date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        dates = None
+        if options['start_date'] or options['end_date']:
+            try:
+                start_date = datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+                end_date = datetime.strptime(options['end_date'], '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                raise CommandError('--start-date and --end-date must both be given in YYYY-MM-DD format')
+            dates = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+        with transaction.atomic():
+            rebuild_rollups(dates)
+        bump_version(TRANSACTIONS)
+        self.stdout.write(self.style.SUCCESS('Successfully rebuilt transaction rollups'))
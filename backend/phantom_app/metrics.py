@@ -0,0 +1,120 @@
+import threading
+from bisect import bisect_left
+
+# 延遲（秒）、每個請求的查詢次數與回應大小（bytes）的 bucket 上界
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def format_labels(labels):
+    escaped = [
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    ]
+    if not escaped:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            series = dict(self.series)
+        for labels, value in sorted(series.items()):
+            yield self.name, zip(self.labelnames, labels), value
+
+
+class Gauge:
+    """於輸出時呼叫 collect() 取得目前的數值，用於跨行程共享、需從資料庫讀取的狀態。"""
+    type = 'gauge'
+
+    def __init__(self, name, documentation, collect):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+
+    def samples(self):
+        yield self.name, (), self.collect()
+
+
+class Histogram(Counter):
+    """
+    Prometheus 格式的累積直方圖，每組標籤保存各 bucket 的筆數、總和與總筆數。
+    數值只存在目前的行程中，多個 worker 時每個行程各自回報。
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        with self.lock:
+            counts = self.series.get(labels)
+            if counts is None:
+                # 每個 bucket 各一格，再加上 +Inf、總和
+                counts = self.series[labels] = [0] * (len(self.buckets) + 2)
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self.lock:
+            series = {labels: list(counts) for labels, counts in self.series.items()}
+        for labels, counts in sorted(series.items()):
+            named = tuple(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', named + (('le', bound),), cumulative
+            yield f'{self.name}_sum', named, counts[-1]
+            yield f'{self.name}_count', named, cumulative
+
+
+REQUEST_LABELS = ('view', 'method', 'status')
+
+request_duration = Histogram(
+    'phantom_request_duration_seconds', 'Time spent handling the request.', REQUEST_LABELS, DURATION_BUCKETS,
+)
+db_queries = Histogram(
+    'phantom_db_queries', 'SQL queries executed per request.', REQUEST_LABELS, QUERY_BUCKETS,
+)
+db_duration = Histogram(
+    'phantom_db_duration_seconds', 'Time spent in SQL queries per request.', REQUEST_LABELS, DURATION_BUCKETS,
+)
+response_size = Histogram(
+    'phantom_response_size_bytes', 'Size of the response body (streaming responses are not counted).',
+    REQUEST_LABELS, SIZE_BUCKETS,
+)
+slow_queries = Counter(
+    'phantom_slow_queries_total', 'SQL queries slower than SLOW_QUERY_THRESHOLD_MS.', ('view',),
+)
+
+REGISTRY = [request_duration, db_queries, db_duration, response_size, slow_queries]
+
+
+def render_metrics(registry=REGISTRY):
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
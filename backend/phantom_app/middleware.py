@@ -0,0 +1,175 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import metrics
+from .db_router import REPLICA_DB_ALIAS, reset_read_database, set_read_database
+
+logger = logging.getLogger('phantom_app.metrics')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# 寫入後一段時間內該客戶端的讀取留在主資料庫，看得到自己剛寫入的資料
+PRIMARY_STICKY_COOKIE = 'phantom_primary'
+
+
+def view_label(request):
+    # 以 URL pattern 作為標籤，不同參數的請求歸在同一組
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match else 'unmatched'
+
+
+class QueryRecorder:
+    """以 execute_wrapper 記錄一個請求在所有資料庫連線上的查詢次數與時間，並記錄慢查詢。"""
+
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+                view = view_label(self.request)
+                metrics.slow_queries.inc((view,))
+                logger.warning(json.dumps({
+                    'event': 'slow_query',
+                    'view': view,
+                    'database': context['connection'].alias,
+                    'duration_ms': round(elapsed * 1000, 2),
+                    'sql': sql,
+                }))
+
+
+def record_queries(recorder):
+    # 回傳已掛上 execute_wrapper 的 ExitStack，關閉時移除；連線屬於呼叫時的執行緒
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+    return stack
+
+
+class RequestMetricsMiddleware:
+    """
+    記錄每個請求的 SQL 查詢次數與時間、總延遲與回應大小，
+    輸出為 Server-Timing header 與一行 JSON log，並累計到 /metrics 的直方圖。
+    串流回應在 view 回傳之後才讀取資料，這部分的查詢與大小不會被計入。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder(request)
+        started = time.perf_counter()
+        with record_queries(recorder):
+            response = self.get_response(request)
+        return self.record(request, response, recorder, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        # ASGI 下同一個請求的 ORM 查詢都在同一個 thread-sensitive 執行緒執行，在該執行緒的連線上記錄
+        recorder = QueryRecorder(request)
+        started = time.perf_counter()
+        stack = await sync_to_async(record_queries)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.record(request, response, recorder, time.perf_counter() - started)
+
+    def record(self, request, response, recorder, total):
+        size = None if response.streaming else len(response.content)
+        labels = (view_label(request), request.method, response.status_code)
+        metrics.request_duration.observe(labels, total)
+        metrics.db_queries.observe(labels, recorder.count)
+        metrics.db_duration.observe(labels, recorder.duration)
+        if size is not None:
+            metrics.response_size.observe(labels, size)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries"',
+            f'app;dur={(total - recorder.duration) * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+        slow = total * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps({
+            'event': 'request',
+            'view': labels[0],
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 2),
+            'db_queries': recorder.count,
+            'db_duration_ms': round(recorder.duration * 1000, 2),
+            'response_bytes': size,
+            'slow': slow,
+        }))
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    將標記為 replica_reads 的 view 的唯讀請求導向副本，其餘請求與管理指令都讀寫主資料庫。
+    成功的寫入請求會設定 cookie，REPLICA_STICKY_SECONDS 秒內同一個客戶端的讀取仍使用主資料庫，不受複寫延遲影響。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = set_read_database(DEFAULT_DB_ALIAS)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_read_database(token)
+        return self.stick(request, response)
+
+    async def __acall__(self, request):
+        token = set_read_database(DEFAULT_DB_ALIAS)
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_read_database(token)
+        return self.stick(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # 在 __call__ 設定的 context 內改為副本，請求結束時一併還原；ASGI 下 asgiref 會將變更帶回呼叫端的 context
+        view_class = getattr(view_func, 'view_class', None)
+        if (
+            request.method in SAFE_METHODS
+            and getattr(view_class, 'replica_reads', False)
+            and PRIMARY_STICKY_COOKIE not in request.COOKIES
+        ):
+            set_read_database(REPLICA_DB_ALIAS)
+
+    def stick(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                PRIMARY_STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
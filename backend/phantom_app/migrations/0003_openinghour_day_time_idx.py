@@ -0,0 +1,96 @@
+import re
+from datetime import datetime, time
+
+from django.db import migrations, models
+
+# 遷移當時的開放時間解析規則，複製在此而不匯入 phantom_app.opening_hours，之後修改解析器不會改變這個遷移的結果
+DAYS_OF_WEEK = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+DAY_ALIASES = {'Thur': 'Thu', 'Thurs': 'Thu', 'Tues': 'Tue'}
+START_OF_DAY = time(0, 0)
+END_OF_DAY = time(23, 59)
+SEGMENT_PATTERN = re.compile(r'(?P<days>[A-Za-z, -]+) (?P<start_time>\d{2}:\d{2}) - (?P<end_time>\d{2}:\d{2})')
+
+
+def normalize_day(day):
+    day = day.strip()
+    return DAY_ALIASES.get(day, day)
+
+
+def expand_days(days):
+    if '-' in days:
+        start_day, end_day = [normalize_day(d) for d in days.split('-')]
+        return set(DAYS_OF_WEEK[DAYS_OF_WEEK.index(start_day):DAYS_OF_WEEK.index(end_day) + 1])
+    return {d for d in map(normalize_day, days.split(',')) if d in DAYS_OF_WEEK}
+
+
+def merge_intervals(ranges):
+    merged = []
+    for start_time, end_time in sorted(ranges):
+        if merged and start_time <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end_time))
+        else:
+            merged.append((start_time, end_time))
+    return merged
+
+
+def parse_opening_hours(opening_hours):
+    # 回傳 [(day, start_time, end_time), ...]，跨日時段拆成當天到 23:59 與隔天 00:00 開始的兩筆
+    intervals = {}
+    for segment in opening_hours.split('/'):
+        time_match = SEGMENT_PATTERN.match(segment.strip())
+        if not time_match:
+            continue
+        try:
+            start_time = datetime.strptime(time_match.group('start_time'), '%H:%M').time()
+            end_time = datetime.strptime(time_match.group('end_time'), '%H:%M').time()
+            days = expand_days(time_match.group('days').strip())
+        except ValueError:
+            continue
+
+        for day in days:
+            if start_time <= end_time:
+                intervals.setdefault(day, []).append((start_time, end_time))
+            else:
+                following_day = DAYS_OF_WEEK[(DAYS_OF_WEEK.index(day) + 1) % len(DAYS_OF_WEEK)]
+                intervals.setdefault(day, []).append((start_time, END_OF_DAY))
+                intervals.setdefault(following_day, []).append((START_OF_DAY, end_time))
+
+    return [
+        (day, start_time, end_time)
+        for day in DAYS_OF_WEEK
+        for start_time, end_time in merge_intervals(intervals.get(day, []))
+    ]
+
+
+def rebuild_opening_hours(apps, schema_editor):
+    # 依原始的 opening_hours 字串重建，跨日時段拆成隔天的紀錄
+    Pharmacy = apps.get_model('phantom_app', 'Pharmacy')
+    OpeningHour = apps.get_model('phantom_app', 'OpeningHour')
+
+    OpeningHour.objects.all().delete()
+
+    records = []
+    for pharmacy in Pharmacy.objects.only('id', 'opening_hours').iterator():
+        for day_of_week, start_time, end_time in parse_opening_hours(pharmacy.opening_hours):
+            records.append(OpeningHour(
+                pharmacy_id=pharmacy.id,
+                day_of_week=day_of_week,
+                start_time=start_time,
+                end_time=end_time,
+            ))
+    OpeningHour.objects.bulk_create(records, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phantom_app', '0002_alter_openinghour_day_of_week'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='openinghour',
+            index=models.Index(fields=['day_of_week', 'start_time', 'end_time'], name='openinghour_day_time_idx'),
+        ),
+        migrations.RunPython(rebuild_opening_hours, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phantom_app', '0003_openinghour_day_time_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mask',
+            index=models.Index(fields=['pharmacy', 'price'], name='mask_pharmacy_price_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:36
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+ROLLUP_SHARDS = 16
+
+
+def build_rollups(apps, schema_editor):
+    PurchaseHistory = apps.get_model('phantom_app', 'PurchaseHistory')
+    DailyTransactionSummary = apps.get_model('phantom_app', 'DailyTransactionSummary')
+    DailyUserTransactionSummary = apps.get_model('phantom_app', 'DailyUserTransactionSummary')
+
+    user_rows = []
+    shards = defaultdict(lambda: [0, 0])
+    for row in PurchaseHistory.objects.values('transaction_date', 'user_id').annotate(
+        transaction_count=Count('id'), total_amount=Sum('transaction_amount')
+    ).order_by():
+        user_rows.append(DailyUserTransactionSummary(
+            date=row['transaction_date'],
+            user_id=row['user_id'],
+            transaction_count=row['transaction_count'],
+            total_amount=row['total_amount'],
+        ))
+        shard = shards[(row['transaction_date'], row['user_id'] % ROLLUP_SHARDS)]
+        shard[0] += row['transaction_count']
+        shard[1] += row['total_amount']
+
+    DailyUserTransactionSummary.objects.bulk_create(user_rows, batch_size=1000)
+    DailyTransactionSummary.objects.bulk_create([
+        DailyTransactionSummary(date=date, shard=shard, transaction_count=count, total_amount=amount)
+        for (date, shard), (count, amount) in shards.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phantom_app', '0004_mask_pharmacy_price_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchasehistory',
+            name='transaction_date',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.CreateModel(
+            name='DailyTransactionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'shard'), name='daily_summary_date_shard_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyUserTransactionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_transaction_summaries', to='phantom_app.user')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'user'), name='daily_user_summary_date_user_uniq')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
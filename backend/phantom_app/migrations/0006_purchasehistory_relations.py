@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+ROLLUP_SHARDS = 16
+BATCH_SIZE = 1000
+
+
+def link_purchase_histories(apps, schema_editor):
+    Pharmacy = apps.get_model('phantom_app', 'Pharmacy')
+    Mask = apps.get_model('phantom_app', 'Mask')
+    PurchaseHistory = apps.get_model('phantom_app', 'PurchaseHistory')
+    DailyTransactionSummary = apps.get_model('phantom_app', 'DailyTransactionSummary')
+
+    # 依名稱對應到藥局與口罩，數量由金額與口罩單價推算；找不到時外鍵留空、數量為 1
+    pharmacy_ids = dict(Pharmacy.objects.values_list('name', 'id'))
+    masks = {
+        (pharmacy_id, name): (mask_id, price)
+        for mask_id, pharmacy_id, name, price in Mask.objects.values_list('id', 'pharmacy_id', 'name', 'price')
+    }
+
+    mask_counts = defaultdict(int)
+    last_id = 0
+    while True:
+        histories = list(PurchaseHistory.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not histories:
+            break
+        for history in histories:
+            history.pharmacy_id = pharmacy_ids.get(history.pharmacy_name)
+            history.mask_id, price = masks.get((history.pharmacy_id, history.mask_name), (None, None))
+            if price:
+                history.quantity = max(1, round(history.transaction_amount / price))
+            # 原始資料的日期與時間沒有時區，與 TIME_ZONE 相同視為 UTC
+            history.transacted_at = datetime.combine(history.transaction_date, history.transaction_time, tzinfo=timezone.utc)
+            mask_counts[(history.transaction_date, history.user_id % ROLLUP_SHARDS)] += history.quantity
+        PurchaseHistory.objects.bulk_update(histories, ['pharmacy', 'mask', 'quantity', 'transacted_at'])
+        last_id = histories[-1].id
+
+    for (date, shard), mask_count in mask_counts.items():
+        DailyTransactionSummary.objects.filter(date=date, shard=shard).update(mask_count=mask_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phantom_app', '0005_transaction_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchasehistory',
+            name='pharmacy',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchase_histories', to='phantom_app.pharmacy'),
+        ),
+        migrations.AddField(
+            model_name='purchasehistory',
+            name='mask',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchase_histories', to='phantom_app.mask'),
+        ),
+        migrations.AddField(
+            model_name='purchasehistory',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='purchasehistory',
+            name='transacted_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dailytransactionsummary',
+            name='mask_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(link_purchase_histories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phantom_app', '0006_purchasehistory_relations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchasehistory',
+            name='transacted_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.RemoveField(
+            model_name='purchasehistory',
+            name='transaction_date',
+        ),
+        migrations.RemoveField(
+            model_name='purchasehistory',
+            name='transaction_time',
+        ),
+        migrations.RemoveField(
+            model_name='purchasehistory',
+            name='day_of_week',
+        ),
+    ]
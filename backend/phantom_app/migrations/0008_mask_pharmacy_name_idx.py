@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phantom_app', '0007_remove_purchasehistory_split_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mask',
+            index=models.Index(fields=['pharmacy', 'name'], name='mask_pharmacy_name_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:00
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, Max, Min, Sum
+
+CENT = Decimal('0.01')
+
+
+def compute_pharmacy_stats(apps, schema_editor):
+    Pharmacy = apps.get_model('phantom_app', 'Pharmacy')
+    Mask = apps.get_model('phantom_app', 'Mask')
+    PurchaseHistory = apps.get_model('phantom_app', 'PurchaseHistory')
+    PharmacyStats = apps.get_model('phantom_app', 'PharmacyStats')
+
+    stats = {pk: PharmacyStats(pharmacy_id=pk) for pk in Pharmacy.objects.values_list('id', flat=True)}
+    for row in Mask.objects.values('pharmacy_id').annotate(
+        mask_count=Count('id'), min_price=Min('price'), max_price=Max('price'), avg_price=Avg('price')
+    ).order_by():
+        pharmacy_stats = stats[row['pharmacy_id']]
+        pharmacy_stats.mask_count = row['mask_count']
+        pharmacy_stats.min_price = row['min_price']
+        pharmacy_stats.max_price = row['max_price']
+        pharmacy_stats.avg_price = Decimal(str(row['avg_price'])).quantize(CENT)
+    for row in PurchaseHistory.objects.filter(pharmacy__isnull=False).values('pharmacy_id').annotate(
+        transaction_count=Count('id'), revenue=Sum('transaction_amount')
+    ).order_by():
+        pharmacy_stats = stats[row['pharmacy_id']]
+        pharmacy_stats.transaction_count = row['transaction_count']
+        pharmacy_stats.revenue = Decimal(str(row['revenue'])).quantize(CENT)
+    PharmacyStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phantom_app', '0008_mask_pharmacy_name_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PharmacyStats',
+            fields=[
+                ('pharmacy', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='phantom_app.pharmacy')),
+                ('mask_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('avg_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.RunPython(compute_pharmacy_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phantom_app', '0009_pharmacystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pharmacy_name', models.CharField(max_length=255)),
+                ('mask_name', models.CharField(max_length=255)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('transaction_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('transacted_at', models.DateTimeField()),
+                ('applied_at', models.DateTimeField(null=True)),
+                ('mask', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='phantom_app.mask')),
+                ('pharmacy', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='phantom_app.pharmacy')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='phantom_app.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['applied_at', 'id'], name='ledger_applied_id_idx')],
+            },
+        ),
+    ]
@@ -13,9 +13,39 @@ class Mask(models.Model):
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['pharmacy', 'price'], name='mask_pharmacy_price_idx'),
+            models.Index(fields=['pharmacy', 'name'], name='mask_pharmacy_name_idx'),
+        ]
+
     def __str__(self):
         return f"{self.pharmacy.name} - {self.name}"
 
+    # 逐筆寫入（admin、shell）時更新該藥局的目錄統計；QuerySet 與 bulk 操作不經過這裡，由匯入指令最後統一重建
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.refresh_pharmacy_stats()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.refresh_pharmacy_stats()
+        return result
+
+    def refresh_pharmacy_stats(self):
+        from .pharmacy_stats import refresh_catalogue_stats  # pharmacy_stats 依賴本模組，延後匯入
+        refresh_catalogue_stats(self.pharmacy_id)
+
+# 每間藥局的目錄與銷售統計，由購買流程與匯入指令維護，藥局列表直接讀取而不需彙總查詢
+class PharmacyStats(models.Model):
+    pharmacy = models.OneToOneField(Pharmacy, related_name='stats', primary_key=True, on_delete=models.CASCADE)
+    mask_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    avg_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    transaction_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
 class User(models.Model):
     name = models.CharField(max_length=255)
     cash_balance = models.DecimalField(max_digits=10, decimal_places=2)
@@ -25,17 +55,14 @@ class User(models.Model):
 
 class PurchaseHistory(models.Model):
     user = models.ForeignKey(User, related_name='purchase_histories', on_delete=models.CASCADE)
+    # 藥局或口罩被刪除時保留紀錄，名稱欄位為交易當時的快照
+    pharmacy = models.ForeignKey(Pharmacy, related_name='purchase_histories', null=True, on_delete=models.SET_NULL)
+    mask = models.ForeignKey(Mask, related_name='purchase_histories', null=True, on_delete=models.SET_NULL)
     pharmacy_name = models.CharField(max_length=255)
     mask_name = models.CharField(max_length=255)
+    quantity = models.PositiveIntegerField(default=1)
     transaction_amount = models.DecimalField(max_digits=10, decimal_places=2)
-    transaction_date = models.DateField()  # 儲存日期
-    transaction_time = models.TimeField()  # 儲存時間
-    day_of_week = models.CharField(max_length=10, blank=True)  # 儲存星期幾
-
-    def save(self, *args, **kwargs):
-        # 自動生成星期幾
-        self.day_of_week = self.transaction_date.strftime('%A')
-        super().save(*args, **kwargs)
+    transacted_at = models.DateTimeField(db_index=True)
 
 class OpeningHour(models.Model):
     pharmacy = models.ForeignKey(Pharmacy, related_name='opening_hours_records', on_delete=models.CASCADE)
@@ -43,5 +70,54 @@ class OpeningHour(models.Model):
     start_time = models.TimeField()  # 開始時間
     end_time = models.TimeField()    # 結束時間
 
+    class Meta:
+        # 跨日時段已拆成兩筆，查詢只需比對 day_of_week 與時間範圍
+        indexes = [
+            models.Index(fields=['day_of_week', 'start_time', 'end_time'], name='openinghour_day_time_idx'),
+        ]
+
     def __str__(self):
         return f"{self.pharmacy.name} - {self.day_of_week} ({self.start_time} - {self.end_time})"
+
+# 交易統計的每日彙總，由購買流程與匯入指令維護，統計 API 直接讀取
+class DailyTransactionSummary(models.Model):
+    date = models.DateField()
+    # 同一天的彙總分散到多個 shard，避免所有購買都更新同一列
+    shard = models.PositiveSmallIntegerField()
+    transaction_count = models.PositiveIntegerField(default=0)
+    mask_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'shard'], name='daily_summary_date_shard_uniq'),
+        ]
+
+class DailyUserTransactionSummary(models.Model):
+    date = models.DateField()
+    user = models.ForeignKey(User, related_name='daily_transaction_summaries', on_delete=models.CASCADE)
+    transaction_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'user'], name='daily_user_summary_date_user_uniq'),
+        ]
+
+# 帳本模式（PURCHASE_LEDGER）的購買紀錄：購買時只扣款並寫入此表，flush_ledger 再分批寫入購買紀錄、藥局餘額與各項統計
+class PurchaseLedgerEntry(models.Model):
+    user = models.ForeignKey(User, related_name='ledger_entries', on_delete=models.CASCADE)
+    pharmacy = models.ForeignKey(Pharmacy, related_name='ledger_entries', null=True, on_delete=models.SET_NULL)
+    mask = models.ForeignKey(Mask, related_name='ledger_entries', null=True, on_delete=models.SET_NULL)
+    pharmacy_name = models.CharField(max_length=255)
+    mask_name = models.CharField(max_length=255)
+    quantity = models.PositiveIntegerField(default=1)
+    transaction_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    transacted_at = models.DateTimeField()
+    # 套用到購買紀錄的時間，NULL 表示尚未套用
+    applied_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['applied_at', 'id'], name='ledger_applied_id_idx'),
+        ]
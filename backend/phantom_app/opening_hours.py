@@ -0,0 +1,97 @@
+import re
+from datetime import datetime, time
+
+DAYS_OF_WEEK = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+# 原始資料中出現的星期縮寫變體
+DAY_ALIASES = {
+    'Thur': 'Thu',
+    'Thurs': 'Thu',
+    'Tues': 'Tue',
+}
+
+START_OF_DAY = time(0, 0)
+END_OF_DAY = time(23, 59)
+
+SEGMENT_PATTERN = re.compile(
+    r'(?P<days>[A-Za-z, -]+) (?P<start_time>\d{2}:\d{2}) - (?P<end_time>\d{2}:\d{2})'
+)
+
+
+def normalize_day(day):
+    day = day.strip()
+    return DAY_ALIASES.get(day, day)
+
+
+def expand_days(days):
+    expanded_days = set()
+
+    if '-' in days:
+        start_day, end_day = [normalize_day(d) for d in days.split('-')]
+        start_index = DAYS_OF_WEEK.index(start_day)
+        end_index = DAYS_OF_WEEK.index(end_day)
+        expanded_days.update(DAYS_OF_WEEK[start_index:end_index + 1])
+    else:
+        for d in days.split(','):
+            d = normalize_day(d)
+            if d in DAYS_OF_WEEK:
+                expanded_days.add(d)
+
+    return expanded_days
+
+
+def next_day(day):
+    return DAYS_OF_WEEK[(DAYS_OF_WEEK.index(day) + 1) % len(DAYS_OF_WEEK)]
+
+
+def parse_opening_hours(opening_hours, on_error=None):
+    """
+    將原始的開放時間字串轉換成正規化的區間列表 [(day, start_time, end_time), ...]。
+
+    每個區間都滿足 start_time <= end_time；跨日的時段會拆成當天到 23:59
+    以及隔天 00:00 開始的兩筆，因此查詢只需要一個範圍比較。
+    """
+    intervals = {}
+
+    for segment in opening_hours.split('/'):
+        segment = segment.strip()
+        if not segment:
+            continue
+
+        time_match = SEGMENT_PATTERN.match(segment)
+        if not time_match:
+            if on_error:
+                on_error(f"Invalid time format in opening hours: {opening_hours}")
+            continue
+
+        try:
+            start_time = datetime.strptime(time_match.group('start_time'), '%H:%M').time()
+            end_time = datetime.strptime(time_match.group('end_time'), '%H:%M').time()
+            days = expand_days(time_match.group('days').strip())
+        except ValueError as e:
+            if on_error:
+                on_error(f"Invalid time format in opening hours: {opening_hours}. Error: {e}")
+            continue
+
+        for day in days:
+            if start_time <= end_time:
+                intervals.setdefault(day, []).append((start_time, end_time))
+            else:  # 跨日
+                intervals.setdefault(day, []).append((start_time, END_OF_DAY))
+                intervals.setdefault(next_day(day), []).append((START_OF_DAY, end_time))
+
+    time_slots = []
+    for day in DAYS_OF_WEEK:
+        for start_time, end_time in merge_intervals(intervals.get(day, [])):
+            time_slots.append((day, start_time, end_time))
+    return time_slots
+
+
+def merge_intervals(ranges):
+    merged = []
+    for start_time, end_time in sorted(ranges):
+        if merged and start_time <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end_time))
+        else:
+            merged.append((start_time, end_time))
+    return merged
@@ -0,0 +1,103 @@
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import OpeningHour, Pharmacy
+from .opening_hours import DAYS_OF_WEEK
+from .versions import CATALOGUE, OPENING_HOURS, VersionedSnapshot
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def to_minute(value):
+    return value.hour * 60 + value.minute
+
+
+def open_pharmacies(weekday, query_time):
+    # ORM 路徑：開放時間已正規化為不跨日的區間，一次查詢即可取得結果
+    return Pharmacy.objects.filter(
+        opening_hours_records__day_of_week=weekday,
+        opening_hours_records__start_time__lte=query_time,
+        opening_hours_records__end_time__gte=query_time,
+    ).distinct().order_by('name').values('name')
+
+
+def query_open_pharmacies(weekday, query_time):
+    return list(open_pharmacies(weekday, query_time))
+
+
+class WeeklyIntervals:
+    """
+    一週的開放區間索引，每天的區間依開始時間排序。
+
+    所有區間的端點把一天切成數個片段，同一片段內開放的藥局都相同，
+    因此查詢結果以 (day, 片段) 為鍵快取，重複查詢只需一次 bisect。
+    """
+
+    def __init__(self, rows, cache_size=256):
+        days = {day: [] for day in DAYS_OF_WEEK}
+        for day_of_week, start_time, end_time, name in rows:
+            if day_of_week in days:
+                # 結束時間包含該分鐘，轉成半開區間 [start, end + 1)
+                days[day_of_week].append((to_minute(start_time), to_minute(end_time) + 1, name))
+
+        self.intervals = {}
+        self.starts = {}
+        self.boundaries = {}
+        for day, intervals in days.items():
+            intervals.sort()
+            self.intervals[day] = intervals
+            self.starts[day] = [start for start, _, _ in intervals]
+            self.boundaries[day] = sorted({0, MINUTES_PER_DAY}.union(
+                point for start, end, _ in intervals for point in (start, end)
+            ))
+
+        self.cache_size = cache_size
+        self._segments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open_at(self, weekday, query_time):
+        if weekday not in self.intervals:
+            return []
+
+        minute = to_minute(query_time)
+        key = (weekday, bisect_right(self.boundaries[weekday], minute))
+
+        with self._lock:
+            result = self._segments.get(key)
+            if result is not None:
+                self._segments.move_to_end(key)
+                return result
+
+        intervals = self.intervals[weekday]
+        candidates = bisect_right(self.starts[weekday], minute)
+        names = {name for _, end, name in intervals[:candidates] if end > minute}
+        result = [{'name': name} for name in sorted(names)]
+
+        with self._lock:
+            self._segments[key] = result
+            if len(self._segments) > self.cache_size:
+                self._segments.popitem(last=False)
+        return result
+
+
+class OpeningHoursIndex(VersionedSnapshot):
+    domains = (CATALOGUE, OPENING_HOURS)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'OPENING_HOURS_INDEX_TTL', None)
+
+    def build(self):
+        rows = OpeningHour.objects.values_list(
+            'day_of_week', 'start_time', 'end_time', 'pharmacy__name'
+        ).iterator(chunk_size=5000)
+        return WeeklyIntervals(rows)
+
+    def open_at(self, weekday, query_time):
+        return self.get().open_at(weekday, query_time)
+
+
+opening_hours_index = OpeningHoursIndex()
@@ -0,0 +1,163 @@
+import base64
+import binascii
+import json
+from bisect import bisect_right
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """
+    以排序鍵 seek 的分頁，不使用 OFFSET：游標記錄上一頁最後一筆的排序鍵，
+    下一頁以 WHERE (排序鍵) > (游標) 取得，無論翻到第幾頁成本都相同。
+    ordering 的最後一個欄位需能唯一識別一筆資料（例如 id 或唯一的 name）。
+    未帶 page_size 或 cursor 參數時不分頁，維持原本的回應格式。
+    page_size_aliases 為與 page_size 同義的舊參數名稱（例如先前 limit/offset 分頁的 limit）。
+    資料列為 values_list() 的 tuple 時以 row_key 取出排序鍵。
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    default_page_size = 100
+    max_page_size = 1000
+    optional = True
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering, cursor_query_param=None, page_size_aliases=(), row_key=None):
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+        if cursor_query_param:
+            self.cursor_query_param = cursor_query_param
+        if row_key:
+            self.row_key = row_key
+        self.page_size_params = (self.page_size_query_param, *page_size_aliases)
+        self.next_position = None
+
+    def is_requested(self, request):
+        params = request.query_params
+        return (not self.optional or self.cursor_query_param in params
+                or any(param in params for param in self.page_size_params))
+
+    def get_page_size(self, request):
+        param = next((param for param in self.page_size_params if param in request.query_params), None)
+        try:
+            page_size = int(request.query_params[param])
+        except (KeyError, ValueError):
+            return self.default_page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.default_page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, 0
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            position, returned = tuple(cursor['after']), int(cursor['returned'])
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(position) != len(self.fields) or returned < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return position, returned
+
+    def encode_cursor(self, position, returned):
+        # Decimal 等非 JSON 型別以字串保存，比對時由資料庫欄位轉回原型別
+        cursor = {'after': list(position), 'returned': returned}
+        return base64.urlsafe_b64encode(json.dumps(cursor, default=str).encode()).decode()
+
+    def seek_filter(self, position):
+        # (a, b) > (x, y) 展開為 a > x OR (a = x AND b > y)，遞減欄位改用 <
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{self.fields[index]}__{lookup}': position[index]})
+            for previous, value in zip(self.fields[:index], position):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def row_key(self, row):
+        if isinstance(row, dict):
+            return tuple(row[field] for field in self.fields)
+        return tuple(getattr(row, field) for field in self.fields)
+
+    def prepare(self, request, total=None):
+        """
+        讀取頁面大小與游標，回傳游標位置；自行 seek 的資料來源之後以 page() 產生本頁。
+        total 為所有頁面合計的筆數上限（例如 top_x）。
+        """
+        self.request = request
+        self.total = total
+        position, self.returned = self.decode_cursor(request)
+        self.page_size = self.get_page_size(request)
+        if total is not None:
+            self.page_size = max(min(self.page_size, total - self.returned), 0)
+        return position
+
+    def page_queryset(self, queryset, request, total=None):
+        position = self.prepare(request, total)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(position))
+        # 多取一筆判斷是否還有下一頁
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def paginate_queryset(self, queryset, request, total=None):
+        if not self.is_requested(request):
+            return None
+        return self.page(list(self.page_queryset(queryset, request, total)))
+
+    async def apaginate_queryset(self, queryset, request, total=None):
+        """paginate_queryset 的非同步版本，以 async ORM 讀取本頁資料。"""
+        if not self.is_requested(request):
+            return None
+        return self.page([row async for row in self.page_queryset(queryset, request, total)])
+
+    def paginate_list(self, items, request, key=None):
+        """items 為已依遞增排序鍵排好的記憶體內資料，以二分搜尋找到游標位置。"""
+        if not self.is_requested(request):
+            return None
+        key = key or self.row_key
+        position = self.prepare(request)
+        start = bisect_right(items, position, key=key) if position is not None else 0
+        return self.page(items[start:start + self.page_size + 1], key)
+
+    def page(self, rows, key=None):
+        """rows 為游標之後最多 page_size + 1 筆資料，回傳本頁並記錄下一頁的游標位置。"""
+        key = key or self.row_key
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.returned += len(rows)
+        if self.total is not None and self.returned >= self.total:
+            has_more = False
+        self.next_position = key(rows[-1]) if has_more and rows else None
+        return rows
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position, self.returned),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class SearchPagination(KeysetPagination):
+    # 搜尋結果一律分頁，沿用 limit 參數作為每組結果的頁面大小；view 已驗證的 limit 以 page_size 傳入
+    page_size_query_param = 'limit'
+    default_page_size = 50
+    max_page_size = 100
+    optional = False
+
+    def __init__(self, ordering, cursor_query_param=None, page_size=None, row_key=None):
+        super().__init__(ordering, cursor_query_param, row_key=row_key)
+        self.requested_page_size = page_size
+
+    def get_page_size(self, request):
+        if self.requested_page_size is None:
+            return self.default_page_size
+        return min(self.requested_page_size, self.max_page_size)
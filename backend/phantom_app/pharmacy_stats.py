@@ -0,0 +1,115 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Case, Count, DecimalField, F, Max, Min, PositiveIntegerField, Q, Sum, Value, When
+
+from .models import Mask, Pharmacy, PharmacyStats, PurchaseHistory
+
+STATS_FIELDS = ('mask_count', 'min_price', 'max_price', 'avg_price', 'transaction_count', 'revenue')
+CATALOGUE_FIELDS = ('mask_count', 'min_price', 'max_price', 'avg_price')
+CENT = Decimal('0.01')
+
+
+def _scope(field, pharmacy_ids=None, id_range=None):
+    # 以藥局主鍵清單或 [start, end) 範圍限定計算的藥局，兩者皆未指定時為全部
+    if pharmacy_ids is not None:
+        return Q(**{f'{field}__in': list(pharmacy_ids)})
+    if id_range is not None:
+        start, end = id_range
+        return Q(**{f'{field}__gte': start, f'{field}__lt': end})
+    return Q()
+
+
+def _cents(value):
+    # SQLite 以浮點數計算 AVG 與 SUM，四捨五入到分
+    return Decimal(str(value)).quantize(CENT) if value is not None else None
+
+
+def catalogue_stats(scope):
+    return {
+        row.pop('pharmacy_id'): {**row, 'avg_price': _cents(row['avg_price'])}
+        for row in Mask.objects.filter(scope).values('pharmacy_id').annotate(
+            mask_count=Count('id'), min_price=Min('price'), max_price=Max('price'), avg_price=Avg('price'),
+        ).order_by()
+    }
+
+
+def compute_pharmacy_stats(pharmacy_ids=None, id_range=None, lock=False):
+    """依 Mask 與 PurchaseHistory 計算藥局統計，回傳 {pharmacy_id: 未儲存的 PharmacyStats}。"""
+    pharmacies = Pharmacy.objects.filter(_scope('id', pharmacy_ids, id_range))
+    if lock:
+        pharmacies = pharmacies.select_for_update()
+    stats = {pk: PharmacyStats(pharmacy_id=pk) for pk in pharmacies.values_list('id', flat=True)}
+
+    for pharmacy_id, values in catalogue_stats(_scope('pharmacy_id', pharmacy_ids, id_range)).items():
+        if pharmacy_id in stats:
+            for field, value in values.items():
+                setattr(stats[pharmacy_id], field, value)
+    for row in PurchaseHistory.objects.filter(_scope('pharmacy_id', pharmacy_ids, id_range)).values('pharmacy_id').annotate(
+        transaction_count=Count('id'), revenue=Sum('transaction_amount'),
+    ).order_by():
+        if row['pharmacy_id'] in stats:
+            stats[row['pharmacy_id']].transaction_count = row['transaction_count']
+            stats[row['pharmacy_id']].revenue = _cents(row['revenue'])
+    return stats
+
+
+def rebuild_pharmacy_stats(pharmacy_ids=None, id_range=None):
+    """
+    重新計算藥局統計並取代現有資料；未指定範圍時重建全部。
+    先鎖定藥局再計算，與購買「藥局 -> 藥局統計」的鎖定順序相同，計算期間的購買不會遺失。
+    """
+    with transaction.atomic():
+        stats = compute_pharmacy_stats(pharmacy_ids, id_range, lock=True)
+        PharmacyStats.objects.filter(_scope('pharmacy_id', pharmacy_ids, id_range)).delete()
+        PharmacyStats.objects.bulk_create(stats.values(), batch_size=1000)
+    return stats
+
+
+def refresh_catalogue_stats(pharmacy_id):
+    # 只更新既有的統計列：藥局被串聯刪除時統計列可能已先刪除，不能重新建立
+    values = catalogue_stats(Q(pharmacy_id=pharmacy_id)).get(pharmacy_id, {**dict.fromkeys(CATALOGUE_FIELDS), 'mask_count': 0})
+    PharmacyStats.objects.filter(pharmacy_id=pharmacy_id).update(**values)
+
+
+def record_pharmacy_sales(sales):
+    """
+    在購買的交易內累加藥局統計，sales 為 {pharmacy_id: (transaction_count, revenue)}。
+    需在寫入購買紀錄之後呼叫：尚未建立統計的藥局從頭計算，結果已包含本次的購買紀錄。
+    """
+    def increment(pharmacy_ids):
+        return PharmacyStats.objects.filter(pharmacy_id__in=pharmacy_ids).update(
+            transaction_count=F('transaction_count') + Case(
+                *[When(pharmacy_id=pk, then=Value(sales[pk][0])) for pk in pharmacy_ids],
+                output_field=PositiveIntegerField(),
+            ),
+            revenue=F('revenue') + Case(
+                *[When(pharmacy_id=pk, then=Value(sales[pk][1])) for pk in pharmacy_ids],
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+
+    if increment(list(sales)) == len(sales):
+        return
+    existing = set(PharmacyStats.objects.filter(pharmacy_id__in=sales).values_list('pharmacy_id', flat=True))
+    missing = [pk for pk in sales if pk not in existing]
+    try:
+        # 以 savepoint 包住，並行建立同一列時失敗不會影響外層交易，改為累加對方建立的資料
+        with transaction.atomic():
+            PharmacyStats.objects.bulk_create(compute_pharmacy_stats(missing).values())
+    except IntegrityError:
+        increment(missing)
+
+
+def with_stats(rows, name_field='name', batch_size=1000):
+    """
+    為藥局列表的每一筆資料附上 stats，每 batch_size 筆只需一次以藥局名稱索引的查詢。
+    rows 可能是行程內索引共用的資料，不直接修改。
+    """
+    rows = list(rows)
+    stats = {}
+    for offset in range(0, len(rows), batch_size):
+        names = [row[name_field] for row in rows[offset:offset + batch_size]]
+        for row in PharmacyStats.objects.filter(pharmacy__name__in=names).values('pharmacy__name', *STATS_FIELDS):
+            stats[row.pop('pharmacy__name')] = row
+    return [{**row, 'stats': stats.get(row[name_field])} for row in rows]
@@ -0,0 +1,116 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from .ledger import ledger_entries
+from .models import Mask, Pharmacy, PurchaseHistory, PurchaseLedgerEntry, User
+from .pharmacy_stats import record_pharmacy_sales
+from .rollups import record_transactions
+from .versions import TRANSACTIONS, bump_version
+
+
+class InsufficientBalance(Exception):
+    pass
+
+
+def purchase_mask(user_name, pharmacy_name, mask_name, quantity):
+    user, lines, _ = purchase_masks(user_name, [
+        {'pharmacy_name': pharmacy_name, 'mask_name': mask_name, 'quantity': quantity},
+    ])
+    return user, lines[0]
+
+
+def purchase_masks(user_name, items):
+    """
+    在同一個交易內完成多筆購買，任一筆失敗則全部不生效。
+    items 為 [{'pharmacy_name', 'mask_name', 'quantity'}, ...]，回傳 (user, lines, total_price)。
+    """
+    # 名稱解析不讀取餘額，放在交易外以縮短持有寫入鎖的時間
+    user = User.objects.only('id', 'name').get(name=user_name)
+
+    pharmacy_names = {item['pharmacy_name'] for item in items}
+    pharmacy_ids = dict(Pharmacy.objects.filter(name__in=pharmacy_names).values_list('name', 'id'))
+    for name in pharmacy_names:
+        if name not in pharmacy_ids:
+            raise Pharmacy.DoesNotExist(f"Pharmacy '{name}' does not exist")
+
+    masks = {
+        (mask.pharmacy_id, mask.name): mask
+        for mask in Mask.objects.filter(
+            pharmacy_id__in=pharmacy_ids.values(),
+            name__in={item['mask_name'] for item in items},
+        ).only('id', 'pharmacy_id', 'name', 'price')
+    }
+
+    lines = []
+    histories = []
+    credits = defaultdict(int)
+    sales_counts = defaultdict(int)
+    for item in items:
+        pharmacy_id = pharmacy_ids[item['pharmacy_name']]
+        mask = masks.get((pharmacy_id, item['mask_name']))
+        if mask is None:
+            raise Mask.DoesNotExist(
+                f"Mask '{item['mask_name']}' does not exist in pharmacy '{item['pharmacy_name']}'"
+            )
+        line_price = mask.price * item['quantity']
+        credits[pharmacy_id] += line_price
+        sales_counts[pharmacy_id] += 1
+        lines.append({
+            'pharmacy': item['pharmacy_name'],
+            'mask': mask.name,
+            'quantity': item['quantity'],
+            'total_price': line_price,
+        })
+        histories.append(PurchaseHistory(
+            user=user,
+            pharmacy_id=pharmacy_id,
+            mask_id=mask.id,
+            pharmacy_name=item['pharmacy_name'],
+            mask_name=mask.name,
+            quantity=item['quantity'],
+            transaction_amount=line_price,
+        ))
+
+    total_price = sum(line['total_price'] for line in lines)
+
+    with transaction.atomic():
+        # 所有購買都依「用戶 -> 藥局 -> 藥局統計 -> 每日彙總」的固定順序鎖定資料列，避免死結。
+        # 以條件式 UPDATE 扣款，餘額檢查與扣款在同一個語句內完成，並行購買不會超扣。
+        debited = User.objects.filter(pk=user.pk, cash_balance__gte=total_price).update(
+            cash_balance=F('cash_balance') - total_price
+        )
+        if not debited:
+            raise InsufficientBalance
+
+        now = timezone.now()
+        for history in histories:
+            history.transacted_at = now
+
+        if settings.PURCHASE_LEDGER:
+            # 帳本模式只寫入帳本，藥局入帳、購買紀錄與統計由 flush_ledger 分批套用，不鎖定共用的藥局與彙總資料列
+            PurchaseLedgerEntry.objects.bulk_create(ledger_entries(histories))
+            return user, lines, total_price
+
+        # 多間藥局以單一 UPDATE 入帳
+        Pharmacy.objects.filter(pk__in=credits).update(
+            cash_balance=F('cash_balance') + Case(
+                *[When(pk=pharmacy_id, then=Value(amount)) for pharmacy_id, amount in credits.items()],
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
+
+        PurchaseHistory.objects.bulk_create(histories)
+
+        record_pharmacy_sales({pharmacy_id: (sales_counts[pharmacy_id], amount) for pharmacy_id, amount in credits.items()})
+
+        record_transactions(
+            user.pk, timezone.localdate(now), len(lines), sum(line['quantity'] for line in lines), total_price
+        )
+
+    # 交易提交後才遞增版本號，避免其他請求在提交前以新版本號快取到舊資料
+    bump_version(TRANSACTIONS)
+    return user, lines, total_price
@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # 選用套件，未安裝時退回 DRF 的 JSONRenderer
+    orjson = None
+
+_fallback_encoder = JSONEncoder()
+
+
+def _default(obj):
+    # 與 DRF 的 JSONEncoder 相同，Decimal 輸出為數字；其餘型別交給 DRF 處理
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return _fallback_encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """以 orjson（C 實作）編碼 JSON 的 renderer，輸出與 JSONRenderer 相同。"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        # 要求縮排輸出（例如 ?indent=）時沿用 DRF 的實作
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        # datetime 交給 DRF 的格式（UTC 輸出為 Z），其餘型別由 orjson 直接編碼
+        try:
+            content = orjson.dumps(data, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except (orjson.JSONEncodeError, TypeError):
+            # orjson 無法編碼的資料（例如超過 64 位元的整數）改由 DRF 編碼，輸出維持一致
+            return super().render(data, accepted_media_type, renderer_context)
+        # 與 DRF 相同，跳脫 JavaScript 字串中不合法的 U+2028 / U+2029
+        if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+            content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return content
@@ -0,0 +1,122 @@
+import hashlib
+import pickle
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from .db_router import use_primary
+from .versions import get_versions
+
+
+def _response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def normalize_params(query_params):
+    # 參數順序不同、值前後多了空白的請求視為同一個查詢
+    return tuple(sorted((key, tuple(value.strip() for value in values)) for key, values in query_params.lists()))
+
+
+def response_digest(view, request, versions):
+    # 分頁回應中的 next/previous 為絕對網址，因此連同 host 一起作為鍵
+    key = (type(view).__name__, request.build_absolute_uri('/'), normalize_params(request.query_params), versions)
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    return header.strip() == '*' or etag in [tag.strip().removeprefix('W/') for tag in header.split(',')]
+
+
+def cached_response(*domains, param_domains=None):
+    """
+    快取 GET 回應的資料，鍵為 view、正規化後的查詢參數與 domains 的版本號。
+    param_domains 為 {查詢參數: domains}，帶有該參數的請求另外依這些 domains 失效（例如附上銷售統計時）。
+    寫入端遞增版本號後舊的快取自然不再被讀取，由快取後端依 TIMEOUT 與 MAX_ENTRIES 淘汰。
+    版本號未變時，帶有相同 If-None-Match 的請求直接回傳 304，不存取資料庫。
+    未命中快取時 view 一律讀取主資料庫，副本的延遲不會被快取在新的版本號之下。
+    可用於同步與非同步（async def）的 view 方法，兩者共用同一份快取。
+    """
+    def digest_for(view, request):
+        request_domains = domains
+        for param, extra_domains in (param_domains or {}).items():
+            if param in request.query_params:
+                request_domains += tuple(extra_domains)
+        return response_digest(view, request, get_versions(request_domains))
+
+    def decorator(method):
+        if iscoroutinefunction(method):
+            @wraps(method)
+            async def async_wrapper(view, request, *args, **kwargs):
+                if not settings.RESPONSE_CACHE:
+                    return await method(view, request, *args, **kwargs)
+
+                # 版本號與快取可能位於檔案或 Redis，不在事件迴圈中等待 I/O
+                digest = await sync_to_async(digest_for)(view, request)
+                etag = f'"{digest}"'
+                if etag_matches(request, etag):
+                    return not_modified(etag)
+
+                cache = _response_cache()
+                key = f'phantom:response:{digest}'
+                cached = await cache.aget(key)
+                if cached is not None:
+                    return cached_copy(cached, etag)
+
+                # 快取鍵的版本號來自主資料庫的寫入，建立快取的查詢也須讀取主資料庫，避免副本的舊資料存入新版本
+                with use_primary():
+                    response = await method(view, request, *args, **kwargs)
+                payload = cache_payload(response, etag)
+                if payload is not None:
+                    await cache.aset(key, payload)
+                return response
+            return async_wrapper
+
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if not settings.RESPONSE_CACHE:
+                return method(view, request, *args, **kwargs)
+
+            digest = digest_for(view, request)
+            etag = f'"{digest}"'
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            cache = _response_cache()
+            key = f'phantom:response:{digest}'
+            cached = cache.get(key)
+            if cached is not None:
+                return cached_copy(cached, etag)
+
+            with use_primary():
+                response = method(view, request, *args, **kwargs)
+            payload = cache_payload(response, etag)
+            if payload is not None:
+                cache.set(key, payload)
+            return response
+        return wrapper
+    return decorator
+
+
+def not_modified(etag):
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+
+def cached_copy(cached, etag):
+    data, status_code = pickle.loads(cached)
+    return Response(data, status=status_code, headers={'ETag': etag})
+
+
+def cache_payload(response, etag):
+    # 只快取成功的回應；錯誤回應與超過大小上限的結果每次重新計算
+    if response.status_code != status.HTTP_200_OK:
+        return None
+    response['ETag'] = etag
+    payload = pickle.dumps((response.data, response.status_code), protocol=pickle.HIGHEST_PROTOCOL)
+    return payload if len(payload) <= settings.RESPONSE_CACHE_MAX_ENTRY_SIZE else None
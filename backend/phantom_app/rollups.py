@@ -0,0 +1,98 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyTransactionSummary, DailyUserTransactionSummary, PurchaseHistory
+
+ROLLUP_SHARDS = 16
+
+
+def shard_for(user_id):
+    return user_id % ROLLUP_SHARDS
+
+
+def day_bounds(start_date, end_date):
+    """回傳涵蓋 start_date 至 end_date（含）的 [start, end) 時間範圍，可直接使用 transacted_at 的索引。"""
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.combine(start_date, time.min, tzinfo=tz),
+        datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=tz),
+    )
+
+
+def record_transactions(user_id, date, transaction_count, mask_count, total_amount):
+    """
+    在購買的交易內累加每日彙總。
+    鎖定順序為「用戶每日彙總 -> 每日 shard」，接在「用戶 -> 藥局」之後，所有購買的順序一致。
+    """
+    _increment(
+        DailyUserTransactionSummary, {'date': date, 'user_id': user_id},
+        transaction_count=transaction_count, total_amount=total_amount,
+    )
+    _increment(
+        DailyTransactionSummary, {'date': date, 'shard': shard_for(user_id)},
+        transaction_count=transaction_count, mask_count=mask_count, total_amount=total_amount,
+    )
+
+
+def _increment(model, key, **amounts):
+    updates = {field: F(field) + amount for field, amount in amounts.items()}
+    if model.objects.filter(**key).update(**updates):
+        return
+    try:
+        # 以 savepoint 包住，並行建立同一列時失敗不會影響外層交易
+        with transaction.atomic():
+            model.objects.create(**amounts, **key)
+    except IntegrityError:
+        model.objects.filter(**key).update(**updates)
+
+
+def rebuild_rollups(dates=None, batch_size=500):
+    """依 PurchaseHistory 重新計算每日彙總；dates 為 None 時重建全部。"""
+
+    if dates is None:
+        DailyTransactionSummary.objects.all().delete()
+        DailyUserTransactionSummary.objects.all().delete()
+        date_batches = [None]
+    else:
+        dates = sorted(dates)
+        date_batches = [dates[offset:offset + batch_size] for offset in range(0, len(dates), batch_size)]
+
+    for date_batch in date_batches:
+        histories = PurchaseHistory.objects.all()
+        if date_batch is not None:
+            # 先以時間範圍縮小掃描區間，再篩選實際需要的日期
+            start, end = day_bounds(date_batch[0], date_batch[-1])
+            histories = histories.filter(
+                transacted_at__gte=start, transacted_at__lt=end, transacted_at__date__in=date_batch
+            )
+            DailyTransactionSummary.objects.filter(date__in=date_batch).delete()
+            DailyUserTransactionSummary.objects.filter(date__in=date_batch).delete()
+
+        user_rows = []
+        shards = defaultdict(lambda: [0, 0, 0])
+        for row in histories.values('user_id', date=TruncDate('transacted_at')).annotate(
+            transaction_count=Count('id'), mask_count=Sum('quantity'), total_amount=Sum('transaction_amount')
+        ).order_by().iterator(chunk_size=5000):
+            user_rows.append(DailyUserTransactionSummary(
+                date=row['date'],
+                user_id=row['user_id'],
+                transaction_count=row['transaction_count'],
+                total_amount=row['total_amount'],
+            ))
+            shard = shards[(row['date'], shard_for(row['user_id']))]
+            shard[0] += row['transaction_count']
+            shard[1] += row['mask_count']
+            shard[2] += row['total_amount']
+
+        DailyUserTransactionSummary.objects.bulk_create(user_rows, batch_size=1000)
+        DailyTransactionSummary.objects.bulk_create([
+            DailyTransactionSummary(
+                date=date, shard=shard, transaction_count=count, mask_count=mask_count, total_amount=amount
+            )
+            for (date, shard), (count, mask_count, amount) in shards.items()
+        ], batch_size=1000)
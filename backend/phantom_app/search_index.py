@@ -0,0 +1,206 @@
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.db.models import Case, F, IntegerField, When
+
+from .models import Mask, Pharmacy
+from .versions import CATALOGUE, VersionedSnapshot
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# BM25 參數
+K1 = 1.2
+B = 0.75
+
+# 前綴與模糊比對的詞彙權重低於完全相同的詞彙
+PREFIX_WEIGHT = 0.7
+FUZZY_WEIGHT = 0.5
+MAX_PREFIX_EXPANSIONS = 50
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+# 整個名稱完全相同或以查詢字串開頭時的加分，確保排序為 完全相同 > 前綴 > 其他
+EXACT_BOOST = 100.0
+PREFIX_BOOST = 50.0
+
+# 資料庫搜尋結果的排序鍵，同時作為分頁游標
+SEARCH_ORDERING = ('-relevance', 'name', 'id')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def trigrams(term):
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class Corpus:
+    """單一類型（藥局或口罩）名稱的倒排索引，以 BM25 加上完全相同與前綴加分排序。"""
+
+    def __init__(self, documents):
+        self.documents = []
+        self.normalized = []
+        self.lengths = []
+        postings = defaultdict(list)
+
+        for index, (document, name) in enumerate(documents):
+            tokens = tokenize(name)
+            self.documents.append(document)
+            self.normalized.append(' '.join(tokens))
+            self.lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                postings[term].append((index, frequency))
+
+        self.postings = dict(postings)
+        self.vocabulary = sorted(self.postings)
+        self.trigram_terms = defaultdict(list)
+        for term in self.vocabulary:
+            for gram in trigrams(term):
+                self.trigram_terms[gram].append(term)
+
+        count = len(self.documents)
+        self.average_length = sum(self.lengths) / count if count else 1
+        self.idf = {
+            term: math.log(1 + (count - len(entries) + 0.5) / (len(entries) + 0.5))
+            for term, entries in self.postings.items()
+        }
+
+    def expand(self, token):
+        matches = {}
+        if token in self.postings:
+            matches[token] = 1.0
+
+        position = bisect_left(self.vocabulary, token)
+        for term in self.vocabulary[position:position + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(token):
+                break
+            matches.setdefault(term, PREFIX_WEIGHT)
+
+        if not matches and len(token) >= 3:
+            # 容錯：透過 trigram 找出相近的詞彙，再以編輯距離確認
+            token_grams = trigrams(token)
+            shared = Counter(term for gram in token_grams for term in self.trigram_terms.get(gram, ()))
+            limit = 1 if len(token) <= 5 else 2
+            for term, common in shared.items():
+                similarity = common / (len(token_grams) + len(trigrams(term)) - common)
+                if similarity >= MIN_TRIGRAM_SIMILARITY and edit_distance(token, term, limit) <= limit:
+                    matches[term] = FUZZY_WEIGHT
+        return matches
+
+    def search(self, query, count=None, after=None):
+        """回傳 (排序鍵, 文件) 的清單；after 為上一頁最後一筆的排序鍵，只回傳排在其後的結果。"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        scores = defaultdict(float)
+        matched_tokens = defaultdict(int)
+        for token in tokens:
+            best = {}
+            for term, weight in self.expand(token).items():
+                idf = self.idf[term]
+                for index, frequency in self.postings[term]:
+                    length_norm = K1 * (1 - B + B * self.lengths[index] / self.average_length)
+                    score = weight * idf * frequency * (K1 + 1) / (frequency + length_norm)
+                    if score > best.get(index, 0.0):
+                        best[index] = score
+            for index, score in best.items():
+                scores[index] += score
+                matched_tokens[index] += 1
+
+        # 多個關鍵字時優先回傳全部符合的結果，沒有時才退回部分符合
+        candidates = [index for index in scores if matched_tokens[index] == len(tokens)] or list(scores)
+
+        normalized_query = ' '.join(tokens)
+
+        def rank(index):
+            name = self.normalized[index]
+            if name == normalized_query:
+                boost = EXACT_BOOST
+            elif name.startswith(normalized_query):
+                boost = PREFIX_BOOST
+            else:
+                boost = 0.0
+            return (-(boost + scores[index]), name, index)
+
+        ranked = [rank(index) for index in candidates]
+        if after is not None:
+            ranked = [key for key in ranked if key > after]
+        # 只需要前 count 筆時以 heap 取出，不必排序全部候選結果
+        ranked = sorted(ranked) if count is None else heapq.nsmallest(count, ranked)
+        return [(key, self.documents[key[2]]) for key in ranked]
+
+
+class SearchIndex(VersionedSnapshot):
+    domains = (CATALOGUE,)
+
+    def build(self):
+        pharmacies = Corpus(
+            ({'id': pk, 'name': name}, name)
+            for pk, name in Pharmacy.objects.values_list('id', 'name').iterator(chunk_size=5000)
+        )
+        masks = Corpus(
+            ({'id': pk, 'name': name, 'pharmacy': pharmacy_name}, name)
+            for pk, name, pharmacy_name in Mask.objects.values_list(
+                'id', 'name', 'pharmacy__name'
+            ).iterator(chunk_size=5000)
+        )
+        return pharmacies, masks
+
+    def search(self, search_term, count=None, pharmacies_after=None, masks_after=None):
+        pharmacies, masks = self.get()
+        return (
+            pharmacies.search(search_term, count, pharmacies_after),
+            masks.search(search_term, count, masks_after),
+        )
+
+
+search_index = SearchIndex()
+
+
+def relevance(search_term):
+    # 完全相同 > 前綴 > 包含
+    return Case(
+        When(name__iexact=search_term, then=3),
+        When(name__istartswith=search_term, then=2),
+        default=1,
+        output_field=IntegerField(),
+    )
+
+
+# search_database 回傳的 tuple 中對應 SEARCH_ORDERING 的欄位，作為分頁的排序鍵
+PHARMACY_ROW_KEY = itemgetter(2, 1, 0)
+MASK_ROW_KEY = itemgetter(3, 1, 0)
+
+
+def search_database(search_term):
+    # 以 values_list() 直接取出需要的欄位，口罩所屬藥局名稱透過 JOIN 取得，每組結果只需一個查詢
+    pharmacies = Pharmacy.objects.filter(name__icontains=search_term).annotate(
+        relevance=relevance(search_term)
+    ).values_list('id', 'name', 'relevance')
+
+    masks = Mask.objects.filter(name__icontains=search_term).annotate(
+        relevance=relevance(search_term),
+        pharmacy_name=F('pharmacy__name'),
+    ).values_list('id', 'name', 'pharmacy_name', 'relevance')
+
+    return pharmacies, masks
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Mask, OpeningHour, Pharmacy, User
+from .versions import CATALOGUE, OPENING_HOURS, PURCHASE_DELETIONS, TRANSACTIONS, bump_version
+
+
+# 透過 admin 或 ORM 逐筆寫入時遞增版本號；bulk 操作不會觸發 signal，需由呼叫端自行 bump_version
+@receiver([post_save, post_delete], sender=Pharmacy)
+def pharmacy_changed(sender, **kwargs):
+    bump_version(CATALOGUE, OPENING_HOURS)
+
+
+@receiver([post_save, post_delete], sender=Mask)
+def mask_changed(sender, **kwargs):
+    # 藥局統計由 Mask.save()/delete() 逐筆更新；匯入刪除大量口罩時這裡只遞增版本號，不逐筆查詢
+    bump_version(CATALOGUE)
+
+
+@receiver([post_save, post_delete], sender=OpeningHour)
+def opening_hour_changed(sender, **kwargs):
+    bump_version(OPENING_HOURS)
+
+
+# 購買紀錄數量龐大，不註冊 signal 以保留刪除用戶時的快速串聯刪除；寫入購買紀錄的程式需自行 bump_version
+@receiver(post_save, sender=User)
+def user_changed(sender, **kwargs):
+    bump_version(TRANSACTIONS)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, **kwargs):
+    bump_version(TRANSACTIONS, PURCHASE_DELETIONS)
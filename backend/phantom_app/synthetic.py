@@ -0,0 +1,159 @@
+import json
+import random
+
+from .etl import ids_by_name, transform_user
+from .models import Mask, OpeningHour, Pharmacy, PurchaseHistory, User
+from .opening_hours import parse_opening_hours
+
+# 與 data/pharmacies.json 相同格式的合成資料，用於壓力測試與效能量測
+MASK_BRANDS = ['True Barrier', 'MaskT', 'Second Smile', 'Masquerade', 'Cotton Kiss']
+MASK_COLORS = ['black', 'blue', 'green']
+PACK_SIZES = [3, 6, 10]
+
+OPENING_HOURS_PATTERNS = [
+    'Mon - Fri 08:00 - 17:00',
+    'Mon - Fri 08:00 - 17:00 / Sat, Sun 08:00 - 12:00',
+    'Mon, Wed, Fri 08:00 - 12:00 / Tue, Thur 14:00 - 18:00',
+    'Mon - Wed 08:00 - 17:00 / Thur, Sat 20:00 - 02:00',
+    'Mon, Wed, Fri 20:00 - 02:00',
+    'Fri - Sun 20:00 - 02:00',
+]
+
+
+def random_opening_hours(rng):
+    if rng.random() < 0.5:
+        return rng.choice(OPENING_HOURS_PATTERNS)
+    # 以半小時為單位隨機產生時段，讓區間端點更分散
+    start = rng.randrange(0, 48) * 30
+    end = (start + rng.randrange(4, 24) * 30) % (24 * 60)
+    days = rng.choice(['Mon - Fri', 'Sat, Sun', 'Mon, Wed, Fri', 'Tue, Thur', 'Fri - Sun'])
+    return f'{days} {start // 60:02d}:{start % 60:02d} - {end // 60:02d}:{end % 60:02d}'
+
+
+def generate_pharmacies(count, seed=0, start=0):
+    rng = random.Random(seed)
+    for index in range(start, start + count):
+        masks = []
+        names = set()
+        for _ in range(rng.randrange(1, 11)):
+            pack_size = rng.choice(PACK_SIZES)
+            name = f'{rng.choice(MASK_BRANDS)} ({rng.choice(MASK_COLORS)}) ({pack_size} per pack)'
+            if name in names:
+                continue
+            names.add(name)
+            masks.append({'name': name, 'price': round(rng.uniform(1.0, 5.0) * pack_size, 2)})
+
+        yield {
+            'name': f'Synthetic Pharmacy {index:07d}',
+            'cashBalance': round(rng.uniform(100, 1000), 2),
+            'openingHours': random_opening_hours(rng),
+            'masks': masks,
+        }
+
+
+def generate_users(count, pharmacies, seed=0, start=0, purchases_per_user=5):
+    """pharmacies 為 generate_pharmacies 產生的藥局，購買紀錄只會引用其中存在的口罩。"""
+    rng = random.Random(seed)
+    catalogue = [(pharmacy['name'], mask) for pharmacy in pharmacies for mask in pharmacy['masks']]
+    for index in range(start, start + count):
+        histories = []
+        for _ in range(rng.randrange(0, purchases_per_user * 2 + 1)):
+            pharmacy_name, mask = rng.choice(catalogue)
+            quantity = rng.randint(1, 3)
+            histories.append({
+                'pharmacyName': pharmacy_name,
+                'maskName': mask['name'],
+                'transactionAmount': round(mask['price'] * quantity, 2),
+                'transactionDate': (
+                    f'2021-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} '
+                    f'{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}'
+                ),
+            })
+        histories.sort(key=lambda history: history['transactionDate'])
+
+        yield {
+            'name': f'Synthetic User {index:07d}',
+            'cashBalance': round(rng.uniform(10, 1000), 2),
+            'purchaseHistories': histories,
+        }
+
+
+def write_json(path, records):
+    """以與 data/*.json 相同的 JSON 陣列格式逐筆寫出，不需要把整份資料放在記憶體中。"""
+    count = 0
+    with open(path, 'w') as file:
+        file.write('[')
+        for record in records:
+            file.write(',\n' if count else '\n')
+            file.write(json.dumps(record))
+            count += 1
+        file.write('\n]\n')
+    return count
+
+
+def load_pharmacies(entries, batch_size=1000):
+    """將合成的藥局、開放時間與口罩直接寫入資料庫，供效能量測使用。"""
+    entries = list(entries)
+    Pharmacy.objects.bulk_create(
+        [
+            Pharmacy(name=entry['name'], cash_balance=entry['cashBalance'], opening_hours=entry['openingHours'])
+            for entry in entries
+        ],
+        batch_size=batch_size,
+    )
+    pharmacy_ids = ids_by_name(Pharmacy.objects, [entry['name'] for entry in entries], batch_size)
+    OpeningHour.objects.bulk_create(
+        [
+            OpeningHour(
+                pharmacy_id=pharmacy_ids[entry['name']],
+                day_of_week=day_of_week,
+                start_time=start_time,
+                end_time=end_time,
+            )
+            for entry in entries
+            for day_of_week, start_time, end_time in parse_opening_hours(entry['openingHours'])
+        ],
+        batch_size=batch_size,
+    )
+    Mask.objects.bulk_create(
+        [
+            Mask(pharmacy_id=pharmacy_ids[entry['name']], name=mask['name'], price=mask['price'])
+            for entry in entries
+            for mask in entry['masks']
+        ],
+        batch_size=batch_size,
+    )
+    return pharmacy_ids
+
+
+def load_users(entries, batch_size=1000):
+    """將合成的使用者與購買紀錄直接寫入資料庫，購買的口罩需已由 load_pharmacies 寫入。"""
+    users = [transform_user(entry) for entry in entries]
+    User.objects.bulk_create(
+        [User(name=user['name'], cash_balance=user['cash_balance']) for user in users],
+        batch_size=batch_size,
+    )
+    user_ids = ids_by_name(User.objects, [user['name'] for user in users], batch_size)
+    masks = {
+        (pharmacy_name, name): (mask_id, pharmacy_id, price)
+        for mask_id, pharmacy_id, pharmacy_name, name, price in Mask.objects.values_list(
+            'id', 'pharmacy_id', 'pharmacy__name', 'name', 'price'
+        ).iterator(chunk_size=5000)
+    }
+    histories = []
+    for user in users:
+        for purchase in user['purchases']:
+            mask_id, pharmacy_id, price = masks[purchase['pharmacy_name'], purchase['mask_name']]
+            histories.append(PurchaseHistory(
+                user_id=user_ids[user['name']],
+                pharmacy_id=pharmacy_id,
+                mask_id=mask_id,
+                pharmacy_name=purchase['pharmacy_name'],
+                mask_name=purchase['mask_name'],
+                quantity=max(round(purchase['transaction_amount'] / float(price)), 1),
+                transaction_amount=purchase['transaction_amount'],
+                transacted_at=purchase['transacted_at'],
+            ))
+    PurchaseHistory.objects.bulk_create(histories, batch_size=batch_size)
+    return user_ids
+
@@ -0,0 +1,86 @@
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+
+from phantom_app.models import (
+    DailyTransactionSummary, DailyUserTransactionSummary, Mask, Pharmacy, PharmacyStats, PurchaseHistory, User,
+)
+from phantom_app.pharmacy_stats import STATS_FIELDS, compute_pharmacy_stats
+
+DATA_DIR = Path(settings.BASE_DIR).parent / 'data'
+CENT = Decimal('0.01')
+
+
+def total(queryset, field):
+    # SQLite 以浮點數計算 SUM，比較前先四捨五入到分
+    return (queryset.aggregate(total=Sum(field))['total'] or Decimal(0)).quantize(CENT)
+
+
+def import_data(**options):
+    call_command('import_json', str(DATA_DIR / 'pharmacies.json'), stdout=StringIO())
+    call_command('import_users', str(DATA_DIR / 'users.json'), stdout=StringIO(), **options)
+
+
+# 測試在同一個交易內寫入後立即讀取，設定唯讀副本（DB_REPLICA_*）時也一律讀取主資料庫
+@override_settings(DATABASE_ROUTERS=[])
+class PhantomTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        # 版本號與回應快取位於行程內快取，每個測試各自從空的快取開始
+        caches['default'].clear()
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+
+
+class PurchaseTestCase(PhantomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pharmacy = Pharmacy.objects.create(name='Carepoint', cash_balance=Decimal('10.00'), opening_hours='')
+        self.other_pharmacy = Pharmacy.objects.create(name='Medlife', cash_balance=Decimal('0.00'), opening_hours='')
+        Mask.objects.create(pharmacy=self.pharmacy, name='True Barrier (green) (3 per pack)', price=Decimal('3.70'))
+        Mask.objects.create(pharmacy=self.other_pharmacy, name='MaskT (black) (10 per pack)', price=Decimal('12.50'))
+        self.user = User.objects.create(name='Yvonne Guerrero', cash_balance=Decimal('50.00'))
+
+    def purchase(self, quantity=2):
+        return self.client.post('/purchase-mask/', {
+            'user_name': self.user.name,
+            'pharmacy_name': self.pharmacy.name,
+            'mask_name': 'True Barrier (green) (3 per pack)',
+            'quantity': quantity,
+        }, content_type='application/json')
+
+    def batch_purchase(self, items):
+        return self.client.post('/purchase-masks/', {'user_name': self.user.name, 'items': items},
+                                content_type='application/json')
+
+    def assertUnchanged(self):
+        self.user.refresh_from_db()
+        self.pharmacy.refresh_from_db()
+        self.assertEqual(self.user.cash_balance, Decimal('50.00'))
+        self.assertEqual(self.pharmacy.cash_balance, Decimal('10.00'))
+        self.assertFalse(PurchaseHistory.objects.exists())
+
+
+class ImportTestCase(PhantomTestCase):
+    def assertRollupsMatchHistories(self):
+        histories = PurchaseHistory.objects.all()
+        self.assertTrue(histories.exists())
+        for summary in (DailyTransactionSummary.objects.all(), DailyUserTransactionSummary.objects.all()):
+            self.assertEqual(summary.aggregate(count=Sum('transaction_count'))['count'], histories.count())
+            self.assertEqual(total(summary, 'total_amount'), total(histories, 'transaction_amount'))
+        self.assertEqual(
+            DailyTransactionSummary.objects.aggregate(count=Sum('mask_count'))['count'],
+            histories.aggregate(count=Sum('quantity'))['count'],
+        )
+
+    def assertPharmacyStatsMatchHistories(self):
+        expected = compute_pharmacy_stats()
+        stored = {stats.pharmacy_id: stats for stats in PharmacyStats.objects.all()}
+        for pharmacy_id, stats in expected.items():
+            for field in STATS_FIELDS:
+                self.assertEqual(getattr(stored[pharmacy_id], field), getattr(stats, field))
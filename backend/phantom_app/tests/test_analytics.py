@@ -0,0 +1,106 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock, skipIf
+
+from django.test import override_settings
+from django.utils import timezone
+
+from phantom_app import analytics
+from phantom_app.analytics import GROUP_BY_FIELDS, SORT_FIELDS, columnar_snapshot, database_breakdown
+from phantom_app.models import Mask, PurchaseHistory, User
+
+from .base import ImportTestCase, import_data, total
+
+# 範圍包含今天，測試中新增的購買紀錄也會列入
+START_DATE, END_DATE = '2021-01-01', timezone.localdate().isoformat()
+
+
+def analytics_params(group_by, **params):
+    return {'start_date': START_DATE, 'end_date': END_DATE, 'group_by': group_by, **params}
+
+
+class TransactionAnalyticsTests(ImportTestCase):
+    def setUp(self):
+        super().setUp()
+        columnar_snapshot.invalidate()
+        import_data()
+
+    def breakdown(self, group_by, **params):
+        response = self.client.get('/transactions/analytics/', analytics_params(group_by, **params))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_groups_add_up_to_the_purchase_histories(self):
+        histories = PurchaseHistory.objects.all()
+        for group_by in GROUP_BY_FIELDS:
+            with self.subTest(group_by=group_by):
+                results = self.breakdown(group_by)
+                self.assertEqual(sum(row['transaction_count'] for row in results), histories.count())
+                self.assertEqual(sum(Decimal(str(row['total_amount'])) for row in results),
+                                 total(histories, 'transaction_amount'))
+
+    def test_results_are_sorted_and_truncated(self):
+        for sort_by in SORT_FIELDS:
+            with self.subTest(sort_by=sort_by):
+                results = self.breakdown('mask', sort_by=sort_by)
+                values = [Decimal(str(row[sort_by])) for row in results]
+                self.assertEqual(values, sorted(values, reverse=True))
+                self.assertEqual(self.breakdown('mask', sort_by=sort_by, top_x=2), results[:2])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in (
+            {'start_date': START_DATE, 'end_date': END_DATE},
+            analytics_params('country'),
+            analytics_params('mask', sort_by='name'),
+            analytics_params('mask', top_x=0),
+            analytics_params('mask', top_x='ten'),
+            analytics_params('mask', start_date=END_DATE, end_date=START_DATE),
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/transactions/analytics/', params).status_code, 400)
+
+
+@skipIf(analytics.np is None, 'numpy is not installed')
+@override_settings(ANALYTICS_BACKEND='columnar')
+class ColumnarAnalyticsTests(TransactionAnalyticsTests):
+    # 繼承資料庫彙總的所有測試，欄式快照的結果須與 GROUP BY 查詢完全相同
+
+    def assertMatchesDatabase(self):
+        start_date, end_date = date.fromisoformat(START_DATE), date.fromisoformat(END_DATE)
+        for group_by in GROUP_BY_FIELDS:
+            for sort_by in SORT_FIELDS:
+                with self.subTest(group_by=group_by, sort_by=sort_by):
+                    self.assertEqual(columnar_snapshot.breakdown(start_date, end_date, group_by, sort_by),
+                                     database_breakdown(start_date, end_date, group_by, sort_by))
+
+    def purchase(self):
+        mask = Mask.objects.select_related('pharmacy').order_by('price').first()
+        user = User.objects.order_by('-cash_balance').first()
+        response = self.client.post('/purchase-mask/', {
+            'user_name': user.name, 'pharmacy_name': mask.pharmacy.name, 'mask_name': mask.name, 'quantity': 1,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_snapshot_matches_the_database(self):
+        self.assertMatchesDatabase()
+
+    def test_breakdown_does_not_query_purchase_histories(self):
+        self.breakdown('mask')
+        with self.assertNumQueries(0):
+            columnar_snapshot.breakdown(date.fromisoformat(START_DATE), date.fromisoformat(END_DATE), 'mask')
+
+    def test_new_purchases_are_merged_incrementally(self):
+        self.breakdown('mask')
+        self.purchase()
+        with mock.patch.object(columnar_snapshot, 'build', wraps=columnar_snapshot.build) as build:
+            self.assertMatchesDatabase()
+        build.assert_not_called()
+        self.assertEqual(len(columnar_snapshot.get()), PurchaseHistory.objects.count())
+
+    def test_snapshot_is_rebuilt_after_purchases_are_deleted(self):
+        self.breakdown('user')
+        User.objects.filter(purchase_histories__isnull=False).first().delete()
+        with mock.patch.object(columnar_snapshot, 'build', wraps=columnar_snapshot.build) as build:
+            self.assertMatchesDatabase()
+        build.assert_called_once()
+        self.assertEqual(len(columnar_snapshot.get()), PurchaseHistory.objects.count())
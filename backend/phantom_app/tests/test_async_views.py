@@ -0,0 +1,122 @@
+import json
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.test import RequestFactory, override_settings
+from django.urls import path
+from django.utils import timezone
+
+from phantom_app import async_views, urls, views
+from phantom_app.models import PurchaseHistory
+
+from . import (
+    test_analytics, test_autocomplete, test_exports, test_mask_count, test_opening_hours, test_purchases, test_search,
+    test_transactions,
+)
+from .base import PurchaseTestCase
+
+# 與 phantom_app.urls 相同的路由，但不論 ASYNC_VIEWS 的設定一律使用 async_views 中同名的 view
+urlpatterns = [
+    path(str(pattern.pattern),
+         getattr(async_views, pattern.callback.view_class.__name__, pattern.callback.view_class).as_view(),
+         name=pattern.name)
+    for pattern in urls.urlpatterns
+]
+async_urls = override_settings(ROOT_URLCONF=__name__)
+
+
+# 以非同步 view 重新執行各 API 的測試，回應、錯誤與查詢數都須與同步版本相同
+@async_urls
+class AsyncOpeningHoursTests(test_opening_hours.OpeningHoursEndpointTests):
+    pass
+
+
+@async_urls
+class AsyncMaskCountTests(test_mask_count.PharmaciesByMaskCountTests):
+    pass
+
+
+@async_urls
+class AsyncTransactionRollupTests(test_transactions.TransactionRollupTests):
+    pass
+
+
+@async_urls
+class AsyncAnalyticsTests(test_analytics.TransactionAnalyticsTests):
+    pass
+
+
+@async_urls
+class AsyncExportTests(test_exports.TransactionExportTests):
+    pass
+
+
+@async_urls
+class AsyncSearchTests(test_search.SearchEndpointTests):
+    pass
+
+
+@async_urls
+class AsyncSuggestionTests(test_autocomplete.SuggestionTests):
+    pass
+
+
+@async_urls
+class AsyncPurchaseMaskTests(test_purchases.PurchaseMaskTests):
+    pass
+
+
+@async_urls
+class AsyncBatchPurchaseMaskTests(test_purchases.BatchPurchaseMaskTests):
+    pass
+
+
+@async_urls
+class AsyncDispatchTests(PurchaseTestCase):
+    def test_routes_use_the_async_views(self):
+        for pattern in urlpatterns:
+            if pattern.callback.view_class is not views.MetricsAPIView:
+                with self.subTest(route=str(pattern.pattern)):
+                    self.assertTrue(pattern.callback.view_class.view_is_async)
+
+    async def test_async_client_matches_the_sync_views(self):
+        params = {'pharmacy_name': 'Carepoint', 'sort_by': 'price'}
+        response = await self.async_client.get('/pharmacies/masks/', params)
+        self.assertEqual(response.status_code, 200)
+
+        sync_view = views.MasksByPharmacyAPIView.as_view()
+        expected = await sync_to_async(lambda: sync_view(RequestFactory().get('/pharmacies/masks/', params)).render())()
+        self.assertEqual(response.content, expected.content)
+
+    async def test_parameter_errors_are_returned_as_json(self):
+        response = await self.async_client.get('/pharmacies/masks/', {'pharmacy_name': 'Carepoint', 'sort_by': 'size'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', json.loads(response.content))
+
+    async def test_purchase_runs_in_a_single_transaction(self):
+        response = await self.async_client.post('/purchase-mask/', {
+            'user_name': self.user.name,
+            'pharmacy_name': self.pharmacy.name,
+            'mask_name': 'True Barrier (green) (3 per pack)',
+            'quantity': 2,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        history = await PurchaseHistory.objects.aget()
+        self.assertEqual(history.transaction_amount, Decimal('7.40'))
+        await self.user.arefresh_from_db()
+        self.assertEqual(self.user.cash_balance, Decimal('42.60'))
+
+    async def test_export_is_streamed_from_an_async_generator(self):
+        await self.async_client.post('/purchase-mask/', {
+            'user_name': self.user.name,
+            'pharmacy_name': self.pharmacy.name,
+            'mask_name': 'True Barrier (green) (3 per pack)',
+            'quantity': 1,
+        }, content_type='application/json')
+        today = timezone.localdate().isoformat()
+        response = await self.async_client.get('/transactions/export/', {'start_date': today, 'end_date': today})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+
+        rows = [json.loads(line) for line in b''.join([chunk async for chunk in response]).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [history.id async for history in PurchaseHistory.objects.all()])
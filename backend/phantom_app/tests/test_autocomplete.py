@@ -0,0 +1,77 @@
+from decimal import Decimal
+from unittest import mock
+
+from phantom_app import autocomplete
+from phantom_app.autocomplete import SuggestionIndex, suggestion_index
+from phantom_app.models import Mask, Pharmacy
+
+from .base import PhantomTestCase
+
+
+def add_pharmacy(name, *masks):
+    pharmacy = Pharmacy.objects.create(name=name, cash_balance=Decimal('0.00'), opening_hours='')
+    Mask.objects.bulk_create([Mask(pharmacy=pharmacy, name=mask, price=Decimal('1.00')) for mask in masks])
+    return pharmacy
+
+
+class SuggestionTests(PhantomTestCase):
+    def setUp(self):
+        super().setUp()
+        suggestion_index.invalidate()
+        add_pharmacy('Carepoint', 'True Barrier (green) (3 per pack)', 'Second Smile (black) (10 per pack)')
+        add_pharmacy('Medlife', 'Second Smile (black) (10 per pack)', 'MaskT (black) (10 per pack)')
+        add_pharmacy('Care', 'Second Smile (black) (10 per pack)')
+
+    def suggest(self, search_term, **params):
+        response = self.client.get('/search/suggest/', {'search_term': search_term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(suggestion['name'], suggestion['type']) for suggestion in response.json()['suggestions']]
+
+    def test_matches_are_ranked_by_quality(self):
+        add_pharmacy('Health Care')
+        self.assertEqual(self.suggest('care'), [
+            ('Care', 'pharmacy'), ('Carepoint', 'pharmacy'), ('Health Care', 'pharmacy'),
+        ])
+
+    def test_popular_names_are_kept_when_truncating(self):
+        # 字母順序在前的口罩只有一間藥局販售，熱門的口罩仍排在前面
+        add_pharmacy('Sunrise', 'Second Skin (white)')
+        self.assertEqual(self.suggest('second', limit=1), [('Second Smile (black) (10 per pack)', 'mask')])
+        self.assertEqual(self.suggest('barr'), [('True Barrier (green) (3 per pack)', 'mask')])
+
+    def test_suggestions_do_not_query_the_database(self):
+        self.suggest('s')
+        with self.assertNumQueries(0):
+            self.suggest('se')
+            self.suggest('sec')
+
+    def test_catalogue_changes_are_applied(self):
+        self.assertEqual(self.suggest('mask'), [('MaskT (black) (10 per pack)', 'mask')])
+        Mask.objects.filter(name__startswith='MaskT').delete()
+        Mask.objects.create(pharmacy=Pharmacy.objects.get(name='Care'), name='Masquerade (blue)', price=Decimal('2.00'))
+        self.assertEqual(self.suggest('mas'), [('Masquerade (blue)', 'mask')])
+
+    @mock.patch.object(autocomplete, 'BLOCK_SIZE', 2)
+    def test_refresh_only_normalizes_changed_names(self):
+        index = SuggestionIndex()
+        snapshot = index.build()
+        Mask.objects.create(pharmacy=Pharmacy.objects.get(name='Care'), name='Cotton Kiss (blue)', price=Decimal('2.00'))
+        Mask.objects.filter(name__startswith='MaskT').delete()
+
+        with mock.patch.object(autocomplete, 'normalize', wraps=autocomplete.normalize) as normalize:
+            refreshed = index.refresh(snapshot)
+        normalize.assert_called_once_with('Cotton Kiss (blue)')
+
+        # 增量更新的結果須與完整重建相同，且不修改舊的快照
+        rebuilt = index.build()
+        self.assertEqual(refreshed.suggestions, rebuilt.suggestions)
+        self.assertEqual(refreshed.names.entries, rebuilt.names.entries)
+        self.assertEqual(refreshed.words.entries, rebuilt.words.entries)
+        self.assertIn('maskt black 10 per pack', snapshot.suggestions)
+        for prefix in ('s', 'c', 'black', 'z'):
+            self.assertEqual(refreshed.top(prefix, 5), rebuilt.top(prefix, 5))
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({}, {'search_term': 'care', 'limit': 'ten'}, {'search_term': 'care', 'limit': 0}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/search/suggest/', params).status_code, 400)
@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+from datetime import date
+
+from phantom_app.exports import EXPORT_FIELDS, export_lines, export_queryset
+from phantom_app.models import PurchaseHistory
+
+from .base import ImportTestCase, import_data
+
+
+class TransactionExportTests(ImportTestCase):
+    url = '/transactions/export/'
+    start_date, end_date = '2021-01-01', '2021-01-15'
+
+    def setUp(self):
+        super().setUp()
+        import_data()
+
+    def export(self, **params):
+        response = self.client.get(self.url, {'start_date': self.start_date, 'end_date': self.end_date, **params})
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response).decode()
+
+    def expected_ids(self, **filters):
+        return list(PurchaseHistory.objects.filter(
+            transacted_at__date__range=[self.start_date, self.end_date], **filters
+        ).order_by('transacted_at', 'id').values_list('id', flat=True))
+
+    def test_ndjson_rows_are_ordered_by_transaction_time(self):
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="transactions_2021-01-01_2021-01-15.ndjson"')
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertTrue(rows)
+        self.assertEqual([row['id'] for row in rows], self.expected_ids())
+        self.assertEqual(tuple(rows[0]), EXPORT_FIELDS)
+        history = PurchaseHistory.objects.select_related('user').get(id=rows[0]['id'])
+        self.assertEqual((rows[0]['user_name'], rows[0]['transaction_amount']),
+                         (history.user.name, str(history.transaction_amount)))
+
+    def test_csv_matches_ndjson(self):
+        response, content = self.export(file_format='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+        _, ndjson = self.export()
+        expected = [{field: str(value) for field, value in json.loads(line).items()} for line in ndjson.splitlines()]
+        self.assertEqual(rows, expected)
+
+    def test_filters_by_user_and_pharmacy(self):
+        history = PurchaseHistory.objects.filter(
+            transacted_at__date__range=[self.start_date, self.end_date]
+        ).select_related('user').first()
+        _, content = self.export(user_name=history.user.name, pharmacy_name=history.pharmacy_name)
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()],
+                         self.expected_ids(user=history.user, pharmacy_name=history.pharmacy_name))
+
+    def test_rows_are_read_in_chunks(self):
+        # 跨越多批時不重複、不遺漏，每批一個查詢
+        histories = export_queryset(date.fromisoformat(self.start_date), date.fromisoformat(self.end_date))
+        with self.assertNumQueries(len(self.expected_ids()) // 3 + 1):
+            lines = list(export_lines(histories, 'ndjson', chunk_size=3))
+        self.assertEqual([json.loads(line)['id'] for line in lines], self.expected_ids())
+
+    def test_invalid_parameters_are_rejected(self):
+        for params, status_code in (
+            ({'start_date': self.start_date}, 400),
+            ({'start_date': self.end_date, 'end_date': self.start_date}, 400),
+            ({'start_date': self.start_date, 'end_date': self.end_date, 'file_format': 'xml'}, 400),
+            ({'start_date': self.start_date, 'end_date': self.end_date, 'pharmacy_name': 'Nowhere'}, 404),
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, status_code)
@@ -0,0 +1,251 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+
+from phantom_app.etl import InvalidRecord, iter_json_records
+from phantom_app.management.commands import import_users
+from phantom_app.models import Mask, OpeningHour, Pharmacy, PharmacyStats, PurchaseHistory, User
+from phantom_app.versions import CATALOGUE, get_version
+
+from .base import DATA_DIR, ImportTestCase, import_data
+
+
+def purchases():
+    return sorted(PurchaseHistory.objects.values_list('user__name', 'mask_name', 'transaction_amount', 'transacted_at'))
+
+
+class ImportTests(ImportTestCase):
+    def test_import_builds_rollups_and_stats(self):
+        import_data()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertRollupsMatchHistories()
+        self.assertPharmacyStatsMatchHistories()
+
+    def test_import_matches_the_source_data(self):
+        import_data()
+        pharmacies = json.loads((DATA_DIR / 'pharmacies.json').read_text())
+        users = json.loads((DATA_DIR / 'users.json').read_text())
+        self.assertEqual(Pharmacy.objects.count(), len(pharmacies))
+        self.assertEqual(Mask.objects.count(), sum(len(pharmacy['masks']) for pharmacy in pharmacies))
+        self.assertTrue(OpeningHour.objects.exists())
+        self.assertEqual(PurchaseHistory.objects.count(), sum(len(user['purchaseHistories']) for user in users))
+
+    def test_rerunning_the_pharmacy_import_replaces_rows(self):
+        import_data()
+        call_command('import_json', str(DATA_DIR / 'pharmacies.json'), stdout=StringIO())
+        pharmacies = json.loads((DATA_DIR / 'pharmacies.json').read_text())
+        self.assertEqual(Pharmacy.objects.count(), len(pharmacies))
+        self.assertEqual(Mask.objects.count(), sum(len(pharmacy['masks']) for pharmacy in pharmacies))
+        # 重新匯入後購買紀錄重新連結到新的口罩
+        self.assertFalse(PurchaseHistory.objects.filter(mask=None).exists())
+
+    def test_rerunning_the_pharmacy_import_does_not_query_per_mask(self):
+        # 重新匯入的查詢數與口罩數量無關：刪除舊口罩時不逐筆更新統計，統計在最後一次重建
+        pharmacies = json.loads((DATA_DIR / 'pharmacies.json').read_text())
+        doubled = [{**pharmacy, 'masks': pharmacy['masks'] + [{**mask, 'name': f"{mask['name']} (spare)"}
+                                                           for mask in pharmacy['masks']]}
+                   for pharmacy in pharmacies]
+        counts = []
+        with tempfile.TemporaryDirectory() as directory:
+            for records in (pharmacies, doubled):
+                path = os.path.join(directory, 'pharmacies.json')
+                with open(path, 'w') as file:
+                    json.dump(records, file)
+                call_command('import_json', path, stdout=StringIO())
+                with CaptureQueriesContext(connection) as queries:
+                    call_command('import_json', path, stdout=StringIO())
+                counts.append(len(queries))
+        # 口罩數量加倍只可能讓 bulk 操作多分一批，不會多出逐筆的查詢
+        self.assertLessEqual(counts[1], counts[0] + 2)
+        self.assertEqual(Mask.objects.count(), sum(len(pharmacy['masks']) for pharmacy in doubled))
+        self.assertPharmacyStatsMatchHistories()
+
+    def test_single_mask_writes_refresh_pharmacy_stats(self):
+        import_data()
+        pharmacy = Pharmacy.objects.get(name='DFW Wellness')
+        mask = Mask.objects.create(pharmacy=pharmacy, name='Cotton Kiss (blue)', price=Decimal('99.00'))
+        self.assertPharmacyStatsMatchHistories()
+        self.assertEqual(PharmacyStats.objects.get(pharmacy=pharmacy).max_price, Decimal('99.00'))
+
+        mask.price = Decimal('0.50')
+        mask.save()
+        self.assertEqual(PharmacyStats.objects.get(pharmacy=pharmacy).min_price, Decimal('0.50'))
+        mask.delete()
+        self.assertPharmacyStatsMatchHistories()
+
+    def test_unknown_pharmacies_and_masks_are_skipped(self):
+        call_command('import_json', str(DATA_DIR / 'pharmacies.json'), stdout=StringIO())
+        users = [{
+            'name': 'Yvonne Guerrero',
+            'cashBalance': 191.83,
+            'purchaseHistories': [
+                {'pharmacyName': 'Nowhere', 'maskName': 'Any', 'transactionAmount': 1.0,
+                 'transactionDate': '2021-01-04 15:18:51'},
+                {'pharmacyName': 'DFW Wellness', 'maskName': 'Unknown Mask', 'transactionAmount': 1.0,
+                 'transactionDate': '2021-01-04 15:18:51'},
+                {'pharmacyName': 'DFW Wellness', 'maskName': 'True Barrier (green) (3 per pack)',
+                 'transactionAmount': 13.7, 'transactionDate': '2021-01-04 15:18:51'},
+            ],
+        }]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.json')
+            with open(path, 'w') as file:
+                json.dump(users, file)
+            call_command('import_users', path, stdout=StringIO())
+        self.assertEqual(User.objects.get().cash_balance, Decimal('191.83'))
+        history = PurchaseHistory.objects.get()
+        self.assertEqual((history.mask_name, history.quantity), ('True Barrier (green) (3 per pack)', 1))
+
+    def test_users_are_loaded_in_bulk(self):
+        call_command('import_json', str(DATA_DIR / 'pharmacies.json'), stdout=StringIO())
+        # 每批一次查詢與寫入，查詢數不隨購買紀錄的筆數成長
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_users', str(DATA_DIR / 'users.json'), stdout=StringIO())
+        self.assertLess(len(queries), PurchaseHistory.objects.count() // 2)
+
+    def test_resumed_import_matches_uninterrupted_import(self):
+        original = import_users.Command.import_chunk
+        calls = []
+
+        def crash_on_third_chunk(command, records, report):
+            calls.append(len(records))
+            if len(calls) == 3:
+                raise RuntimeError('interrupted')
+            return original(command, records, report)
+
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, 'users.checkpoint')
+            with mock.patch.object(import_users.Command, 'import_chunk', crash_on_third_chunk):
+                with self.assertRaises(RuntimeError):
+                    import_data(batch_size=5, checkpoint=checkpoint)
+            self.assertEqual(User.objects.count(), 10)
+
+            call_command('import_users', str(DATA_DIR / 'users.json'), batch_size=5, checkpoint=checkpoint,
+                         resume=True, stdout=StringIO())
+
+        self.assertEqual(User.objects.count(), 20)
+        # 中斷前提交的批次也納入每日彙總與藥局統計
+        self.assertRollupsMatchHistories()
+        self.assertPharmacyStatsMatchHistories()
+
+    def test_json_lines_import_matches_json_import(self):
+        import_data()
+        expected = purchases()
+        PurchaseHistory.objects.all().delete()
+        User.objects.all().delete()
+
+        users = json.loads((DATA_DIR / 'users.json').read_text())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.jsonl')
+            with open(path, 'w') as file:
+                file.writelines(json.dumps(user) + '\n' for user in users)
+            call_command('import_users', path, batch_size=3, stdout=StringIO())
+        self.assertEqual(purchases(), expected)
+        self.assertRollupsMatchHistories()
+
+
+    def test_malformed_json_lines_are_skipped(self):
+        records = json.loads((DATA_DIR / 'pharmacies.json').read_text())[:2]
+        for workers in (1, 2):
+            with self.subTest(workers=workers), tempfile.TemporaryDirectory() as directory:
+                Pharmacy.objects.all().delete()
+                path = os.path.join(directory, 'pharmacies.jsonl')
+                with open(path, 'w') as file:
+                    file.write(json.dumps(records[0]) + '\n{"name": "Broken\n{"name": "No masks"}\n'
+                               + json.dumps(records[1]) + '\n')
+                out = StringIO()
+                call_command('import_json', path, format='jsonl', workers=workers, stdout=out)
+
+                self.assertEqual(
+                    sorted(Pharmacy.objects.values_list('name', flat=True)), sorted(record['name'] for record in records)
+                )
+                self.assertIn('2 skipped', out.getvalue())
+
+    def test_parallel_import_matches_serial_import(self):
+        import_data()
+        expected = purchases()
+        PurchaseHistory.objects.all().delete()
+        User.objects.all().delete()
+
+        users = json.loads((DATA_DIR / 'users.json').read_text())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.jsonl')
+            with open(path, 'w') as file:
+                file.writelines(json.dumps(user) + '\n' for user in users)
+            # 子行程只解析與轉換，依輸入順序交回目前的行程寫入
+            call_command('import_users', path, batch_size=3, workers=2, stdout=StringIO())
+        self.assertEqual(purchases(), expected)
+        self.assertEqual(list(User.objects.order_by('id').values_list('name', flat=True)),
+                         [user['name'] for user in users])
+        self.assertRollupsMatchHistories()
+    def test_incremental_import_without_changes_is_a_no_op(self):
+        import_data()
+        masks = list(Mask.objects.order_by('id').values_list('id', 'name', 'price'))
+        version = get_version(CATALOGUE)
+
+        out = StringIO()
+        call_command('import_json', str(DATA_DIR / 'pharmacies.json'), incremental=True, stdout=out)
+
+        self.assertEqual(list(Mask.objects.order_by('id').values_list('id', 'name', 'price')), masks)
+        self.assertEqual(get_version(CATALOGUE), version)
+        self.assertPharmacyStatsMatchHistories()
+
+    def test_incremental_import_only_writes_changed_masks(self):
+        import_data()
+        pharmacies = json.loads((DATA_DIR / 'pharmacies.json').read_text())
+        pharmacy = Pharmacy.objects.get(name=pharmacies[0]['name'])
+        changed, removed = pharmacies[0]['masks'][:2]
+        ids = dict(Mask.objects.filter(pharmacy=pharmacy).values_list('name', 'id'))
+        version = get_version(CATALOGUE)
+
+        changed['price'] = 99.99
+        pharmacies[0]['masks'].remove(removed)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pharmacies.json')
+            with open(path, 'w') as file:
+                json.dump(pharmacies, file)
+            out = StringIO()
+            call_command('import_json', path, incremental=True, stdout=out)
+
+        # 改價的口罩保留原本的主鍵，從來源移除的口罩被刪除
+        del ids[removed['name']]
+        self.assertEqual(dict(Mask.objects.filter(pharmacy=pharmacy).values_list('name', 'id')), ids)
+        self.assertEqual(Mask.objects.get(id=ids[changed['name']]).price, Decimal('99.99'))
+        self.assertIn('masks: 0 inserted, 1 updated, 1 deleted', out.getvalue())
+        self.assertGreater(get_version(CATALOGUE), version)
+        self.assertPharmacyStatsMatchHistories()
+
+class IterJsonRecordsTests(SimpleTestCase):
+    def write(self, directory, name, content):
+        path = os.path.join(directory, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def test_json_array_is_read_in_small_chunks(self):
+        expected = json.loads((DATA_DIR / 'pharmacies.json').read_text())
+        # 讀取緩衝區小於單筆紀錄時仍能完整解析
+        with mock.patch('phantom_app.etl.READ_SIZE', 7):
+            self.assertEqual(list(iter_json_records(DATA_DIR / 'pharmacies.json')), expected)
+
+    def test_format_is_detected_from_the_first_character(self):
+        with tempfile.TemporaryDirectory() as directory:
+            jsonl = self.write(directory, 'records', '\n{"a": 1}\n\n{"a": [2]}\n')
+            array = self.write(directory, 'array', '  \n [ {"a": 1} , {"a": [2]} ]')
+            self.assertEqual(list(iter_json_records(jsonl)), [{'a': 1}, {'a': [2]}])
+            self.assertEqual(list(iter_json_records(array)), [{'a': 1}, {'a': [2]}])
+            self.assertEqual(list(iter_json_records(jsonl, raw_lines=True)), ['{"a": 1}', '{"a": [2]}'])
+
+    def test_non_array_json_is_rejected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write(directory, 'object.json', '{"a": 1}')
+            with self.assertRaises(InvalidRecord):
+                list(iter_json_records(path, format='json'))
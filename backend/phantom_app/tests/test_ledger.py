@@ -0,0 +1,73 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from phantom_app.ledger import apply_ledger, ledger_backlog, orphaned_entries, purge_ledger
+from phantom_app.models import DailyTransactionSummary, PharmacyStats, PurchaseHistory, PurchaseLedgerEntry
+
+from . import test_purchases
+from .base import PurchaseTestCase, total
+
+
+@override_settings(PURCHASE_LEDGER=True)
+class PurchaseLedgerTests(PurchaseTestCase):
+    def test_ledger_is_applied_once(self):
+        self.assertEqual(self.purchase(quantity=2).status_code, 201)
+
+        # 購買時只扣款並寫入帳本
+        self.user.refresh_from_db()
+        self.pharmacy.refresh_from_db()
+        self.assertEqual(self.user.cash_balance, Decimal('42.60'))
+        self.assertEqual(self.pharmacy.cash_balance, Decimal('10.00'))
+        self.assertFalse(PurchaseHistory.objects.exists())
+
+        self.assertEqual(len(apply_ledger()), 1)
+        self.assertEqual(apply_ledger(), [])
+
+        self.pharmacy.refresh_from_db()
+        self.assertEqual(self.pharmacy.cash_balance, Decimal('17.40'))
+        self.assertEqual(PurchaseHistory.objects.count(), 1)
+        self.assertFalse(PurchaseLedgerEntry.objects.filter(applied_at=None).exists())
+        self.assertEqual(total(DailyTransactionSummary.objects.all(), 'total_amount'), Decimal('7.40'))
+        self.assertEqual(PharmacyStats.objects.get(pharmacy=self.pharmacy).transaction_count, 1)
+
+
+    def test_entries_of_deleted_pharmacies_are_left_in_the_ledger(self):
+        self.assertEqual(self.purchase(quantity=1).status_code, 201)
+        self.pharmacy.delete()
+        self.assertEqual(self.batch_purchase([
+            {'pharmacy_name': 'Medlife', 'mask_name': 'MaskT (black) (10 per pack)', 'quantity': 1},
+        ]).status_code, 201)
+
+        # 無法入帳的紀錄不會阻擋後面的紀錄，也不計入等待套用的數量
+        applied = apply_ledger()
+        self.assertEqual([entry.pharmacy_id for entry in applied], [self.other_pharmacy.id])
+        self.assertEqual(apply_ledger(), [])
+        self.assertEqual(ledger_backlog(), (0, None))
+        orphan = orphaned_entries().get()
+        self.assertEqual((orphan.pharmacy_name, orphan.transaction_amount), ('Carepoint', Decimal('3.70')))
+        self.assertEqual(PurchaseHistory.objects.count(), 1)
+
+        purge_ledger(timedelta(0))
+        self.assertTrue(PurchaseLedgerEntry.objects.filter(pk=orphan.pk, applied_at=None).exists())
+        with self.assertLogs('phantom_app.metrics', 'WARNING') as logs:
+            call_command('flush_ledger', once=True, stdout=StringIO(), stderr=StringIO())
+        event = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((event['event'], event['entries'], event['entry_ids']), ('ledger_orphaned', 1, [orphan.pk]))
+
+        # 改為其他藥局後於下一批套用
+        PurchaseLedgerEntry.objects.filter(pk=orphan.pk).update(pharmacy=self.other_pharmacy)
+        self.assertEqual([entry.pk for entry in apply_ledger()], [orphan.pk])
+        self.other_pharmacy.refresh_from_db()
+        self.assertEqual(self.other_pharmacy.cash_balance, Decimal('16.20'))
+        self.assertFalse(orphaned_entries().exists())
+
+
+# 帳本模式下同樣的並行購買，套用全部帳本紀錄後餘額仍須守恆
+@override_settings(PURCHASE_LEDGER=True)
+class ConcurrentLedgerPurchaseTests(test_purchases.ConcurrentPurchaseTests):
+    pass
@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from phantom_app.models import Mask, Pharmacy
+
+from .base import PhantomTestCase
+
+
+class PharmaciesByMaskCountTests(PhantomTestCase):
+    url = '/pharmacies/mask-count/'
+
+    def setUp(self):
+        super().setUp()
+        for name, prices in (('Carepoint', ['5.00', '10.00', '20.00']), ('Medlife', ['15.00']), ('Welltrack', [])):
+            pharmacy = Pharmacy.objects.create(name=name, cash_balance=Decimal('0.00'), opening_hours='')
+            Mask.objects.bulk_create([
+                Mask(pharmacy=pharmacy, name=f'Mask {index}', price=Decimal(price)) for index, price in enumerate(prices)
+            ])
+
+    def mask_count(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['name'], row['mask_count']) for row in response.json()]
+
+    def test_more_than(self):
+        self.assertEqual(self.mask_count(comparison='more', count=2, max_price=20), [('Carepoint', 3)])
+        self.assertEqual(self.mask_count(comparison='more', count=1, max_price=20),
+                         [('Carepoint', 3), ('Medlife', 1)])
+
+    def test_less_than_includes_pharmacies_without_matching_masks(self):
+        self.assertEqual(self.mask_count(comparison='less', count=1, min_price=6, max_price=12),
+                         [('Carepoint', 1), ('Medlife', 0), ('Welltrack', 0)])
+
+    def test_price_bounds_are_inclusive(self):
+        self.assertEqual(self.mask_count(comparison='more', count=2, min_price=10, max_price=20),
+                         [('Carepoint', 2)])
+
+    def test_counts_in_a_single_query(self):
+        with self.assertNumQueries(1):
+            self.mask_count(comparison='less', count=5, max_price=100)
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in (
+            {'comparison': 'more', 'count': 2},
+            {'comparison': 'equal', 'count': 2, 'max_price': 10},
+            {'comparison': 'more', 'count': 'two', 'max_price': 10},
+            {'comparison': 'more', 'count': 2, 'max_price': 'ten'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
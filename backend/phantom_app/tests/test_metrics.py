@@ -0,0 +1,92 @@
+import json
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from phantom_app import metrics
+from phantom_app.metrics import Counter, Histogram, render_metrics
+
+from .base import PurchaseTestCase
+
+MASK_COUNT = ('pharmacies/mask-count/', 'GET', 200)
+
+
+class RenderMetricsTests(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('latency_seconds', 'Latency.', ('view',), (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(('search/',), value)
+
+        self.assertEqual(render_metrics([histogram]).splitlines(), [
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{view="search/",le="0.1"} 2',
+            'latency_seconds_bucket{view="search/",le="1"} 3',
+            'latency_seconds_bucket{view="search/",le="+Inf"} 4',
+            'latency_seconds_sum{view="search/"} 2.65',
+            'latency_seconds_count{view="search/"} 4',
+        ])
+
+    def test_label_values_are_escaped(self):
+        counter = Counter('errors_total', 'Errors.', ('view',))
+        counter.inc(('say "hi"\\\n',))
+        self.assertIn('errors_total{view="say \\"hi\\"\\\\\\n"} 1', render_metrics([counter]))
+
+
+@override_settings(REQUEST_METRICS=True, MIDDLEWARE=['phantom_app.middleware.RequestMetricsMiddleware',
+                                                     *settings.MIDDLEWARE])
+class RequestMetricsMiddlewareTests(PurchaseTestCase):
+    def mask_count(self):
+        return self.client.get('/pharmacies/mask-count/', {'comparison': 'more', 'count': 0, 'max_price': 10})
+
+    def observations(self, histogram, labels):
+        counts = histogram.series.get(labels)
+        return sum(counts[:-1]) if counts else 0
+
+    def test_queries_are_reported_per_request(self):
+        before = self.observations(metrics.db_queries, MASK_COUNT)
+        with self.assertLogs('phantom_app.metrics', 'INFO') as logs:
+            response = self.mask_count()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record['view'], record['status'], record['db_queries'], record['response_bytes']),
+                         ('pharmacies/mask-count/', 200, 1, len(response.content)))
+        self.assertFalse(record['slow'])
+        self.assertEqual(self.observations(metrics.db_queries, MASK_COUNT), before + 1)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_queries_and_requests_are_logged(self):
+        before = metrics.slow_queries.series.get(('pharmacies/mask-count/',), 0)
+        with self.assertLogs('phantom_app.metrics', 'WARNING') as logs:
+            self.mask_count()
+
+        events = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual([event['event'] for event in events], ['slow_query', 'request'])
+        self.assertIn('SELECT', events[0]['sql'])
+        self.assertTrue(events[1]['slow'])
+        self.assertEqual(metrics.slow_queries.series[('pharmacies/mask-count/',)], before + 1)
+
+    def test_metrics_endpoint_exposes_the_histograms(self):
+        with self.assertLogs('phantom_app.metrics', 'INFO'):
+            self.mask_count()
+            response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE phantom_request_duration_seconds histogram', body)
+        self.assertIn('phantom_db_queries_count{view="pharmacies/mask-count/",method="GET",status="200"}', body)
+
+    @override_settings(PURCHASE_LEDGER=True)
+    def test_ledger_gauges_are_included_with_the_ledger(self):
+        with self.assertLogs('phantom_app.metrics', 'INFO'):
+            body = self.client.get('/metrics').content.decode()
+        for metric in metrics.REGISTRY:
+            self.assertIn(f'# TYPE {metric.name}', body)
+        self.assertIn('phantom_ledger_queue_depth 0', body)
+
+    @override_settings(REQUEST_METRICS=False)
+    def test_metrics_endpoint_is_disabled_by_default(self):
+        with self.assertLogs('phantom_app.metrics', 'INFO'):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
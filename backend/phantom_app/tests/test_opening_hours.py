@@ -0,0 +1,115 @@
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.test import SimpleTestCase, override_settings
+
+from phantom_app.models import OpeningHour, Pharmacy
+from phantom_app.opening_hours import DAYS_OF_WEEK, parse_opening_hours
+from phantom_app.opening_hours_index import opening_hours_index, query_open_pharmacies
+
+from .base import PhantomTestCase
+
+
+def add_pharmacy(name, opening_hours):
+    pharmacy = Pharmacy.objects.create(name=name, cash_balance=Decimal('0.00'), opening_hours=opening_hours)
+    OpeningHour.objects.bulk_create([
+        OpeningHour(pharmacy=pharmacy, day_of_week=day, start_time=start_time, end_time=end_time)
+        for day, start_time, end_time in parse_opening_hours(opening_hours)
+    ])
+    return pharmacy
+
+
+class ParseOpeningHoursTests(SimpleTestCase):
+    def test_overnight_hours_are_split_at_midnight(self):
+        self.assertEqual(parse_opening_hours('Mon 20:00 - 02:00'), [
+            ('Mon', time(20, 0), time(23, 59)),
+            ('Tue', time(0, 0), time(2, 0)),
+        ])
+
+    def test_sunday_overnight_wraps_to_monday(self):
+        self.assertEqual(parse_opening_hours('Sun 22:00 - 01:00'), [
+            ('Mon', time(0, 0), time(1, 0)),
+            ('Sun', time(22, 0), time(23, 59)),
+        ])
+
+    def test_day_ranges_aliases_and_overlaps(self):
+        self.assertEqual(parse_opening_hours('Mon - Wed 08:00 - 12:00 / Thur, Tue 11:00 - 14:00'), [
+            ('Mon', time(8, 0), time(12, 0)),
+            ('Tue', time(8, 0), time(14, 0)),
+            ('Wed', time(8, 0), time(12, 0)),
+            ('Thu', time(11, 0), time(14, 0)),
+        ])
+
+    def test_invalid_segments_are_reported_and_skipped(self):
+        errors = []
+        self.assertEqual(parse_opening_hours('Mon 25:00 - 02:00 / Fri 08:00 - 09:00', on_error=errors.append), [
+            ('Fri', time(8, 0), time(9, 0)),
+        ])
+        self.assertEqual(len(errors), 1)
+
+
+class OpeningHoursEndpointTests(PhantomTestCase):
+    def setUp(self):
+        super().setUp()
+        add_pharmacy('Night Owl', 'Mon - Fri 20:00 - 02:00')
+        add_pharmacy('Daytime', 'Mon, Tue 08:00 - 18:00')
+        add_pharmacy('Weekend', 'Sat, Sun 10:00 - 16:00')
+
+    def open_at(self, weekday, at):
+        response = self.client.get('/pharmacies/opening-hours/', {'weekday': weekday, 'time': at})
+        self.assertEqual(response.status_code, 200)
+        return [pharmacy['name'] for pharmacy in response.json()]
+
+    def test_overnight_pharmacy_is_open_after_midnight(self):
+        self.assertEqual(self.open_at('Mon', '23:30'), ['Night Owl'])
+        self.assertEqual(self.open_at('Tue', '01:00'), ['Night Owl'])
+        self.assertEqual(self.open_at('Sat', '01:00'), ['Night Owl'])
+        self.assertEqual(self.open_at('Mon', '01:00'), [])
+        self.assertEqual(self.open_at('Tue', '03:00'), [])
+
+    def test_results_are_sorted_by_name(self):
+        add_pharmacy('Afternoon', 'Tue 12:00 - 20:30')
+        self.assertEqual(self.open_at('Tue', '17:00'), ['Afternoon', 'Daytime'])
+        self.assertEqual(self.open_at('Tue', '20:15'), ['Afternoon', 'Night Owl'])
+
+    def test_weekday_aliases_are_accepted(self):
+        self.assertEqual(self.open_at('Thur', '21:00'), ['Night Owl'])
+
+    def test_lookup_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            self.open_at('Tue', '10:00')
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.client.get('/pharmacies/opening-hours/', {'weekday': 'Mon'}).status_code, 400)
+        response = self.client.get('/pharmacies/opening-hours/', {'weekday': 'Mon', 'time': '25:99'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(OPENING_HOURS_INDEX=True)
+class OpeningHoursIndexTests(OpeningHoursEndpointTests):
+    # 繼承資料庫路徑的所有測試，索引的結果須與單一查詢相同
+    def setUp(self):
+        super().setUp()
+        opening_hours_index.invalidate()
+
+    def test_lookup_is_a_single_query(self):
+        self.open_at('Tue', '10:00')
+        # 索引建立後的查詢不存取資料庫
+        with self.assertNumQueries(0):
+            self.open_at('Tue', '10:00')
+            self.open_at('Wed', '23:00')
+
+    def test_index_matches_the_database_at_every_boundary(self):
+        for weekday in DAYS_OF_WEEK:
+            for at in ('00:00', '01:59', '02:00', '02:01', '07:59', '08:00', '17:59', '18:00', '18:01', '23:59'):
+                with self.subTest(weekday=weekday, time=at):
+                    query_time = datetime.strptime(at, '%H:%M').time()
+                    expected = [row['name'] for row in query_open_pharmacies(weekday, query_time)]
+                    self.assertEqual(self.open_at(weekday, at), expected)
+
+    def test_index_is_rebuilt_after_opening_hours_change(self):
+        self.assertEqual(self.open_at('Wed', '09:00'), [])
+        # 逐筆寫入觸發 signal 遞增版本號
+        OpeningHour.objects.create(pharmacy=Pharmacy.objects.get(name='Weekend'), day_of_week='Wed',
+                                   start_time=time(9, 0), end_time=time(10, 0))
+        self.assertEqual(self.open_at('Wed', '09:00'), ['Weekend'])
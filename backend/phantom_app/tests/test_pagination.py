@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+from phantom_app.models import Mask, Pharmacy
+
+from .base import PhantomTestCase
+
+
+class KeysetPaginationTests(PhantomTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pharmacy = Pharmacy.objects.create(name='Carepoint', cash_balance=Decimal('0.00'), opening_hours='')
+        # 同價的口罩以 id 決定順序
+        Mask.objects.bulk_create([
+            Mask(pharmacy=self.pharmacy, name=f'Mask {index:02d}', price=Decimal(5 + index % 3)) for index in range(11)
+        ])
+
+    def pages(self, sort_by, between_pages=None):
+        names = []
+        response = self.client.get('/pharmacies/masks/', {'pharmacy_name': 'Carepoint', 'sort_by': sort_by,
+                                                          'page_size': 3})
+        while True:
+            body = response.json()
+            names.extend(mask['name'] for mask in body['results'])
+            if not body['next']:
+                return names
+            if between_pages:
+                between_pages()
+            response = self.client.get(body['next'])
+
+    def test_pages_cover_every_row_once(self):
+        for sort_by in ('name', 'price'):
+            with self.subTest(sort_by=sort_by):
+                unpaginated = self.client.get('/pharmacies/masks/', {'pharmacy_name': 'Carepoint', 'sort_by': sort_by})
+                self.assertEqual(self.pages(sort_by), [mask['name'] for mask in unpaginated.json()])
+
+    def test_cursor_is_stable_when_rows_are_inserted(self):
+        expected = sorted(Mask.objects.values_list('name', flat=True))
+
+        def insert_before_cursor():
+            Mask.objects.create(pharmacy=self.pharmacy, name=f'A {Mask.objects.count()}', price=Decimal('1.00'))
+
+        # 插入排在游標之前的資料，後續頁面不會重複或遺漏原有的資料
+        self.assertEqual(self.pages('name', between_pages=insert_before_cursor), expected)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/pharmacies/masks/', {'pharmacy_name': 'Carepoint', 'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class MaskCountPaginationTests(PhantomTestCase):
+    url = '/pharmacies/mask-count/'
+    params = {'comparison': 'less', 'count': 5, 'max_price': 100}
+
+    def setUp(self):
+        super().setUp()
+        Pharmacy.objects.bulk_create([
+            Pharmacy(name=f'Pharmacy {index}', cash_balance=Decimal('0.00'), opening_hours='') for index in range(7)
+        ])
+
+    def names(self, body):
+        return [pharmacy['name'] for pharmacy in body['results']]
+
+    def test_limit_is_an_alias_for_page_size(self):
+        body = self.client.get(self.url, {**self.params, 'limit': 3}).json()
+        self.assertEqual(self.names(body), ['Pharmacy 0', 'Pharmacy 1', 'Pharmacy 2'])
+        self.assertEqual(self.names(self.client.get(self.url, {**self.params, 'page_size': 3}).json()), self.names(body))
+
+        # 下一頁的網址保留 limit，頁面大小不變
+        body = self.client.get(body['next']).json()
+        self.assertEqual(self.names(body), ['Pharmacy 3', 'Pharmacy 4', 'Pharmacy 5'])
+
+    def test_offset_is_rejected(self):
+        for params in ({'limit': 3, 'offset': 3}, {'offset': 0}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, {**self.params, **params})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('offset', response.json()['error'])
+        self.assertEqual(self.client.get('/search/', {'search_term': 'pharmacy', 'offset': 10}).status_code, 400)
@@ -0,0 +1,122 @@
+import re
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+
+from phantom_app.models import (
+    DailyTransactionSummary, DailyUserTransactionSummary, PharmacyStats, PurchaseHistory, User,
+)
+
+from .base import PurchaseTestCase, total
+
+
+class PurchaseMaskTests(PurchaseTestCase):
+    def test_purchase_moves_balance_and_records_history(self):
+        response = self.purchase(quantity=2)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(str(response.json()['purchase_details']['total_price'])), Decimal('7.40'))
+
+        self.user.refresh_from_db()
+        self.pharmacy.refresh_from_db()
+        self.assertEqual(self.user.cash_balance, Decimal('42.60'))
+        self.assertEqual(self.pharmacy.cash_balance, Decimal('17.40'))
+        history = PurchaseHistory.objects.get()
+        self.assertEqual((history.quantity, history.transaction_amount), (2, Decimal('7.40')))
+
+        # 每日彙總與藥局統計隨購買一起更新
+        self.assertEqual(total(DailyTransactionSummary.objects.all(), 'total_amount'), Decimal('7.40'))
+        self.assertEqual(DailyUserTransactionSummary.objects.get().transaction_count, 1)
+        stats = PharmacyStats.objects.get(pharmacy=self.pharmacy)
+        self.assertEqual((stats.transaction_count, stats.revenue), (1, Decimal('7.40')))
+
+    def test_invalid_quantity_is_rejected(self):
+        for quantity in (0, -1, '2', 1.5, True):
+            with self.subTest(quantity=quantity):
+                self.assertEqual(self.purchase(quantity=quantity).status_code, 400)
+        self.assertUnchanged()
+
+    def test_unknown_names_are_not_found(self):
+        for field, error in (
+            ('user_name', 'User does not exist'),
+            ('pharmacy_name', 'Pharmacy does not exist'),
+            ('mask_name', 'Mask does not exist in the specified pharmacy'),
+        ):
+            with self.subTest(field=field):
+                data = {'user_name': self.user.name, 'pharmacy_name': self.pharmacy.name,
+                        'mask_name': 'True Barrier (green) (3 per pack)', 'quantity': 1, field: 'Unknown'}
+                response = self.client.post('/purchase-mask/', data, content_type='application/json')
+                self.assertEqual((response.status_code, response.json()), (404, {'error': error}))
+        self.assertUnchanged()
+
+    def test_insufficient_balance_is_rejected(self):
+        response = self.purchase(quantity=20)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Insufficient user balance'})
+        self.assertUnchanged()
+
+
+class BatchPurchaseMaskTests(PurchaseTestCase):
+    def test_batch_purchase_credits_each_pharmacy(self):
+        response = self.batch_purchase([
+            {'pharmacy_name': 'Carepoint', 'mask_name': 'True Barrier (green) (3 per pack)', 'quantity': 1},
+            {'pharmacy_name': 'Medlife', 'mask_name': 'MaskT (black) (10 per pack)', 'quantity': 2},
+        ])
+        self.assertEqual(response.status_code, 201)
+
+        self.user.refresh_from_db()
+        self.other_pharmacy.refresh_from_db()
+        self.assertEqual(self.user.cash_balance, Decimal('21.30'))
+        self.assertEqual(self.other_pharmacy.cash_balance, Decimal('25.00'))
+        self.assertEqual(PurchaseHistory.objects.count(), 2)
+        self.assertEqual(DailyUserTransactionSummary.objects.get().transaction_count, 2)
+
+    def test_batch_purchase_is_all_or_nothing(self):
+        response = self.batch_purchase([
+            {'pharmacy_name': 'Carepoint', 'mask_name': 'True Barrier (green) (3 per pack)', 'quantity': 1},
+            {'pharmacy_name': 'Carepoint', 'mask_name': 'Unknown Mask', 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 404)
+        self.assertUnchanged()
+
+        response = self.batch_purchase([
+            {'pharmacy_name': 'Carepoint', 'mask_name': 'True Barrier (green) (3 per pack)', 'quantity': 1},
+            {'pharmacy_name': 'Medlife', 'mask_name': 'MaskT (black) (10 per pack)', 'quantity': 4},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertUnchanged()
+
+    def test_invalid_items_are_rejected(self):
+        mask = {'pharmacy_name': 'Carepoint', 'mask_name': 'True Barrier (green) (3 per pack)', 'quantity': 1}
+        for items, error in (
+            ([], 'items must be a non-empty list'),
+            ('Carepoint', 'items must be a non-empty list'),
+            ([mask] * 101, 'At most 100 items can be purchased at once'),
+            ([{**mask, 'mask_name': ''}], 'Each item requires pharmacy_name and mask_name'),
+            ([{**mask, 'pharmacy_name': ['Carepoint']}], 'pharmacy_name and mask_name must be strings'),
+            ([{**mask, 'mask_name': {'name': 'x'}}], 'pharmacy_name and mask_name must be strings'),
+            ([{**mask, 'quantity': True}], 'Quantity must be a positive integer'),
+        ):
+            with self.subTest(items=str(items)[:60]):
+                response = self.batch_purchase(items)
+                self.assertEqual((response.status_code, response.json()), (400, {'error': error}))
+        self.assertUnchanged()
+
+
+class ConcurrentPurchaseTests(TransactionTestCase):
+    def load_test(self):
+        # loadtest_purchases 在餘額、購買紀錄或彙總不一致時以 CommandError 結束
+        out = StringIO()
+        call_command('loadtest_purchases', purchases=60, workers=8, users=3, pharmacies=2, stdout=out)
+        summary = re.search(r'(\d+) succeeded, \d+ rejected, (\d+) failed', out.getvalue())
+        succeeded, failed = map(int, summary.groups())
+        self.assertGreater(succeeded, 0)
+        # SQLite 的記憶體測試資料庫遇到並行寫入時直接回報鎖定錯誤而不等待，其他資料庫上每筆購買都應完成
+        if connection.vendor != 'sqlite':
+            self.assertEqual(failed, 0)
+        self.assertFalse(User.objects.exists())
+
+    def test_balances_are_conserved(self):
+        self.load_test()
@@ -0,0 +1,54 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+from phantom_app.models import Mask, Pharmacy
+from phantom_app.renderers import ORJSONRenderer, orjson
+
+from .base import PhantomTestCase
+
+
+@skipUnless(orjson, 'orjson is not installed')
+class ORJSONRendererTests(SimpleTestCase):
+    def test_output_matches_the_default_renderer(self):
+        data = [{'name': 'Carepoint ', 'amount': Decimal('1.50'), 'price': '3.70',
+                 'at': datetime(2021, 1, 4, 15, 18, 51, tzinfo=timezone.utc), 'stats': None}]
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_falls_back_for_integers_beyond_64_bits(self):
+        data = {'big': 2 ** 70, 'amount': Decimal('1.50'), 'names': ['Carepoint']}
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), {'big': 2 ** 70, 'amount': 1.5,
+                                                                    'names': ['Carepoint']})
+
+
+class MaskListTests(PhantomTestCase):
+    def setUp(self):
+        super().setUp()
+        pharmacy = Pharmacy.objects.create(name='Carepoint', cash_balance=Decimal('0.00'), opening_hours='')
+        Mask.objects.bulk_create([
+            Mask(pharmacy=pharmacy, name=name, price=Decimal(price))
+            for name, price in (('MaskT (green)', '12.50'), ('Cotton Kiss (blue)', '3.70'), ('Barrier (black)', '12.50'))
+        ])
+
+    def masks(self, **params):
+        response = self.client.get('/pharmacies/masks/', {'pharmacy_name': 'Carepoint', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prices_are_strings_with_two_decimals(self):
+        self.assertEqual(self.masks(sort_by='price'), [
+            {'name': 'Cotton Kiss (blue)', 'price': '3.70'},
+            {'name': 'MaskT (green)', 'price': '12.50'},
+            {'name': 'Barrier (black)', 'price': '12.50'},
+        ])
+
+    def test_pages_follow_the_sort_order(self):
+        for sort_by in ('name', 'price'):
+            with self.subTest(sort_by=sort_by):
+                body = self.masks(sort_by=sort_by, page_size=2)
+                rest = self.client.get(body['next']).json()
+                self.assertEqual(body['results'] + rest['results'], self.masks(sort_by=sort_by))
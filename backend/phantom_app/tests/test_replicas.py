@@ -0,0 +1,118 @@
+from unittest import mock
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase, override_settings
+
+from phantom_app.db_router import (
+    REPLICA_DB_ALIAS, PrimaryReplicaRouter, reset_read_database, set_read_database, use_primary,
+)
+from phantom_app.middleware import PRIMARY_STICKY_COOKIE
+from phantom_app.models import Pharmacy
+from phantom_app.search_index import search_index
+
+from .base import PurchaseTestCase
+
+
+class RecordingRouter(PrimaryReplicaRouter):
+    """記錄 PrimaryReplicaRouter 為每次讀取選擇的資料庫，實際查詢仍使用測試的主資料庫（測試時不一定設定了副本）。"""
+
+    def __init__(self):
+        self.reads = []
+
+    def db_for_read(self, model, **hints):
+        self.reads.append(super().db_for_read(model, **hints))
+        return DEFAULT_DB_ALIAS
+
+
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    router = PrimaryReplicaRouter()
+
+    def test_reads_follow_the_context(self):
+        self.assertEqual(self.router.db_for_read(Pharmacy), DEFAULT_DB_ALIAS)
+        token = set_read_database(REPLICA_DB_ALIAS)
+        try:
+            self.assertEqual(self.router.db_for_read(Pharmacy), REPLICA_DB_ALIAS)
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(Pharmacy), DEFAULT_DB_ALIAS)
+            self.assertEqual(self.router.db_for_read(Pharmacy), REPLICA_DB_ALIAS)
+            # 已由主資料庫讀出的物件，其關聯也從主資料庫讀取
+            pharmacy = Pharmacy(name='Carepoint')
+            pharmacy._state.db = DEFAULT_DB_ALIAS
+            self.assertEqual(self.router.db_for_read(Pharmacy, instance=pharmacy), DEFAULT_DB_ALIAS)
+        finally:
+            reset_read_database(token)
+        self.assertEqual(self.router.db_for_read(Pharmacy), DEFAULT_DB_ALIAS)
+
+    def test_writes_and_migrations_use_the_primary(self):
+        token = set_read_database(REPLICA_DB_ALIAS)
+        try:
+            self.assertEqual(self.router.db_for_write(Pharmacy), DEFAULT_DB_ALIAS)
+        finally:
+            reset_read_database(token)
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'phantom_app'))
+        self.assertFalse(self.router.allow_migrate(REPLICA_DB_ALIAS, 'phantom_app'))
+
+
+@override_settings(MIDDLEWARE=['phantom_app.middleware.ReplicaRoutingMiddleware', *settings.MIDDLEWARE],
+                   REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingMiddlewareTests(PurchaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.router = RecordingRouter()
+        routers = override_settings(DATABASE_ROUTERS=[self.router])
+        routers.enable()
+        self.addCleanup(routers.disable)
+
+    def masks(self):
+        self.router.reads.clear()
+        response = self.client.get('/pharmacies/masks/', {'pharmacy_name': self.pharmacy.name})
+        self.assertEqual(response.status_code, 200)
+        return set(self.router.reads)
+
+    def test_read_only_requests_use_the_replica(self):
+        self.assertEqual(self.masks(), {REPLICA_DB_ALIAS})
+        # 請求結束後還原，管理指令與其他程式仍讀取主資料庫
+        self.assertEqual(PrimaryReplicaRouter().db_for_read(Pharmacy), DEFAULT_DB_ALIAS)
+
+    def test_writes_read_the_primary_and_make_the_client_sticky(self):
+        self.router.reads.clear()
+        response = self.purchase()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(self.router.reads), {DEFAULT_DB_ALIAS})
+
+        cookie = response.cookies[PRIMARY_STICKY_COOKIE]
+        self.assertEqual((cookie['max-age'], bool(cookie['httponly'])), (5, True))
+        # 寫入後的讀取留在主資料庫，看得到自己剛完成的購買
+        self.assertEqual(self.masks(), {DEFAULT_DB_ALIAS})
+        self.client.cookies.pop(PRIMARY_STICKY_COOKIE)
+        self.assertEqual(self.masks(), {REPLICA_DB_ALIAS})
+
+    def test_rejected_writes_do_not_make_the_client_sticky(self):
+        response = self.purchase(quantity=100)
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(PRIMARY_STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.masks(), {REPLICA_DB_ALIAS})
+
+    @override_settings(SEARCH_BACKEND='index')
+    def test_in_process_indexes_are_built_from_the_primary(self):
+        # 索引依主資料庫的版本號失效，建立時若讀到落後的副本會一直沿用舊資料
+        search_index.invalidate()
+        build = search_index.build
+        reads = []
+
+        def recording_build():
+            start = len(self.router.reads)
+            snapshot = build()
+            reads.extend(self.router.reads[start:])
+            return snapshot
+
+        with mock.patch.object(search_index, 'build', side_effect=recording_build):
+            self.assertEqual(self.client.get('/search/', {'search_term': 'care'}).status_code, 200)
+        self.assertTrue(reads)
+        self.assertEqual(set(reads), {DEFAULT_DB_ALIAS})
+
+    async def test_async_requests_use_the_replica(self):
+        response = await self.async_client.get('/pharmacies/masks/', {'pharmacy_name': 'Carepoint'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(self.router.reads), {REPLICA_DB_ALIAS})
@@ -0,0 +1,53 @@
+from django.test import override_settings
+
+from .base import PurchaseTestCase
+
+
+@override_settings(RESPONSE_CACHE=True)
+class ResponseCacheTests(PurchaseTestCase):
+    url = '/transactions/total/'
+
+    def totals(self, **headers):
+        return self.client.get(self.url, {'start_date': '2000-01-01', 'end_date': '2999-12-31'}, headers=headers)
+
+    def test_not_modified_until_a_purchase(self):
+        response = self.totals()
+        self.assertEqual(response.json(), {'total_masks': 0, 'total_amount': 0})
+        etag = response['ETag']
+
+        self.assertEqual(self.totals(**{'If-None-Match': etag}).status_code, 304)
+
+        self.assertEqual(self.purchase(quantity=2).status_code, 201)
+        response = self.totals(**{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['total_masks'], 2)
+
+    def test_hits_do_not_query_the_database(self):
+        self.totals()
+        with self.assertNumQueries(0):
+            response = self.totals()
+        self.assertEqual(response.json(), {'total_masks': 0, 'total_amount': 0})
+
+    def test_equivalent_parameters_share_an_entry(self):
+        etag = self.totals()['ETag']
+        response = self.client.get(self.url, {'end_date': ' 2999-12-31', 'start_date': '2000-01-01 '},
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_errors_are_not_cached(self):
+        for _ in range(2):
+            response = self.client.get(self.url, {'start_date': '2000-01-01'})
+            self.assertEqual(response.status_code, 400)
+            self.assertNotIn('ETag', response)
+
+    def test_include_stats_is_invalidated_by_purchases(self):
+        url = '/search/'
+        params = {'search_term': 'care', 'include_stats': 'true'}
+        etag = self.client.get(url, params)['ETag']
+        plain = self.client.get(url, {'search_term': 'care'})['ETag']
+
+        self.assertEqual(self.purchase(quantity=1).status_code, 201)
+        # 購買只遞增交易版本號，未附上統計的搜尋結果仍然有效
+        self.assertEqual(self.client.get(url, {'search_term': 'care'}, headers={'If-None-Match': plain}).status_code, 304)
+        self.assertEqual(self.client.get(url, params, headers={'If-None-Match': etag}).status_code, 200)
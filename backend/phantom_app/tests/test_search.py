@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+from django.test import SimpleTestCase, override_settings
+
+from phantom_app.models import Mask, Pharmacy
+from phantom_app.search_index import Corpus, edit_distance, search_index
+
+from .base import PhantomTestCase
+
+
+def corpus(*names):
+    return Corpus((name, name) for name in names)
+
+
+def ranked(corpus, query, count=None):
+    return [document for _, document in corpus.search(query, count)]
+
+
+class CorpusTests(SimpleTestCase):
+    def test_exact_and_prefix_matches_rank_first(self):
+        names = corpus('Masquerade Mask', 'Mask', 'Mask Pro (blue)', 'Second Smile')
+        self.assertEqual(ranked(names, 'mask'), ['Mask', 'Mask Pro (blue)', 'Masquerade Mask'])
+
+    def test_rare_terms_outweigh_common_terms(self):
+        names = corpus('Cotton Mask', 'Paper Mask', 'Silk Mask', 'Cotton Paper')
+        # 「mask」出現在多數名稱中，idf 較低，只含罕見詞彙的名稱排在前面
+        self.assertEqual(ranked(names, 'silk mask')[0], 'Silk Mask')
+        self.assertEqual(ranked(names, 'cotton paper'), ['Cotton Paper'])
+
+    def test_shorter_names_rank_higher_for_the_same_term(self):
+        names = corpus('Premium Breathable Cotton Mask', 'Cotton Mask')
+        self.assertEqual(ranked(names, 'cotton'), ['Cotton Mask', 'Premium Breathable Cotton Mask'])
+
+    def test_typos_are_tolerated(self):
+        names = corpus('Masquerade (green)', 'Second Smile (black)', 'Cotton Kiss')
+        self.assertEqual(ranked(names, 'masqurade'), ['Masquerade (green)'])
+        self.assertEqual(ranked(names, 'secnod smile'), ['Second Smile (black)'])
+        self.assertEqual(ranked(names, 'zzzzzz'), [])
+
+    def test_multi_term_queries_prefer_names_matching_every_term(self):
+        names = corpus('Second Smile (black)', 'Second Smile (green)', 'MaskT (black)')
+        self.assertEqual(ranked(names, 'smile black'), ['Second Smile (black)'])
+        # 沒有名稱符合全部關鍵字時退回部分符合
+        self.assertEqual(ranked(names, 'black nothing'), ['MaskT (black)', 'Second Smile (black)'])
+
+    def test_pages_continue_after_the_last_key(self):
+        names = corpus(*(f'Mask {index}' for index in range(10)))
+        first = names.search('mask', 4)
+        rest = names.search('mask', None, first[-1][0])
+        self.assertEqual([document for _, document in first + rest], ranked(names, 'mask'))
+
+    def test_edit_distance_stops_at_the_limit(self):
+        self.assertEqual(edit_distance('smile', 'smlie', 2), 2)
+        self.assertEqual(edit_distance('smile', 'masquerade', 2), 3)
+
+
+class SearchEndpointTests(PhantomTestCase):
+    def setUp(self):
+        super().setUp()
+        search_index.invalidate()
+        carepoint = Pharmacy.objects.create(name='Carepoint', cash_balance=Decimal('0.00'), opening_hours='')
+        Pharmacy.objects.create(name='Health Care', cash_balance=Decimal('0.00'), opening_hours='')
+        Pharmacy.objects.create(name='Care', cash_balance=Decimal('0.00'), opening_hours='')
+        Mask.objects.bulk_create([
+            Mask(pharmacy=carepoint, name=name, price=Decimal('1.00'))
+            for name in ('Masquerade (green) (3 per pack)', 'Second Smile (black) (10 per pack)')
+        ])
+
+    def search(self, search_term, **params):
+        response = self.client.get('/search/', {'search_term': search_term, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_exact_matches_rank_before_prefix_and_substring_matches(self):
+        body = self.search('care')
+        self.assertEqual([pharmacy['name'] for pharmacy in body['pharmacies']], ['Care', 'Carepoint', 'Health Care'])
+        self.assertIsNone(body['masks'])
+
+    def test_masks_include_their_pharmacy(self):
+        body = self.search('second smile')
+        self.assertEqual([(mask['name'], mask['pharmacy']) for mask in body['masks']],
+                         [('Second Smile (black) (10 per pack)', 'Carepoint')])
+
+    def test_limit_sets_page_size(self):
+        pharmacy = Pharmacy.objects.get(name='Carepoint')
+        Mask.objects.bulk_create([Mask(pharmacy=pharmacy, name=f'Care Mask {index}', price=Decimal('1.00'))
+                                  for index in range(5)])
+
+        body = self.search('care', limit=2)
+        self.assertEqual(len(body['masks']), 2)
+        self.assertIsNotNone(body['masks_next'])
+        self.assertEqual(self.client.get('/search/', {'search_term': 'care', 'limit': 0}).status_code, 400)
+
+    def test_search_term_is_required(self):
+        self.assertEqual(self.client.get('/search/').status_code, 400)
+
+
+@override_settings(SEARCH_BACKEND='index')
+class SearchIndexEndpointTests(SearchEndpointTests):
+    # 繼承資料庫搜尋的所有測試，索引的排序須維持 完全相同 > 前綴 > 其他
+
+    def test_typos_are_tolerated(self):
+        body = self.search('masqurade')
+        self.assertEqual([mask['name'] for mask in body['masks']], ['Masquerade (green) (3 per pack)'])
+
+    def test_index_is_rebuilt_after_a_mask_is_renamed(self):
+        self.assertIsNone(self.search('cotton')['masks'])
+        mask = Mask.objects.get(name__startswith='Masquerade')
+        mask.name = 'Cotton Kiss (blue)'
+        mask.save()
+        self.assertEqual([mask['name'] for mask in self.search('cotton')['masks']], ['Cotton Kiss (blue)'])
@@ -0,0 +1,102 @@
+import json
+import tempfile
+
+from django.test import SimpleTestCase
+
+from phantom_app.management.commands.benchmark import import_dataset, percentile, summarize, write_dataset
+from phantom_app.models import Mask, Pharmacy, PurchaseHistory, User
+from phantom_app.opening_hours import parse_opening_hours
+from phantom_app.synthetic import generate_pharmacies, generate_users, load_pharmacies, load_users
+
+from .base import DATA_DIR, ImportTestCase
+
+
+def dataset(count=5, seed=0):
+    pharmacies = list(generate_pharmacies(count, seed=seed))
+    return pharmacies, list(generate_users(count, pharmacies, seed=seed))
+
+
+class GeneratorTests(SimpleTestCase):
+    def test_same_seed_generates_the_same_data(self):
+        self.assertEqual(dataset(seed=1), dataset(seed=1))
+        self.assertNotEqual(dataset(seed=1), dataset(seed=2))
+
+    def test_records_match_the_sample_data(self):
+        with open(DATA_DIR / 'pharmacies.json') as file:
+            sample_pharmacy = json.load(file)[0]
+        with open(DATA_DIR / 'users.json') as file:
+            sample_user = json.load(file)[0]
+
+        pharmacies, users = dataset(20)
+        for pharmacy in pharmacies:
+            self.assertEqual(pharmacy.keys(), sample_pharmacy.keys())
+            self.assertTrue(parse_opening_hours(pharmacy['openingHours']))
+            for mask in pharmacy['masks']:
+                self.assertEqual(mask.keys(), sample_pharmacy['masks'][0].keys())
+        for user in users:
+            self.assertEqual(user.keys(), sample_user.keys())
+            for history in user['purchaseHistories']:
+                self.assertEqual(history.keys(), sample_user['purchaseHistories'][0].keys())
+
+    def test_purchases_reference_generated_masks(self):
+        pharmacies, users = dataset(20)
+        catalogue = {(pharmacy['name'], mask['name']) for pharmacy in pharmacies for mask in pharmacy['masks']}
+        histories = [history for user in users for history in user['purchaseHistories']]
+        self.assertTrue(histories)
+        self.assertTrue({(history['pharmacyName'], history['maskName']) for history in histories} <= catalogue)
+
+    def test_start_continues_the_numbering(self):
+        self.assertEqual([pharmacy['name'] for pharmacy in generate_pharmacies(2, start=3)],
+                         ['Synthetic Pharmacy 0000003', 'Synthetic Pharmacy 0000004'])
+
+
+class SummaryTests(SimpleTestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 51)
+        self.assertEqual(percentile(values, 0.99), 100)
+        self.assertEqual(percentile(values, 1), 100)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_summarize(self):
+        samples = [(3.0, 1, 200), (1.0, 2, 200), (2.0, 3, 400)]
+        self.assertEqual(summarize(samples, 0.5), {
+            'requests': 3,
+            'throughput_rps': 6.0,
+            'p50_ms': 2.0,
+            'p95_ms': 3.0,
+            'p99_ms': 3.0,
+            'max_ms': 3.0,
+            'queries_mean': 2.0,
+            'queries_max': 3,
+            'status': {'200': 2, '400': 1},
+        })
+
+
+class SyntheticImportTests(ImportTestCase):
+    def test_written_dataset_imports_cleanly(self):
+        with tempfile.TemporaryDirectory() as directory:
+            pharmacies_path, users_path = write_dataset(2, 0, directory)
+            with open(pharmacies_path) as file:
+                pharmacies = json.load(file)
+            with open(users_path) as file:
+                users = json.load(file)
+            self.assertEqual((len(pharmacies), len(users)), (40, 40))
+
+            self.assertEqual(pharmacies, list(generate_pharmacies(40)))
+            import_dataset(pharmacies_path, users_path)
+
+        self.assertEqual(Pharmacy.objects.count(), 40)
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(PurchaseHistory.objects.count(), sum(len(user['purchaseHistories']) for user in users))
+        self.assertRollupsMatchHistories()
+
+    def test_loaders_write_masks_and_histories(self):
+        pharmacies, users = dataset(10)
+        load_pharmacies(pharmacies, batch_size=4)
+        load_users(users, batch_size=4)
+
+        self.assertEqual(Mask.objects.count(), sum(len(pharmacy['masks']) for pharmacy in pharmacies))
+        self.assertEqual(PurchaseHistory.objects.count(), sum(len(user['purchaseHistories']) for user in users))
+        history = PurchaseHistory.objects.select_related('mask').first()
+        self.assertEqual((history.pharmacy_id, history.mask_name), (history.mask.pharmacy_id, history.mask.name))
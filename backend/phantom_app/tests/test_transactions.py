@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.test import override_settings
+
+from phantom_app.models import DailyTransactionSummary, DailyUserTransactionSummary
+
+from .base import ImportTestCase, PurchaseTestCase, import_data
+
+RANGES = [('2021-01-01', '2021-01-31'), ('2021-01-20', '2021-01-26'), ('2021-01-04', '2021-01-04'),
+          ('2030-01-01', '2030-01-31')]
+
+
+def rounded(amount):
+    # SQLite 以浮點數計算 SUM，比較前先四捨五入到分
+    return Decimal(str(amount)).quantize(Decimal('0.01'))
+
+
+class TransactionRollupTests(ImportTestCase):
+    def setUp(self):
+        super().setUp()
+        import_data()
+
+    def top_users(self, top_x, start_date, end_date):
+        response = self.client.get('/users/top-transactions/',
+                                   {'top_x': top_x, 'start_date': start_date, 'end_date': end_date})
+        self.assertEqual(response.status_code, 200)
+        return [(user['name'], rounded(user['total_amount'])) for user in response.json()]
+
+    def totals(self, start_date, end_date):
+        response = self.client.get('/transactions/total/', {'start_date': start_date, 'end_date': end_date})
+        self.assertEqual(response.status_code, 200)
+        totals = response.json()
+        return totals['total_masks'], rounded(totals['total_amount'])
+
+    def test_rollups_match_the_raw_histories(self):
+        self.assertTrue(DailyUserTransactionSummary.objects.exists())
+        for start_date, end_date in RANGES:
+            with self.subTest(start_date=start_date, end_date=end_date):
+                top_users = self.top_users(5, start_date, end_date)
+                totals = self.totals(start_date, end_date)
+                with override_settings(TRANSACTION_ROLLUPS=False):
+                    self.assertEqual(self.top_users(5, start_date, end_date), top_users)
+                    self.assertEqual(self.totals(start_date, end_date), totals)
+
+    def test_top_users_are_sorted_by_amount(self):
+        amounts = [amount for name, amount in self.top_users(20, '2021-01-01', '2021-01-31')]
+        self.assertEqual(amounts, sorted(amounts, reverse=True))
+        self.assertEqual(len(self.top_users(3, '2021-01-01', '2021-01-31')), 3)
+
+    def test_totals_read_a_single_query(self):
+        with self.assertNumQueries(1):
+            self.totals('2021-01-01', '2021-01-31')
+
+    def test_invalid_top_x_is_rejected(self):
+        for top_x in ('three', '0', '-3'):
+            with self.subTest(top_x=top_x):
+                response = self.client.get('/users/top-transactions/',
+                                           {'top_x': top_x, 'start_date': '2021-01-01', 'end_date': '2021-01-31'})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': 'top_x must be a positive integer.'})
+
+
+class PurchaseRollupTests(PurchaseTestCase):
+    def test_purchase_updates_the_rollups(self):
+        self.assertEqual(self.purchase(quantity=2).status_code, 201)
+        self.assertEqual(self.purchase(quantity=1).status_code, 201)
+
+        summary = DailyTransactionSummary.objects.get()
+        self.assertEqual((summary.transaction_count, summary.mask_count, summary.total_amount),
+                         (2, 3, Decimal('11.10')))
+        user_summary = DailyUserTransactionSummary.objects.get()
+        self.assertEqual((user_summary.user_id, user_summary.total_amount), (self.user.id, Decimal('11.10')))
@@ -1,20 +1,21 @@
+from django.conf import settings
 from django.urls import path
-from .views import (
-    PharmacyByOpeningHoursAPIView,
-    MasksByPharmacyAPIView,
-    PharmaciesByMaskCountAPIView,
-    TopUsersByTransactionAPIView,
-    TotalMasksAndTransactionValueAPIView,
-    SearchAPIView,
-    PurchaseMaskAPIView
-)
+from . import async_views, views
+
+# ASYNC_VIEWS=True 時改用 async_views 中同名的非同步 view，需以 ASGI 伺服器（例如 uvicorn）執行
+api = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('pharmacies/opening-hours/', PharmacyByOpeningHoursAPIView.as_view(), name='pharmacies-by-opening-hours'),
-    path('pharmacies/masks/', MasksByPharmacyAPIView.as_view(), name='masks-by-pharmacy'),
-    path('pharmacies/mask-count/', PharmaciesByMaskCountAPIView.as_view(), name='pharmacies_by_mask_count'),
-    path('users/top-transactions/', TopUsersByTransactionAPIView.as_view(), name='top_transactions'),
-    path('transactions/total/', TotalMasksAndTransactionValueAPIView.as_view(), name='total-masks-and-transaction-value'),
-    path('search/', SearchAPIView.as_view(), name='search'),
-    path('purchase-mask/', PurchaseMaskAPIView.as_view(), name='purchase-mask'),
+    path('pharmacies/opening-hours/', api.PharmacyByOpeningHoursAPIView.as_view(), name='pharmacies-by-opening-hours'),
+    path('pharmacies/masks/', api.MasksByPharmacyAPIView.as_view(), name='masks-by-pharmacy'),
+    path('pharmacies/mask-count/', api.PharmaciesByMaskCountAPIView.as_view(), name='pharmacies_by_mask_count'),
+    path('users/top-transactions/', api.TopUsersByTransactionAPIView.as_view(), name='top_transactions'),
+    path('transactions/total/', api.TotalMasksAndTransactionValueAPIView.as_view(), name='total-masks-and-transaction-value'),
+    path('transactions/analytics/', api.TransactionAnalyticsAPIView.as_view(), name='transaction-analytics'),
+    path('transactions/export/', api.TransactionExportAPIView.as_view(), name='transaction-export'),
+    path('search/', api.SearchAPIView.as_view(), name='search'),
+    path('search/suggest/', api.SearchSuggestionAPIView.as_view(), name='search-suggest'),
+    path('purchase-mask/', api.PurchaseMaskAPIView.as_view(), name='purchase-mask'),
+    path('purchase-masks/', api.BatchPurchaseMaskAPIView.as_view(), name='batch-purchase-masks'),
+    path('metrics', views.MetricsAPIView.as_view(), name='metrics'),
 ]
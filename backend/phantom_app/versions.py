@@ -0,0 +1,90 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .db_router import use_primary
+
+# 各資料領域的版本號，寫入時遞增，讀取端據此判斷快取是否過期
+CATALOGUE = 'catalogue'
+OPENING_HOURS = 'opening_hours'
+TRANSACTIONS = 'transactions'
+# 購買紀錄被刪除（刪除用戶時串聯刪除）時遞增，可增量更新的快照據此判斷需要完整重建
+PURCHASE_DELETIONS = 'purchase_deletions'
+
+
+def _version_cache():
+    return caches[getattr(settings, 'VERSION_CACHE_ALIAS', 'default')]
+
+
+def _version_key(domain):
+    return f'phantom:version:{domain}'
+
+
+def get_version(domain):
+    cache = _version_cache()
+    key = _version_key(domain)
+    version = cache.get(key)
+    if version is None:
+        # 以時間作為初始值，快取被清除後不會與先前的版本號重複
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(domains):
+    return tuple(get_version(domain) for domain in domains)
+
+
+def bump_version(*domains):
+    cache = _version_cache()
+    for domain in domains:
+        key = _version_key(domain)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+class VersionedSnapshot:
+    """
+    行程內的唯讀快照，當 domains 的版本號改變或超過 ttl 秒時，於下一次讀取時重建。
+    子類別實作 build() 回傳快照內容；可增量更新的快照另外覆寫 refresh()。
+    """
+    domains = ()
+    ttl = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._versions = None
+        self._built_at = 0.0
+
+    def build(self):
+        raise NotImplementedError
+
+    def refresh(self, snapshot):
+        """由過期的快照產生新快照，預設為完整重建；不可修改傳入的快照，讀取端可能仍在使用。"""
+        return self.build()
+
+    def is_stale(self, versions):
+        if self._snapshot is None or versions != self._versions:
+            return True
+        return self.ttl is not None and time.monotonic() - self._built_at > self.ttl
+
+    def get(self):
+        versions = get_versions(self.domains)
+        if self.is_stale(versions):
+            with self._lock:
+                if self.is_stale(versions):
+                    # 快照記錄的版本號來自主資料庫的寫入，內容也須讀取主資料庫，不能由落後的副本建立
+                    with use_primary():
+                        self._snapshot = self.build() if self._snapshot is None else self.refresh(self._snapshot)
+                    self._versions = versions
+                    self._built_at = time.monotonic()
+        return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
@@ -1,62 +1,146 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Pharmacy, Mask, User, PurchaseHistory, OpeningHour
-import re
+from .models import Pharmacy, Mask, User, PurchaseHistory, DailyTransactionSummary, DailyUserTransactionSummary
+from .opening_hours import normalize_day
+from .opening_hours_index import open_pharmacies, opening_hours_index
+from .pagination import KeysetPagination, SearchPagination
+from .analytics import GROUP_BY_FIELDS, SORT_FIELDS, transaction_breakdown
+from .pharmacy_stats import with_stats
+from .exports import CONTENT_TYPES, EXPORT_FORMATS, export_lines, export_queryset
+from .search_index import MASK_ROW_KEY, PHARMACY_ROW_KEY, SEARCH_ORDERING, search_database, search_index
+from .autocomplete import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, suggestion_index
+from .response_cache import cached_response
+from .metrics import REGISTRY, render_metrics
+from .ledger import LEDGER_METRICS
+from .versions import CATALOGUE, OPENING_HOURS, TRANSACTIONS
+from .rollups import day_bounds
+from .purchases import InsufficientBalance, purchase_mask, purchase_masks
 from datetime import datetime
-from django.db.models import Sum, Case, When, IntegerField
-from django.utils import timezone
-from django.db import transaction
+from operator import itemgetter
+from django.db.models import Count, F, Q, Sum
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 
-class PharmacyByOpeningHoursAPIView(APIView):
-    def get(self, request):
+
+def include_stats(request):
+    # 藥局列表可選擇附上 PharmacyStats 的統計資料
+    return request.query_params.get('include_stats', '').lower() in ('true', '1')
+
+
+class ParameterError(Exception):
+    """請求參數錯誤，由 view 轉為 {"error": message} 回應。"""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class PhantomAPIView(APIView):
+    """
+    各 API 的共同基底：參數驗證寫在 parse()，驗證失敗時拋出 ParameterError。
+    同步與非同步（async_views）版本共用 parse() 與查詢的組成，只有執行查詢的方式不同。
+    replica_reads 為 True 的 view，設定副本資料庫時其 GET 請求改讀副本（見 ReplicaRoutingMiddleware）。
+    """
+    replica_reads = False
+
+    def handle_exception(self, exc):
+        if isinstance(exc, ParameterError):
+            return Response({'error': str(exc)}, status=exc.status_code)
+        return super().handle_exception(exc)
+
+
+def parse_date_range(request, required_message, format_message, order_message):
+    # 各交易 API 的日期範圍驗證相同，只有錯誤訊息不同
+    start_date = request.query_params.get('start_date')
+    end_date = request.query_params.get('end_date')
+
+    if not start_date or not end_date:
+        raise ParameterError(required_message)
+
+    try:
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+    except ValueError:
+        raise ParameterError(format_message)
+
+    if end_date < start_date:
+        raise ParameterError(order_message)
+    return start_date, end_date
+
+
+def reject_offset(request):
+    # 列表改為游標分頁後不再支援 offset，明確回傳錯誤而不是忽略參數回傳第一頁
+    if 'offset' in request.query_params:
+        raise ParameterError('offset is no longer supported; follow the next link or pass its cursor instead.')
+
+
+class PharmacyByOpeningHoursAPIView(PhantomAPIView):
+    replica_reads = True
+
+    def parse(self, request):
         weekday = request.query_params.get('weekday')
         time = request.query_params.get('time')
 
         if not weekday or not time:
-            return Response({'error': 'Weekday and time parameters are required.'}, status=status.HTTP_400_BAD_REQUEST)
+            raise ParameterError('Weekday and time parameters are required.')
 
         # 轉換時間使可運算
         try:
             query_time = datetime.strptime(time, '%H:%M').time()
         except ValueError:
-            return Response({'error': 'Invalid time format. Use HH:MM format.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        open_pharmacies = []
-
-        # 查詢開放時間符合要求的藥局
-        pharmacies = Pharmacy.objects.all()
-
-        for pharmacy in pharmacies:
-            # 查找所有符合要求的開放時間紀錄
-            opening_hours = OpeningHour.objects.filter(pharmacy=pharmacy, day_of_week=weekday)
-
-            for opening_hour in opening_hours:
-                if self.is_time_within_range(query_time, opening_hour.start_time, opening_hour.end_time):
-                    open_pharmacies.append({'name': pharmacy.name})
-                    break
+            raise ParameterError('Invalid time format. Use HH:MM format.')
 
-        return Response(open_pharmacies, status=status.HTTP_200_OK)
+        return normalize_day(weekday), query_time
 
-    def is_time_within_range(self, query_time, start_time, end_time):
-        # 檢查時間範圍
-        if start_time <= end_time:  # 不跨日
-            return start_time <= query_time <= end_time
-        else:  # 跨日
-            return query_time >= start_time or query_time <= end_time
-
-class MasksByPharmacyAPIView(APIView):
-
-    def get(self, request, *args, **kwargs):
+    @cached_response(CATALOGUE, OPENING_HOURS, param_domains={'include_stats': (TRANSACTIONS,)})
+    def get(self, request):
+        weekday, query_time = self.parse(request)
+        # 藥局名稱唯一，直接以名稱作為分頁的排序鍵
+        paginator = KeysetPagination(ordering=('name',))
+        if settings.OPENING_HOURS_INDEX:
+            pharmacies = opening_hours_index.open_at(weekday, query_time)
+            page = paginator.paginate_list(pharmacies, request)
+        else:
+            pharmacies = open_pharmacies(weekday, query_time)
+            page = paginator.paginate_queryset(pharmacies, request)
+        if page is not None:
+            return paginator.get_paginated_response(with_stats(page) if include_stats(request) else page)
+
+        pharmacies = list(pharmacies)
+        return Response(with_stats(pharmacies) if include_stats(request) else pharmacies, status=status.HTTP_200_OK)
+
+class MasksByPharmacyAPIView(PhantomAPIView):
+    replica_reads = True
+
+    def parse(self, request):
         pharmacy_name = request.query_params.get('pharmacy_name')
         sort_by = request.query_params.get('sort_by', 'name')  # 默認按名稱排序
 
         if not pharmacy_name:
-            return Response({'error': 'Pharmacy name is required.'}, status=status.HTTP_400_BAD_REQUEST)
+            raise ParameterError('Pharmacy name is required.')
 
         # 確保輸入是 name 或者是 price
         if sort_by not in ['name', 'price']:
-            return Response({'error': 'Invalid sort_by parameter. Use "name" or "price".'}, status=status.HTTP_400_BAD_REQUEST)
+            raise ParameterError('Invalid sort_by parameter. Use "name" or "price".')
+
+        return pharmacy_name, sort_by
+
+    def masks(self, pharmacy, sort_by):
+        # 查詢該藥局的口罩並按name或是price排序，同名或同價時以 id 排序
+        # 以 values_list() 只取需要的欄位，不建立模型實例或中間的 dict
+        return Mask.objects.filter(pharmacy=pharmacy).order_by(sort_by, 'id').values_list('name', 'price', 'id')
+
+    def paginator(self, sort_by):
+        return KeysetPagination(ordering=(sort_by, 'id'), row_key=itemgetter(0 if sort_by == 'name' else 1, 2))
+
+    def mask_list(self, masks):
+        # 組織回應數據；價格依文件以字串回傳，保留兩位小數
+        return [{'name': name, 'price': str(price)} for name, price, _ in masks]
+
+    @cached_response(CATALOGUE)
+    def get(self, request, *args, **kwargs):
+        pharmacy_name, sort_by = self.parse(request)
 
         # 找尋藥局名稱
         pharmacy = Pharmacy.objects.filter(name=pharmacy_name).first()
@@ -64,220 +148,446 @@ class MasksByPharmacyAPIView(APIView):
         if not pharmacy:
             return Response({'error': 'Pharmacy not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        # 查詢該藥局的口罩並按name或是price排序
-        masks = Mask.objects.filter(pharmacy=pharmacy).order_by(sort_by)
-
-        # 組織回應數據
-        mask_list = [
-            {
-                'name': mask.name,
-                'price': str(mask.price), 
-            }
-            for mask in masks
-        ]
+        masks = self.masks(pharmacy, sort_by)
+        paginator = self.paginator(sort_by)
+        page = paginator.paginate_queryset(masks, request)
 
+        mask_list = self.mask_list(masks if page is None else page)
+        if page is not None:
+            return paginator.get_paginated_response(mask_list)
         return Response(mask_list, status=status.HTTP_200_OK)
     
-class PharmaciesByMaskCountAPIView(APIView):
-    def get(self, request):
+class PharmaciesByMaskCountAPIView(PhantomAPIView):
+    replica_reads = True
+
+    def parse(self, request):
         comparison = request.query_params.get('comparison')  # 'more' or 'less'
         count = request.query_params.get('count')
         min_price = request.query_params.get('min_price', 0)  # 默認為 0
         max_price = request.query_params.get('max_price') # require
 
         if not count or not comparison or not max_price:
-            return Response({'error': 'Comparison, count, and max_price parameters are required.'}, status=status.HTTP_400_BAD_REQUEST)
+            raise ParameterError('Comparison, count, and max_price parameters are required.')
 
         if comparison not in ['more', 'less']:
-            return Response({'error': 'Comparison must be either "more" or "less".'}, status=status.HTTP_400_BAD_REQUEST)
+            raise ParameterError('Comparison must be either "more" or "less".')
 
+        reject_offset(request)
         try:
-            count = int(count)
-            min_price = float(min_price)
-            max_price = float(max_price)
+            return comparison, int(count), float(min_price), float(max_price)
         except ValueError:
-            return Response({'error': 'Count must be an integer, and min_price and max_price must be floats.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        pharmacies = Pharmacy.objects.all()
-        matching_pharmacies = []
+            raise ParameterError('Count must be an integer, and min_price and max_price must be floats.')
+
+    def pharmacies(self, comparison, count, min_price, max_price):
+        # 以單一 GROUP BY 查詢計算價格區間內的口罩數量，沒有符合口罩的藥局數量為 0
+        pharmacies = Pharmacy.objects.annotate(
+            mask_count=Count('masks', filter=Q(masks__price__gte=min_price, masks__price__lte=max_price))
+        )
+        if comparison == 'more':
+            pharmacies = pharmacies.filter(mask_count__gte=count)
+        else:
+            pharmacies = pharmacies.filter(mask_count__lte=count)
+        return pharmacies.order_by('name').values('name', 'mask_count')
+
+    def paginator(self):
+        # 舊版 limit/offset 分頁的 limit 沿用為 page_size；offset 無法對應到游標，由 parse 拒絕
+        return KeysetPagination(ordering=('name',), page_size_aliases=('limit',))
+
+    @cached_response(CATALOGUE, param_domains={'include_stats': (TRANSACTIONS,)})
+    def get(self, request):
+        matching_pharmacies = self.pharmacies(*self.parse(request))
 
-        for pharmacy in pharmacies:
-            mask_count = pharmacy.masks.filter(price__gte=min_price, price__lte=max_price).count()
-            if (comparison == 'more' and mask_count >= count) or (comparison == 'less' and mask_count <= count):
-                matching_pharmacies.append({'name': pharmacy.name, 'mask_count': mask_count})
+        paginator = self.paginator()
+        page = paginator.paginate_queryset(matching_pharmacies, request)
+        if page is not None:
+            return paginator.get_paginated_response(with_stats(page) if include_stats(request) else page)
 
-        return Response(matching_pharmacies, status=status.HTTP_200_OK)
+        matching_pharmacies = list(matching_pharmacies)
+        return Response(
+            with_stats(matching_pharmacies) if include_stats(request) else matching_pharmacies, status=status.HTTP_200_OK
+        )
     
-class TopUsersByTransactionAPIView(APIView):
-    def get(self, request):
+class TopUsersByTransactionAPIView(PhantomAPIView):
+    replica_reads = True
+
+    def parse(self, request):
         top_x = request.query_params.get('top_x')
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
 
         # 驗證必要參數
         if not top_x or not start_date or not end_date:
-            return Response({'error': 'top_x, start_date, and end_date parameters are required.'}, status=status.HTTP_400_BAD_REQUEST)
+            raise ParameterError('top_x, start_date, and end_date parameters are required.')
 
-        # 確保 top_x 為整數
+        # 確保 top_x 為正整數，負數切片會讓查詢失敗
         try:
             top_x = int(top_x)
         except ValueError:
-            return Response({'error': 'top_x must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 驗證日期格式
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-        except ValueError:
-            return Response({'error': 'start_date and end_date must be in YYYY-MM-DD format.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 確保 end_date 不早於 start_date
-        if end_date < start_date:
-            return Response({'error': 'end_date cannot be before start_date.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 查詢 top_x 用戶，按交易總金額排序
-        top_users = User.objects.filter(
-            purchase_histories__transaction_date__range=[start_date, end_date]
-        ).annotate(total_amount=Sum('purchase_histories__transaction_amount')).order_by('-total_amount')[:top_x]
-
+            top_x = 0
+        if top_x <= 0:
+            raise ParameterError('top_x must be a positive integer.')
+
+        # 驗證日期格式，並確保 end_date 不早於 start_date
+        start_date, end_date = parse_date_range(
+            request,
+            'top_x, start_date, and end_date parameters are required.',
+            'start_date and end_date must be in YYYY-MM-DD format.',
+            'end_date cannot be before start_date.',
+        )
+        return top_x, start_date, end_date
+
+    def top_users(self, start_date, end_date):
+        # 查詢 top_x 用戶，按交易總金額排序；預設讀取每日彙總表，關閉時改掃描有日期索引的原始紀錄
+        if settings.TRANSACTION_ROLLUPS:
+            top_users = DailyUserTransactionSummary.objects.filter(date__range=[start_date, end_date])
+            amount_field = 'total_amount'
+        else:
+            start, end = day_bounds(start_date, end_date)
+            top_users = PurchaseHistory.objects.filter(transacted_at__gte=start, transacted_at__lt=end)
+            amount_field = 'transaction_amount'
+
+        return top_users.values('user_id').annotate(
+            name=F('user__name'), total_amount=Sum(amount_field)
+        ).order_by('-total_amount', 'user_id')
+
+    def user_data(self, users):
         # 構建返回資料
-        user_data = [
+        return [
             {
-                'name': user.name,
-                'total_amount': user.total_amount
+                'name': user['name'],
+                'total_amount': user['total_amount']
             }
-            for user in top_users
+            for user in users
         ]
 
+    @cached_response(TRANSACTIONS)
+    def get(self, request):
+        top_x, start_date, end_date = self.parse(request)
+        top_users = self.top_users(start_date, end_date)
+
+        # 分頁時以 (total_amount, user_id) 作為游標，所有頁面合計最多 top_x 筆
+        paginator = KeysetPagination(ordering=('-total_amount', 'user_id'))
+        page = paginator.paginate_queryset(top_users, request, total=top_x)
+
+        user_data = self.user_data(top_users[:top_x] if page is None else page)
+        if page is not None:
+            return paginator.get_paginated_response(user_data)
         return Response(user_data, status=status.HTTP_200_OK)
 
     
 
-class TotalMasksAndTransactionValueAPIView(APIView):
+class TotalMasksAndTransactionValueAPIView(PhantomAPIView):
+    replica_reads = True
+
+    def parse(self, request):
+        # 確保日期格式正確
+        return parse_date_range(
+            request,
+            'start_date and end_date parameters are required.',
+            'Invalid date format. Use YYYY-MM-DD.',
+            'Start date must be before or equal to end date.',
+        )
+
+    def totals(self, start_date, end_date):
+        """回傳 (queryset, aggregate 的參數)，總面罩數量和交易總額以單一查詢同時取得。"""
+        if settings.TRANSACTION_ROLLUPS:
+            return DailyTransactionSummary.objects.filter(date__range=[start_date, end_date]), {
+                'total_masks': Sum('mask_count'), 'total_amount': Sum('total_amount'),
+            }
+        start, end = day_bounds(start_date, end_date)
+        return PurchaseHistory.objects.filter(transacted_at__gte=start, transacted_at__lt=end), {
+            'total_masks': Sum('quantity'), 'total_amount': Sum('transaction_amount'),
+        }
+
+    def totals_response(self, totals):
+        return Response({
+            'total_masks': totals['total_masks'] or 0,  # 總面罩數量（購買數量加總）
+            'total_amount': totals['total_amount'] or 0  # 如果沒有記錄，設置為 0
+        }, status=status.HTTP_200_OK)
+
+    @cached_response(TRANSACTIONS)
     def get(self, request):
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
+        queryset, aggregates = self.totals(*self.parse(request))
+        return self.totals_response(queryset.aggregate(**aggregates))
 
-        if not start_date or not end_date:
-            return Response({'error': 'start_date and end_date parameters are required.'}, status=status.HTTP_400_BAD_REQUEST)
+class TransactionAnalyticsAPIView(PhantomAPIView):
+    replica_reads = True
 
-        # 確保日期格式正確
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d')
-            end_date = datetime.strptime(end_date, '%Y-%m-%d')
-        except ValueError:
-            return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+    def parse(self, request):
+        group_by = request.query_params.get('group_by')
+        sort_by = request.query_params.get('sort_by', 'total_amount')
+        top_x = request.query_params.get('top_x')
+        required_message = 'start_date, end_date and group_by parameters are required.'
 
-        if start_date > end_date:
-            return Response({'error': 'Start date must be before or equal to end date.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not request.query_params.get('start_date') or not request.query_params.get('end_date') or not group_by:
+            raise ParameterError(required_message)
 
-        # 計算總面罩數量和交易總額
-        total_masks = PurchaseHistory.objects.filter(
-            transaction_date__range=[start_date, end_date]
-        ).count()  # 總面罩數量（記錄數量）
+        if group_by not in GROUP_BY_FIELDS:
+            raise ParameterError(f'group_by must be one of: {", ".join(GROUP_BY_FIELDS)}.')
 
-        total_amount = PurchaseHistory.objects.filter(
-            transaction_date__range=[start_date, end_date]
-        ).aggregate(total_amount=Sum('transaction_amount'))['total_amount']  # 總交易金額
+        if sort_by not in SORT_FIELDS:
+            raise ParameterError(f'sort_by must be one of: {", ".join(SORT_FIELDS)}.')
 
-        if total_amount is None:
-            total_amount = 0  # 如果沒有記錄，設置為 0
+        if top_x is not None:
+            try:
+                top_x = int(top_x)
+            except ValueError:
+                top_x = 0
+            if top_x <= 0:
+                raise ParameterError('top_x must be a positive integer.')
 
-        return Response({
-            'total_masks': total_masks,
-            'total_amount': total_amount
-        }, status=status.HTTP_200_OK)
+        start_date, end_date = parse_date_range(
+            request,
+            required_message,
+            'start_date and end_date must be in YYYY-MM-DD format.',
+            'end_date cannot be before start_date.',
+        )
+        return start_date, end_date, group_by, sort_by, top_x
 
-class SearchAPIView(APIView):
+    def analytics_response(self, group_by, sort_by, results):
+        return Response({'group_by': group_by, 'sort_by': sort_by, 'results': results}, status=status.HTTP_200_OK)
+
+    @cached_response(TRANSACTIONS)
     def get(self, request):
+        start_date, end_date, group_by, sort_by, top_x = self.parse(request)
+        # 依藥局、口罩、使用者或每週的小時分組加總，ANALYTICS_BACKEND=columnar 時由記憶體內的欄式快照計算
+        results = transaction_breakdown(start_date, end_date, group_by, sort_by, top_x)
+        return self.analytics_response(group_by, sort_by, results)
+
+class TransactionExportAPIView(PhantomAPIView):
+    replica_reads = True
+
+    def parse(self, request):
+        start_date, end_date = parse_date_range(
+            request,
+            'start_date and end_date parameters are required.',
+            'Invalid date format. Use YYYY-MM-DD.',
+            'Start date must be before or equal to end date.',
+        )
+        file_format = request.query_params.get('file_format', 'ndjson')
+        if file_format not in EXPORT_FORMATS:
+            raise ParameterError('file_format must be either "ndjson" or "csv".')
+        return start_date, end_date, file_format, request.query_params.get('user_name'), request.query_params.get('pharmacy_name')
+
+    def pharmacy_id(self, pharmacy_name):
+        return Pharmacy.objects.filter(name=pharmacy_name).values_list('id', flat=True)
+
+    def export_response(self, lines, start_date, end_date, file_format):
+        response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = (
+            f'attachment; filename="transactions_{start_date}_{end_date}.{file_format}"'
+        )
+        return response
+
+    def get(self, request):
+        start_date, end_date, file_format, user_name, pharmacy_name = self.parse(request)
+
+        pharmacy_id = None
+        if pharmacy_name:
+            pharmacy_id = self.pharmacy_id(pharmacy_name).first()
+            if pharmacy_id is None:
+                return Response({'error': 'Pharmacy not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        # 逐批查詢並逐行輸出，匯出大量資料時記憶體用量固定，且第一批查完即開始傳送
+        histories = export_queryset(start_date, end_date, user_name=user_name, pharmacy_id=pharmacy_id)
+        return self.export_response(export_lines(histories, file_format), start_date, end_date, file_format)
+
+class SearchAPIView(PhantomAPIView):
+    replica_reads = True
+
+    def parse(self, request):
         search_term = request.query_params.get('search_term', '')
+        limit = request.query_params.get('limit')
 
         if not search_term:
-            return Response({'error': 'search_term parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 查詢藥局和口罩，並按關聯性排序
-        pharmacies = Pharmacy.objects.filter(name__icontains=search_term).annotate(
-            relevance=Case(
-                When(name__istartswith=search_term, then=2),
-                When(name__iexact=search_term, then=1),
-                default=0,
-                output_field=IntegerField(),
-            )
-        ).order_by('-relevance', 'name')
-
-        masks = Mask.objects.filter(name__icontains=search_term).annotate(
-            relevance=Case(
-                When(name__istartswith=search_term, then=2),
-                When(name__iexact=search_term, then=1),
-                default=0,
-                output_field=IntegerField(),
-            )
-        ).order_by('-relevance', 'name')
-
+            raise ParameterError('search_term parameter is required.')
+        reject_offset(request)
+
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise ParameterError('limit must be an integer.')
+            if limit < 1:
+                raise ParameterError('limit must be a positive integer.')
+        return search_term, limit
+
+    def search_pages(self, limit):
+        # 藥局與口罩兩組結果各自以游標分頁，limit 為每組每頁的筆數
+        return (
+            SearchPagination(SEARCH_ORDERING, cursor_query_param='pharmacies_cursor', page_size=limit,
+                             row_key=PHARMACY_ROW_KEY),
+            SearchPagination(SEARCH_ORDERING, cursor_query_param='masks_cursor', page_size=limit, row_key=MASK_ROW_KEY),
+        )
+
+    def search_index(self, request, search_term, pharmacy_pages, mask_pages):
+        pharmacies_after = pharmacy_pages.prepare(request)
+        masks_after = mask_pages.prepare(request)
+        ranked_pharmacies, ranked_masks = search_index.search(
+            search_term, pharmacy_pages.page_size + 1, pharmacies_after, masks_after
+        )
+        pharmacies = [document for _, document in pharmacy_pages.page(ranked_pharmacies, itemgetter(0))]
+        masks = [document for _, document in mask_pages.page(ranked_masks, itemgetter(0))]
+        return pharmacies, masks
+
+    def search_results(self, pharmacy_rows, mask_rows):
+        pharmacies = [{'id': pk, 'name': name} for pk, name, _ in pharmacy_rows]
+        masks = [{'id': pk, 'name': name, 'pharmacy': pharmacy_name} for pk, name, pharmacy_name, _ in mask_rows]
+        return pharmacies, masks
+
+    def search_response(self, pharmacies, masks, pharmacy_pages, mask_pages):
         results = {
-            'pharmacies': [{'id': pharmacy.id, 'name': pharmacy.name} for pharmacy in pharmacies] if pharmacies.exists() else None,
-            'masks': [{'id': mask.id, 'name': mask.name, 'pharmacy': mask.pharmacy.name} for mask in masks] if masks.exists() else None
+            'pharmacies': pharmacies or None,
+            'masks': masks or None,
+            'pharmacies_next': pharmacy_pages.get_next_link(),
+            'masks_next': mask_pages.get_next_link(),
         }
 
         return Response(results, status=status.HTTP_200_OK)
 
-class PurchaseMaskAPIView(APIView):
-    def post(self, request, *args, **kwargs):
+    @cached_response(CATALOGUE, param_domains={'include_stats': (TRANSACTIONS,)})
+    def get(self, request):
+        search_term, limit = self.parse(request)
+
+        # 查詢藥局和口罩，並按關聯性排序；兩組結果各自以游標分頁
+        pharmacy_pages, mask_pages = self.search_pages(limit)
+        if settings.SEARCH_BACKEND == 'index':
+            pharmacies, masks = self.search_index(request, search_term, pharmacy_pages, mask_pages)
+        else:
+            pharmacy_rows, mask_rows = search_database(search_term)
+            pharmacies, masks = self.search_results(
+                pharmacy_pages.paginate_queryset(pharmacy_rows, request),
+                mask_pages.paginate_queryset(mask_rows, request),
+            )
+
+        if include_stats(request):
+            pharmacies = with_stats(pharmacies)
+        return self.search_response(pharmacies, masks, pharmacy_pages, mask_pages)
+
+class SearchSuggestionAPIView(PhantomAPIView):
+    replica_reads = True
+
+    def parse(self, request):
+        search_term = request.query_params.get('search_term', '')
+        limit = request.query_params.get('limit', DEFAULT_SUGGESTIONS)
+
+        if not search_term:
+            raise ParameterError('search_term parameter is required.')
+
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ParameterError('limit must be an integer.')
+        if limit < 1:
+            raise ParameterError('limit must be a positive integer.')
+        return search_term, min(limit, MAX_SUGGESTIONS)
+
+    def get(self, request):
+        # 每次按鍵都會呼叫，只查詢記憶體內的前綴索引，不存取資料庫
+        suggestions = suggestion_index.suggest(*self.parse(request))
+
+        return Response({'suggestions': suggestions}, status=status.HTTP_200_OK)
+
+class PurchaseMaskAPIView(PhantomAPIView):
+    def parse(self, request):
         user_name = request.data.get('user_name')
         pharmacy_name = request.data.get('pharmacy_name')
         mask_name = request.data.get('mask_name')
         quantity = request.data.get('quantity', 0)  # 默認0個
 
         # 驗證 quantity 是否為正整數
-        if not isinstance(quantity, int) or quantity <= 0:
-            return Response({"error": "Quantity must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+            raise ParameterError("Quantity must be a positive integer")
+        return user_name, pharmacy_name, mask_name, quantity
 
-        try:
-            # 根據名稱找用戶、藥局和口罩
-            user = User.objects.get(name=user_name)
-            pharmacy = Pharmacy.objects.get(name=pharmacy_name)
-            mask = Mask.objects.get(pharmacy=pharmacy, name=mask_name)
-
-            total_price = mask.price * quantity
-
-            if user.cash_balance < total_price:
-                return Response({"error": "Insufficient user balance"}, status=status.HTTP_400_BAD_REQUEST)
-
-            with transaction.atomic():
-                # 更新用戶餘額
-                user.cash_balance -= total_price
-                user.save()
-
-                # 更新藥局現金餘額
-                pharmacy.cash_balance += total_price
-                pharmacy.save()
-
-                # 更新購買歷史
-                purchase_history = PurchaseHistory.objects.create(
-                    user=user,
-                    pharmacy_name=pharmacy.name,
-                    mask_name=mask.name,
-                    transaction_amount=total_price,
-                    transaction_date=timezone.now().date(),  # 只取日期部分
-                    transaction_time=timezone.now().time(),  # 只取時間部分
-                )
-
-            return Response({
-                "message": "Purchase successful",
-                "purchase_details": {
-                    "user": user.name,
-                    "pharmacy": pharmacy.name,
-                    "mask": mask.name,
-                    "quantity": quantity,
-                    "total_price": total_price
-                }
-            }, status=status.HTTP_201_CREATED)
-
-        except User.DoesNotExist:
+    def purchase_response(self, user, line):
+        return Response({
+            "message": "Purchase successful",
+            "purchase_details": {
+                "user": user.name,
+                "pharmacy": line['pharmacy'],
+                "mask": line['mask'],
+                "quantity": line['quantity'],
+                "total_price": line['total_price']
+            }
+        }, status=status.HTTP_201_CREATED)
+
+    def error_response(self, error):
+        if isinstance(error, InsufficientBalance):
+            return Response({"error": "Insufficient user balance"}, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(error, User.DoesNotExist):
             return Response({"error": "User does not exist"}, status=status.HTTP_404_NOT_FOUND)
-        except Pharmacy.DoesNotExist:
+        if isinstance(error, Pharmacy.DoesNotExist):
             return Response({"error": "Pharmacy does not exist"}, status=status.HTTP_404_NOT_FOUND)
-        except Mask.DoesNotExist:
+        if isinstance(error, Mask.DoesNotExist):
             return Response({"error": "Mask does not exist in the specified pharmacy"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"error": str(error)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def post(self, request, *args, **kwargs):
+        arguments = self.parse(request)
+        try:
+            user, line = purchase_mask(*arguments)
         except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return self.error_response(e)
+        return self.purchase_response(user, line)
+
+
+class BatchPurchaseMaskAPIView(PhantomAPIView):
+    max_items = 100
+
+    def parse(self, request):
+        user_name = request.data.get('user_name')
+        items = request.data.get('items')
+
+        if not isinstance(items, list) or not items:
+            raise ParameterError("items must be a non-empty list")
+
+        if len(items) > self.max_items:
+            raise ParameterError(f"At most {self.max_items} items can be purchased at once")
+
+        # 驗證每一筆項目的格式與 quantity 是否為正整數
+        for item in items:
+            if not isinstance(item, dict) or not item.get('pharmacy_name') or not item.get('mask_name'):
+                raise ParameterError("Each item requires pharmacy_name and mask_name")
+            # 名稱會作為查詢條件與集合的鍵，非字串（例如陣列）直接回傳 400
+            if not isinstance(item['pharmacy_name'], str) or not isinstance(item['mask_name'], str):
+                raise ParameterError("pharmacy_name and mask_name must be strings")
+            quantity = item.get('quantity', 0)
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+                raise ParameterError("Quantity must be a positive integer")
+        return user_name, items
+
+    def purchase_response(self, user, lines, total_price):
+        return Response({
+            "message": "Purchase successful",
+            "purchase_details": {
+                "user": user.name,
+                "items": lines,
+                "total_price": total_price
+            }
+        }, status=status.HTTP_201_CREATED)
+
+    def error_response(self, error):
+        if isinstance(error, InsufficientBalance):
+            return Response({"error": "Insufficient user balance"}, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(error, User.DoesNotExist):
+            return Response({"error": "User does not exist"}, status=status.HTTP_404_NOT_FOUND)
+        if isinstance(error, (Pharmacy.DoesNotExist, Mask.DoesNotExist)):
+            return Response({"error": str(error)}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"error": str(error)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def post(self, request, *args, **kwargs):
+        arguments = self.parse(request)
+        try:
+            user, lines, total_price = purchase_masks(*arguments)
+        except Exception as e:
+            return self.error_response(e)
+        return self.purchase_response(user, lines, total_price)
+
+class MetricsAPIView(APIView):
+    # Prometheus 文字格式，只包含目前行程累計的數值
+    def get(self, request):
+        if not settings.REQUEST_METRICS:
+            return Response({'error': 'Request metrics are disabled.'}, status=status.HTTP_404_NOT_FOUND)
+        registry = REGISTRY + LEDGER_METRICS if settings.PURCHASE_LEDGER else REGISTRY
+        return HttpResponse(render_metrics(registry), content_type='text/plain; version=0.0.4; charset=utf-8')
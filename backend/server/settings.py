@@ -72,6 +72,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'server.wsgi.application'
+ASGI_APPLICATION = 'server.asgi.application'
 
 
 # Database
@@ -85,9 +86,104 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # 每個 worker 執行緒保留連線供後續請求重用，重用前先檢查連線是否仍可用；
+        # ASGI 下每個請求在新的執行緒執行，連線無法重用，請設為 0
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
+# 唯讀副本（選用）：設定 DB_REPLICA_HOST 或 DB_REPLICA_NAME 後，唯讀 API 改讀副本，購買與匯入仍使用主資料庫；
+# 未設定的連線參數沿用主資料庫，測試時以主資料庫為鏡像
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        **{
+            key: os.getenv(f'DB_REPLICA_{key}') or DATABASES['default'][key]
+            for key in ('NAME', 'USER', 'PASSWORD', 'HOST', 'PORT')
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['phantom_app.db_router.PrimaryReplicaRouter']
+    MIDDLEWARE.insert(0, 'phantom_app.middleware.ReplicaRoutingMiddleware')
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+
+# Cache
+# 版本號與快取預設存放在行程內；多個 worker 或匯入指令需共用失效通知時，請改用檔案或 Redis 等共享後端
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# GET API 的回應快取（選用），以版本號失效；LocMem 與檔案後端依 MAX_ENTRIES 淘汰，Redis 依其 maxmemory-policy
+RESPONSE_CACHE = os.getenv('RESPONSE_CACHE', 'False') == 'True'
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+RESPONSE_CACHE_MAX_ENTRY_SIZE = int(os.getenv('RESPONSE_CACHE_MAX_ENTRY_SIZE', str(1024 * 1024)))
+
+CACHES[RESPONSE_CACHE_ALIAS] = {
+    'BACKEND': RESPONSE_CACHE_BACKEND,
+    'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'phantom-responses'),
+    'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300')),
+}
+if 'redis' not in RESPONSE_CACHE_BACKEND:
+    CACHES[RESPONSE_CACHE_ALIAS]['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000'))}
+
+# 開放時間查詢改由行程內索引回答（選用），TTL 秒數為版本號無法跨行程同步時的保底
+OPENING_HOURS_INDEX = os.getenv('OPENING_HOURS_INDEX', 'False') == 'True'
+OPENING_HOURS_INDEX_TTL = int(os.getenv('OPENING_HOURS_INDEX_TTL', '60'))
+
+# 交易統計 API 讀取每日彙總表；設為 False 時改為直接查詢 PurchaseHistory
+TRANSACTION_ROLLUPS = os.getenv('TRANSACTION_ROLLUPS', 'True') == 'True'
+
+# 搜尋 API 的實作：'database' 使用 icontains 查詢，'index' 使用行程內的倒排索引（BM25 排序、容錯）
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'database')
+
+# 交易分析 API 的實作：'database' 使用 GROUP BY 查詢，'columnar' 使用行程內的 NumPy 欄式快照（未安裝 numpy 時退回資料庫查詢）
+ANALYTICS_BACKEND = os.getenv('ANALYTICS_BACKEND', 'database')
+ANALYTICS_SNAPSHOT_TTL = int(os.getenv('ANALYTICS_SNAPSHOT_TTL', '60'))
+
+# 選用的 orjson renderer，未安裝 orjson 時自動退回 DRF 的 JSONRenderer
+ORJSON_RENDERER = os.getenv('ORJSON_RENDERER', 'False') == 'True'
+if ORJSON_RENDERER:
+    REST_FRAMEWORK = {
+        'DEFAULT_RENDERER_CLASSES': [
+            'phantom_app.renderers.ORJSONRenderer',
+            'rest_framework.renderers.BrowsableAPIRenderer',
+        ],
+    }
+
+# 帳本模式（選用）：購買只扣款並寫入帳本，由 flush_ledger 指令分批套用到購買紀錄、藥局餘額與統計
+PURCHASE_LEDGER = os.getenv('PURCHASE_LEDGER', 'False') == 'True'
+
+# 以 ASGI 伺服器部署時改用非同步 view（async ORM），等待資料庫時不佔用 worker 執行緒
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+# 每個請求的 SQL 次數與時間、延遲與回應大小，輸出於 Server-Timing header、log 與 /metrics（選用）
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', 'False') == 'True'
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '100'))
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '1000'))
+if REQUEST_METRICS:
+    MIDDLEWARE.insert(0, 'phantom_app.middleware.RequestMetricsMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'phantom_app.metrics': {
+            'handlers': ['console'],
+            'level': os.getenv('METRICS_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 